@@ -0,0 +1,233 @@
+"""
+51.ca 爬蟲 - 分頁 API 重放
+瀏覽器只用於一次: 捕獲頁面發出的分頁 API 請求 (方法 / URL / 請求頭 / 請求體) 和 Cookie，
+之後用共享 HTTP 客戶端直接翻頁，不再滾動等待。
+
+分頁參數自動識別 (請求體優先，其次 URL 查詢參數):
+    頁碼   page / pageNum / pageNo / current ...   每次 +1
+    偏移   offset / start / skip                   每次 + 本頁條數
+    游標   cursor / lastId / after ...             取響應中的下一個游標
+
+用法:
+    captured = CapturedRequest.from_playwright(request)    # page.on('request') 中捕獲
+    api = PagedApi(captured, session, cookies=cookie_header)
+    for payload in api.pages():
+        items = api_items(payload)
+"""
+
+import json
+import time
+import logging
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+PAGE_KEYS = ('page', 'pageNum', 'pageNo', 'pageIndex', 'pageNumber', 'current')
+OFFSET_KEYS = ('offset', 'start', 'skip')
+CURSOR_KEYS = ('cursor', 'nextCursor', 'lastId', 'last_id', 'after', 'nextToken', 'scrollId')
+
+# 響應中表示 "還有下一頁" / "最後一頁" 的欄位
+HAS_MORE_KEYS = ('hasMore', 'has_more', 'hasNext', 'has_next')
+LAST_PAGE_KEYS = ('lastPage', 'last_page', 'totalPages', 'total_pages', 'pageCount')
+
+# 不重放的請求頭 (由客戶端重新生成，或單獨傳入)
+DROP_HEADERS = {'content-length', 'host', 'cookie', 'connection', 'accept-encoding'}
+
+# 單頁請求失敗 (連接錯誤 / 5xx) 時的重試次數 (POST 不走連接池的自動重試)
+PAGE_RETRIES = 2
+
+logger = logging.getLogger(__name__)
+
+
+class CapturedRequest(NamedTuple):
+    """捕獲的 API 請求"""
+    method: str
+    url: str
+    headers: Dict[str, str]
+    body: Optional[str]
+
+    @classmethod
+    def from_playwright(cls, request) -> 'CapturedRequest':
+        return cls(request.method, request.url, dict(request.headers), request.post_data)
+
+
+class PagedApi:
+    """按捕獲的請求形狀直接翻頁"""
+
+    def __init__(self, captured: CapturedRequest, session, cookies: Optional[str] = None,
+                 on_response: Optional[Callable] = None, delay: float = 0):
+        """
+        Args:
+            cookies: Cookie 請求頭 (瀏覽器引導得到)；不寫入共享客戶端的 Cookie 罐
+            on_response: 每個響應的回調 (如存檔)
+            delay: 兩次請求之間的間隔秒數
+        """
+        self.captured = captured
+        self.session = session
+        self.on_response = on_response
+        self.delay = delay
+
+        parts = urlsplit(captured.url)
+        self._url_parts = parts
+        self._query = dict(parse_qsl(parts.query, keep_blank_values=True))
+        self._body, self._body_kind = _parse_body(captured.body, captured.headers)
+
+        self._headers = {k: v for k, v in captured.headers.items()
+                         if k.lower() not in DROP_HEADERS and not k.startswith(':')}
+        if cookies:
+            self._headers['Cookie'] = cookies
+
+        self.where, self.key, self.kind = self._find_paging_param()
+
+    # ============== 分頁參數 ==============
+
+    def _find_paging_param(self) -> Tuple[str, str, str]:
+        """返回 (位置 body|query, 參數名, 類型 page|offset|cursor)"""
+        for where, params in (('body', self._body), ('query', self._query)):
+            if not isinstance(params, dict):
+                continue
+            for kind, keys in (('page', PAGE_KEYS), ('offset', OFFSET_KEYS), ('cursor', CURSOR_KEYS)):
+                for key in keys:
+                    if key in params:
+                        return where, key, kind
+        raise ValueError(f"無法識別分頁參數: {self.captured.url} {self.captured.body!r}")
+
+    def _params(self):
+        return self._body if self.where == 'body' else self._query
+
+    def _request(self, value):
+        """用指定的分頁值構建並發送請求"""
+        params = self._params()
+        original = params.get(self.key)
+        # 保持原參數類型 (JSON 中的數字 / 字符串)
+        params[self.key] = type(original)(value) if isinstance(original, (int, str)) and value is not None else value
+
+        url = urlunsplit(self._url_parts._replace(query=urlencode(self._query)))
+        data = None
+        if self._body_kind == 'json':
+            data = json.dumps(self._body, ensure_ascii=False).encode('utf-8')
+        elif self._body_kind == 'form':
+            data = urlencode(self._body)
+        elif self._body is not None:
+            data = self._body
+
+        for attempt in range(PAGE_RETRIES + 1):
+            try:
+                resp = self.session.request(self.captured.method, url, headers=self._headers, data=data)
+            except Exception as e:
+                if attempt == PAGE_RETRIES:
+                    raise
+                logger.debug(f"請求失敗，重試 ({e})")
+            else:
+                if resp.status_code < 500 or attempt == PAGE_RETRIES:
+                    return resp
+            time.sleep(0.5 * (attempt + 1))
+
+    # ============== 翻頁 ==============
+
+    def start_value(self):
+        """起始分頁值: 頁碼 / 偏移從頭開始 (重複項由調用方去重)，游標只能從捕獲值開始"""
+        if self.kind == 'page':
+            original = self._params().get(self.key)
+            return 0 if str(original) == '0' else 1
+        if self.kind == 'offset':
+            return 0
+        return self._params().get(self.key)
+
+    def pages(self, max_pages: Optional[int] = None) -> Iterator[Dict]:
+        """逐頁請求，yield 每頁的 JSON；沒有更多數據或請求失敗時結束"""
+        value = self.start_value()
+        count = 0
+        while max_pages is None or count < max_pages:
+            resp = self._request(value)
+            if self.on_response is not None:
+                self.on_response(resp)
+            if resp.status_code != 200:
+                logger.warning(f"API 返回 {resp.status_code}，停止翻頁 ({self.key}={value})")
+                return
+            try:
+                payload = resp.json()
+            except ValueError:
+                logger.warning(f"API 響應不是 JSON，停止翻頁 ({self.key}={value})")
+                return
+
+            items = api_items(payload)
+            count += 1
+            yield payload
+
+            if not items or _is_last_page(payload, value if self.kind == 'page' else None):
+                return
+            if self.kind == 'page':
+                value = int(value) + 1
+            elif self.kind == 'offset':
+                value = int(value) + len(items)
+            else:
+                value = _find_key(payload, CURSOR_KEYS)
+                if value in (None, ''):
+                    return
+            if self.delay:
+                time.sleep(self.delay)
+
+
+def api_items(payload) -> List[Dict]:
+    """響應中的項目列表 (data / list / items，可嵌套一層)"""
+    if isinstance(payload, list):
+        return payload
+    if not isinstance(payload, dict):
+        return []
+    for key in ('data', 'list', 'items', 'records', 'results'):
+        value = payload.get(key)
+        if isinstance(value, list):
+            return value
+        if isinstance(value, dict):
+            nested = api_items(value)
+            if nested:
+                return nested
+    return []
+
+
+def _is_last_page(payload, page) -> bool:
+    has_more = _find_key(payload, HAS_MORE_KEYS)
+    if has_more is not None and not has_more:
+        return True
+    last_page = _find_key(payload, LAST_PAGE_KEYS)
+    if page is not None and last_page is not None:
+        try:
+            return int(page) >= int(last_page)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _find_key(payload, keys):
+    """在響應頂層及 pagination / meta / data 等子對象中查找欄位"""
+    if not isinstance(payload, dict):
+        return None
+    for scope in (payload, payload.get('pagination'), payload.get('meta'),
+                  payload.get('page'), payload.get('data')):
+        if isinstance(scope, dict):
+            for key in keys:
+                if key in scope:
+                    return scope[key]
+    return None
+
+
+def _parse_body(body: Optional[str], headers: Dict[str, str]):
+    """請求體 -> (可修改的參數, 類型 json|form|raw)"""
+    if not body:
+        return None, None
+    content_type = next((v for k, v in headers.items() if k.lower() == 'content-type'), '')
+    if 'json' in content_type or body.lstrip().startswith('{'):
+        try:
+            parsed = json.loads(body)
+            if isinstance(parsed, dict):
+                return parsed, 'json'
+        except ValueError:
+            pass
+    if 'x-www-form-urlencoded' in content_type:
+        return dict(parse_qsl(body, keep_blank_values=True)), 'form'
+    return body, 'raw'
+
+
+def cookie_header(cookies: List[Dict]) -> str:
+    """Playwright context.cookies() -> Cookie 請求頭"""
+    return '; '.join(f"{c['name']}={c['value']}" for c in cookies if c.get('name'))
@@ -0,0 +1,488 @@
+"""
+51.ca 爬蟲 - 原始響應存檔 (類似 WARC)
+每個抓取到的響應 (URL / 狀態碼 / 響應頭 / 響應體) 追加寫入分段壓縮文件，
+並在資料庫 archive_index 表中按 URL 和抓取時間建立索引，
+修復解析器後可以直接從本地存檔重新解析，無需重新請求網站。
+
+存檔格式:
+    data/archive/<爬蟲>/<日期>-<序號>.seg.zst   (未安裝 zstandard 時為 .seg.gz)
+    每條記錄 = 4 字節長度 (big-endian) + 獨立壓縮幀
+    壓縮幀解壓後 = JSON 頭 (url, status, headers, fetched_at, scraper) + '\\n' + 響應體
+
+用法:
+    archive.enable(retention_days=30)        # 或設置環境變量 SCRAPER_ARCHIVE=1
+    archive.record(scraper_name, response)   # 爬蟲抓取後調用 (未啟用時為空操作)
+
+    for rec in archive.get_archive().iter_records('news', since='2026-01-01'):
+        data = scraper.parse_detail_page(rec.text, rec.url)
+"""
+
+import os
+import gzip
+import atexit
+import sqlite3
+import json
+import struct
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Iterator, NamedTuple
+
+try:
+    from .models import get_connection, init_database, use_shard, DB_PATH
+except ImportError:
+    from models import get_connection, init_database, use_shard, DB_PATH
+
+ARCHIVE_DIR = os.path.join(os.path.dirname(__file__), "data", "archive")
+
+# 單個分段文件最大字節數，超過後滾動到新分段
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+# 默認保留天數 (None = 永久保留)
+RETENTION_DAYS = 90
+
+# 索引每寫入多少條提交一次
+INDEX_COMMIT_EVERY = 50
+
+_LENGTH = struct.Struct('>I')
+
+logger = logging.getLogger(__name__)
+
+# 當前啟用的存檔 (None = 未啟用)
+_archive = None
+_archive_lock = threading.Lock()
+_env_checked = False
+
+
+def _connect():
+    # 存檔索引由所有爬蟲共享，開啟分庫時也只在主庫
+    with use_shard(''):
+        return get_connection()
+
+
+class ArchivedResponse(NamedTuple):
+    """存檔中的一條響應記錄"""
+    url: str
+    status: int
+    headers: Dict[str, str]
+    fetched_at: str
+    scraper: str
+    body: bytes
+
+    @property
+    def text(self) -> str:
+        return self.body.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.body)
+
+
+# ============== 壓縮編解碼 ==============
+
+class _ZstdCodec:
+    suffix = '.seg.zst'
+
+    def __init__(self, level: int = 3):
+        import zstandard
+        self._level = level
+        self._local = threading.local()
+        self._zstd = zstandard
+
+    def compress(self, data: bytes) -> bytes:
+        # ZstdCompressor 非線程安全，每個線程一個實例
+        compressor = getattr(self._local, 'compressor', None)
+        if compressor is None:
+            compressor = self._local.compressor = self._zstd.ZstdCompressor(level=self._level)
+        return compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._zstd.ZstdDecompressor().decompress(data)
+
+
+class _GzipCodec:
+    suffix = '.seg.gz'
+
+    def __init__(self, level: int = 6):
+        self._level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=self._level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return gzip.decompress(data)
+
+
+def _default_codec():
+    try:
+        return _ZstdCodec()
+    except ImportError:
+        logger.warning("未安裝 zstandard，存檔改用 gzip 壓縮")
+        return _GzipCodec()
+
+
+def _codec_for(path: str):
+    if path.endswith(_ZstdCodec.suffix):
+        return _ZstdCodec()
+    return _GzipCodec()
+
+
+# ============== 存檔 ==============
+
+class ResponseArchive:
+    """
+    分段壓縮響應存檔
+
+    Args:
+        archive_dir: 存檔根目錄
+        segment_max_bytes: 單個分段文件最大字節數
+        retention_days: 保留天數 (None = 永久)
+    """
+
+    def __init__(self, archive_dir: str = ARCHIVE_DIR, segment_max_bytes: int = SEGMENT_MAX_BYTES,
+                 retention_days: Optional[int] = RETENTION_DAYS):
+        self.archive_dir = archive_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.retention_days = retention_days
+        self.codec = _default_codec()
+
+        self._lock = threading.Lock()
+        self._segments = {}  # 爬蟲名 -> (分段相對路徑, 文件對象)
+        self._conn = None
+        self._pending = 0
+
+    # ============== 寫入 ==============
+
+    def append(self, scraper: str, url: str, status: int, headers: Dict[str, str],
+               body, fetched_at: str = None) -> None:
+        """追加一條響應記錄"""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        fetched_at = fetched_at or datetime.now().isoformat(timespec='seconds')
+        header = json.dumps({
+            'url': url,
+            'status': status,
+            'headers': dict(headers or {}),
+            'fetched_at': fetched_at,
+            'scraper': scraper,
+        }, ensure_ascii=False).encode('utf-8')
+        frame = self.codec.compress(header + b'\n' + body)
+
+        with self._lock:
+            segment, f = self._current_segment(scraper)
+            offset = f.tell()
+            f.write(_LENGTH.pack(len(frame)))
+            f.write(frame)
+            f.flush()
+
+            self._index_conn().execute("""
+                INSERT INTO archive_index (scraper, url, status, fetched_at, segment, offset, length)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (scraper, url, status, fetched_at, segment, offset, len(frame)))
+            self._pending += 1
+            if self._pending >= INDEX_COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+
+    def _current_segment(self, scraper: str):
+        """獲取當前可寫分段，超出大小或跨日時滾動"""
+        today = datetime.now().strftime('%Y%m%d')
+        current = self._segments.get(scraper)
+        if current:
+            segment, f = current
+            if f.tell() < self.segment_max_bytes and os.path.basename(segment).startswith(today):
+                return current
+            f.close()
+
+        directory = os.path.join(self.archive_dir, scraper)
+        os.makedirs(directory, exist_ok=True)
+        seq = 0
+        while True:
+            name = f"{today}-{seq:04d}{self.codec.suffix}"
+            path = os.path.join(directory, name)
+            if not os.path.exists(path) or os.path.getsize(path) < self.segment_max_bytes:
+                break
+            seq += 1
+
+        segment = f"{scraper}/{name}"
+        f = open(path, 'ab')
+        self._segments[scraper] = (segment, f)
+        return segment, f
+
+    def _index_conn(self):
+        if self._conn is None:
+            # 寫入可能來自多個爬蟲線程 (已由 self._lock 串行化)
+            self._conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        return self._conn
+
+    def flush(self):
+        """提交索引並刷新分段文件"""
+        with self._lock:
+            if self._conn is not None and self._pending:
+                self._conn.commit()
+                self._pending = 0
+            for _, f in self._segments.values():
+                f.flush()
+
+    def close(self):
+        """關閉所有分段文件和索引連接"""
+        self.flush()
+        with self._lock:
+            for _, f in self._segments.values():
+                f.close()
+            self._segments.clear()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ============== 讀取 ==============
+
+    def read(self, segment: str, offset: int) -> ArchivedResponse:
+        """按分段和偏移量讀取一條記錄"""
+        path = os.path.join(self.archive_dir, segment)
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return self._read_frame(f, _codec_for(path))
+
+    @staticmethod
+    def _read_frame(f, codec) -> Optional[ArchivedResponse]:
+        prefix = f.read(_LENGTH.size)
+        if len(prefix) < _LENGTH.size:
+            return None
+        (length,) = _LENGTH.unpack(prefix)
+        frame = f.read(length)
+        if len(frame) < length:
+            return None  # 寫入中斷的殘缺記錄
+        header, _, body = codec.decompress(frame).partition(b'\n')
+        meta = json.loads(header)
+        return ArchivedResponse(
+            url=meta['url'],
+            status=meta.get('status', 0),
+            headers=meta.get('headers') or {},
+            fetched_at=meta.get('fetched_at', ''),
+            scraper=meta.get('scraper', ''),
+            body=body,
+        )
+
+    def iter_records(self, scraper: str = None, since: str = None, until: str = None,
+                     url: str = None, latest_only: bool = False) -> Iterator[ArchivedResponse]:
+        """
+        按條件流式讀取記錄 (按分段 / 偏移量順序讀盤)
+
+        Args:
+            scraper: 爬蟲名稱
+            since / until: 抓取時間範圍 (ISO 格式字符串，含 since 不含 until)
+            url: 指定 URL
+            latest_only: 每個 URL 只返回最新一條
+        """
+        self.flush()
+        conditions, params = [], []
+        if scraper:
+            conditions.append("scraper = ?")
+            params.append(scraper)
+        if since:
+            conditions.append("fetched_at >= ?")
+            params.append(since)
+        if until:
+            conditions.append("fetched_at < ?")
+            params.append(until)
+        if url:
+            conditions.append("url = ?")
+            params.append(url)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        if latest_only:
+            sql = f"""
+                SELECT segment, offset FROM (
+                    SELECT segment, offset,
+                           ROW_NUMBER() OVER (PARTITION BY url ORDER BY fetched_at DESC, id DESC) AS rn
+                    FROM archive_index {where}
+                ) WHERE rn = 1
+                ORDER BY segment, offset
+            """
+        else:
+            sql = f"SELECT segment, offset FROM archive_index {where} ORDER BY segment, offset"
+
+        # 先取出位置列表再讀盤，避免讀取期間長時間持有資料庫讀事務
+        conn = _connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+        current_path, f, codec = None, None, None
+        try:
+            for segment, offset in rows:
+                path = os.path.join(self.archive_dir, segment)
+                if path != current_path:
+                    if f:
+                        f.close()
+                    current_path, f = path, None
+                    if not os.path.exists(path):
+                        continue
+                    f, codec = open(path, 'rb'), _codec_for(path)
+                if f is None:
+                    continue
+                f.seek(offset)
+                record = self._read_frame(f, codec)
+                if record is not None:
+                    yield record
+        finally:
+            if f:
+                f.close()
+
+    def latest(self, url: str) -> Optional[ArchivedResponse]:
+        """獲取某個 URL 最近一次存檔的響應"""
+        self.flush()
+        conn = _connect()
+        try:
+            row = conn.execute("""
+                SELECT segment, offset FROM archive_index
+                WHERE url = ? ORDER BY fetched_at DESC, id DESC LIMIT 1
+            """, (url,)).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        try:
+            return self.read(row['segment'], row['offset'])
+        except FileNotFoundError:
+            return None
+
+    # ============== 維護 ==============
+
+    def prune(self, retention_days: Optional[int] = None) -> int:
+        """刪除超過保留期的分段文件及其索引，返回刪除的分段數"""
+        days = self.retention_days if retention_days is None else retention_days
+        if days is None or not os.path.isdir(self.archive_dir):
+            return 0
+        cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y%m%d')
+        open_segments = {segment for segment, _ in self._segments.values()}
+
+        removed = []
+        for scraper in os.listdir(self.archive_dir):
+            directory = os.path.join(self.archive_dir, scraper)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                segment = f"{scraper}/{name}"
+                if name[:8] < cutoff and segment not in open_segments:
+                    os.remove(os.path.join(directory, name))
+                    removed.append(segment)
+
+        if removed:
+            self.flush()
+            conn = _connect()
+            try:
+                conn.executemany("DELETE FROM archive_index WHERE segment = ?", [(s,) for s in removed])
+                conn.commit()
+            finally:
+                conn.close()
+            logger.info(f"存檔清理: 刪除 {len(removed)} 個超過 {days} 天的分段")
+        return len(removed)
+
+    def rebuild_index(self, scraper: str = None) -> int:
+        """掃描分段文件重建索引 (索引丟失或未提交時使用)，返回記錄數"""
+        self.flush()
+        if not os.path.isdir(self.archive_dir):
+            return 0
+        scrapers = [scraper] if scraper else sorted(os.listdir(self.archive_dir))
+        conn = _connect()
+        count = 0
+        try:
+            for name in scrapers:
+                directory = os.path.join(self.archive_dir, name)
+                if not os.path.isdir(directory):
+                    continue
+                for filename in sorted(os.listdir(directory)):
+                    segment = f"{name}/{filename}"
+                    path = os.path.join(directory, filename)
+                    codec = _codec_for(path)
+                    rows = []
+                    with open(path, 'rb') as f:
+                        while True:
+                            offset = f.tell()
+                            record = self._read_frame(f, codec)
+                            if record is None:
+                                break
+                            rows.append((record.scraper or name, record.url, record.status,
+                                         record.fetched_at, segment, offset,
+                                         f.tell() - offset - _LENGTH.size))
+                    conn.execute("DELETE FROM archive_index WHERE segment = ?", (segment,))
+                    conn.executemany("""
+                        INSERT INTO archive_index (scraper, url, status, fetched_at, segment, offset, length)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, rows)
+                    count += len(rows)
+            conn.commit()
+        finally:
+            conn.close()
+        return count
+
+
+# ============== 進程級開關 ==============
+
+def enable(retention_days: Optional[int] = RETENTION_DAYS, archive_dir: str = ARCHIVE_DIR,
+           segment_max_bytes: int = SEGMENT_MAX_BYTES) -> ResponseArchive:
+    """啟用響應存檔 (同時清理過期分段)"""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            with use_shard(''):
+                init_database()
+            _archive = ResponseArchive(archive_dir, segment_max_bytes, retention_days)
+            _archive.prune()
+            atexit.register(disable)
+        return _archive
+
+
+def disable():
+    """停用並關閉響應存檔"""
+    global _archive
+    with _archive_lock:
+        if _archive is not None:
+            _archive.close()
+            _archive = None
+
+
+def is_enabled() -> bool:
+    """是否正在存檔 (首次調用時檢查 SCRAPER_ARCHIVE 環境變量)"""
+    global _env_checked
+    if not _env_checked:
+        _env_checked = True
+        if os.environ.get('SCRAPER_ARCHIVE', '').lower() in ('1', 'true', 'yes'):
+            days = os.environ.get('SCRAPER_ARCHIVE_RETENTION_DAYS')
+            enable(retention_days=int(days) if days else RETENTION_DAYS)
+    return _archive is not None
+
+
+def get_archive() -> ResponseArchive:
+    """獲取存檔實例 (用於讀取；未啟用時返回默認配置的只讀實例)"""
+    if is_enabled():
+        return _archive
+    return ResponseArchive()
+
+
+def record(scraper: str, response, body=None, url: str = None, status: int = None,
+           headers: Dict[str, str] = None) -> None:
+    """
+    存檔一個響應 (未啟用時為空操作)
+
+    Args:
+        scraper: 爬蟲名稱
+        response: requests / httpx 響應對象 (可為 None，此時需提供 body 和 url)
+        body: 覆蓋響應體 (例如瀏覽器渲染後的 HTML)
+        url / status / headers: response 為 None 時使用 (例如 Playwright 響應)
+    """
+    if not is_enabled():
+        return
+    try:
+        if response is not None:
+            url = url or str(response.url)
+            status = response.status_code if status is None else status
+            headers = dict(response.headers)
+            if body is None:
+                body = response.content
+        _archive.append(scraper, url, status or 0, headers or {}, body or b'')
+    except Exception as e:
+        logger.warning(f"存檔響應失敗 {url}: {e}")
@@ -13,12 +13,20 @@ from datetime import datetime, timedelta
 import sys
 import os
 
-from bs4 import BeautifulSoup
-
 # Add the parent directory of 'scrapers' to sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from base import BaseScraper
-from models import get_connection
+
+# Handle both direct execution and package import
+try:
+    from .base import BaseScraper
+    from .schema import AUTO_LISTINGS
+    from .html_parser import Document
+    from . import profiling
+except ImportError:
+    from base import BaseScraper
+    from schema import AUTO_LISTINGS
+    from html_parser import Document
+    import profiling
 
 
 class AutoScraper(BaseScraper):
@@ -27,6 +35,8 @@ class AutoScraper(BaseScraper):
     SCRAPER_NAME = "auto"
     BASE_URL = "https://www.51.ca/autos"
     URL_TYPE = "auto"
+    DETAIL_URL_PATTERN = r'/autos/(used-cars|new-cars|lease-cars)/\d+$'
+    SCHEMA = AUTO_LISTINGS
     
     # 汽車品牌
     CAR_BRANDS = [
@@ -72,16 +82,16 @@ class AutoScraper(BaseScraper):
     
     def parse_list_page(self, html: str, url: str) -> List[Dict]:
         """解析汽車列表頁面"""
-        soup = BeautifulSoup(html, "lxml")
+        doc = self.make_doc(html)
         items = []
         seen_urls = set()
         
         # 查找汽車連結
-        car_links = soup.find_all('a', href=re.compile(r'/autos/(used-cars|new-cars|lease-cars)/\d+'))
+        car_links = doc.css('a[href*="/autos/"]')
         
         for link in car_links:
-            href = link.get('href', '')
-            if not href or '/my/' in href:
+            href = link.attr('href', '')
+            if not re.search(r'/autos/(used-cars|new-cars|lease-cars)/\d+', href) or '/my/' in href:
                 continue
             
             if href.startswith('/'):
@@ -108,55 +118,56 @@ class AutoScraper(BaseScraper):
         基於 二手車項目頁頁schema.json
         優先從 __NEXT_DATA__ JSON 提取數據
         """
-        soup = BeautifulSoup(html, "lxml")
+        doc = self.make_doc(html)
         
         listing_id = self.extract_id_from_url(url, r'/(\d+)$')
         if not listing_id:
             return None
         
-        # 嘗試從 JSON 提取所有數據
-        json_data = self._extract_from_json(soup)
+        # 嘗試從 JSON 提取所有數據 (__NEXT_DATA__ 只解析一次)
+        page_data = self._extract_page_data(doc)
+        json_data = self._extract_from_json(page_data)
         
         # 基本信息 (優先 JSON)
-        title = json_data.get('title') or self._extract_title(soup)
+        title = json_data.get('title') or self._extract_title(doc)
         listing_type = self._extract_listing_type(url)
         make = json_data.get('make') or None
         model = json_data.get('model') or None
         if not make or not model:
-            make, model = self._extract_make_model(soup, title)
-        year = json_data.get('year') or self._extract_year(soup, title)
+            make, model = self._extract_make_model(doc, title)
+        year = json_data.get('year') or self._extract_year(doc, title)
         trim = json_data.get('trim')
         
         # 價格 (優先 JSON)
-        price = json_data.get('price') or self._extract_price(soup)
+        price = json_data.get('price') or self._extract_price(doc)
         
         # 車輛規格 (優先 JSON)
-        mileage = json_data.get('mileage') or self._extract_mileage(soup)
-        body_type = json_data.get('body_type') or self._extract_body_type(soup)
-        transmission = json_data.get('transmission') or self._extract_transmission(soup)
-        fuel_type = json_data.get('fuel_type') or self._extract_fuel_type(soup)
-        drivetrain = json_data.get('drivetrain') or self._extract_drivetrain(soup)
-        color = json_data.get('color') or self._extract_color(soup)
-        vin = self._extract_vin(soup)  # VIN 通常不在 JSON
+        mileage = json_data.get('mileage') or self._extract_mileage(doc)
+        body_type = json_data.get('body_type') or self._extract_body_type(doc)
+        transmission = json_data.get('transmission') or self._extract_transmission(doc)
+        fuel_type = json_data.get('fuel_type') or self._extract_fuel_type(doc)
+        drivetrain = json_data.get('drivetrain') or self._extract_drivetrain(doc)
+        color = json_data.get('color') or self._extract_color(doc)
+        vin = self._extract_vin(doc)  # VIN 通常不在 JSON
         
         # 位置信息 (優先 JSON)
-        location = json_data.get('location') or self._extract_location(soup)
+        location = json_data.get('location') or self._extract_location(doc)
         
         # 經銷商/賣家信息 (優先 JSON - 已在 _extract_seller 中實現)
-        seller_type, seller_name, contact_phone = self._extract_seller(soup)
+        seller_type, seller_name, contact_phone = self._extract_seller(doc, page_data)
         
         # Promotions
-        promotions = self._extract_promotions(soup)
+        promotions = self._extract_promotions(doc)
         
         # 描述和特點 (優先 JSON)
-        description = json_data.get('description') or self._extract_description(soup)
-        features = json_data.get('features') or self._extract_features(soup)
+        description = json_data.get('description') or self._extract_description(doc)
+        features = json_data.get('features') or self._extract_features(doc)
         
         # 圖片 (優先 JSON)
-        image_urls = json_data.get('image_urls') or self._extract_images(soup)
+        image_urls = json_data.get('image_urls') or self._extract_images(doc)
         
         # 發布日期
-        post_date = self._extract_post_date(soup)
+        post_date = self._extract_post_date(doc)
         
         return {
             'listing_id': listing_id,
@@ -186,7 +197,19 @@ class AutoScraper(BaseScraper):
             'post_date': post_date,
         }
     
-    def _extract_from_json(self, soup: BeautifulSoup) -> Dict:
+    def _extract_page_data(self, doc: Document) -> Dict:
+        """解析 __NEXT_DATA__，返回 props.pageProps.data (無則為空字典)"""
+        next_data = doc.json_script('__NEXT_DATA__')
+        if not next_data:
+            return {}
+        try:
+            data = json.loads(next_data)
+            page_data = data.get('props', {}).get('pageProps', {}).get('data', {})
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+            return {}
+        return page_data if isinstance(page_data, dict) else {}
+    
+    def _extract_from_json(self, page_data: Dict) -> Dict:
         """
         從 __NEXT_DATA__ JSON 提取所有可用數據
         
@@ -200,17 +223,10 @@ class AutoScraper(BaseScraper):
         """
         result = {}
         
-        next_data = soup.find('script', id='__NEXT_DATA__')
-        if not next_data or not next_data.string:
+        if not page_data:
             return result
         
         try:
-            data = json.loads(next_data.string)
-            page_data = data.get('props', {}).get('pageProps', {}).get('data', {})
-            
-            if not page_data:
-                return result
-            
             # 基本信息
             result['title'] = page_data.get('title')
             result['make'] = page_data.get('makeName')
@@ -278,14 +294,14 @@ class AutoScraper(BaseScraper):
                                 features.append(en_name)
                 result['features'] = features
             
-        except (json.JSONDecodeError, KeyError, TypeError) as e:
+        except (KeyError, TypeError, AttributeError):
             pass
         
         return result
     
-    def _extract_title(self, soup: BeautifulSoup) -> str:
+    def _extract_title(self, doc: Document) -> str:
         """提取標題"""
-        title_elem = soup.find('h1') or soup.find('title')
+        title_elem = doc.css_first('h1') or doc.css_first('title')
         if title_elem:
             title = self.clean_text(self.extract_text(title_elem))
             # 清理網站後綴
@@ -305,7 +321,7 @@ class AutoScraper(BaseScraper):
             return '轉lease'
         return '二手'
     
-    def _extract_make_model(self, soup: BeautifulSoup, title: str) -> tuple:
+    def _extract_make_model(self, doc: Document, title: str) -> tuple:
         """提取品牌和型號"""
         make = None
         model = None
@@ -322,25 +338,25 @@ class AutoScraper(BaseScraper):
         
         return make, model
     
-    def _extract_year(self, soup: BeautifulSoup, title: str) -> Optional[int]:
+    def _extract_year(self, doc: Document, title: str) -> Optional[int]:
         """提取年份"""
         year_match = re.search(r'(19\d{2}|20\d{2})', title)
         if year_match:
             return int(year_match.group(1))
         return None
     
-    def _extract_price(self, soup: BeautifulSoup) -> Optional[float]:
+    def _extract_price(self, doc: Document) -> Optional[float]:
         """提取價格"""
         # 查找價格元素
-        price_elem = soup.find(class_=re.compile(r'price|cost'))
+        price_elem = doc.css_first('[class*="price"], [class*="cost"]')
         if price_elem:
-            text = price_elem.get_text()
+            text = price_elem.text()
             match = re.search(r'\$?([\d,]+)', text)
             if match:
                 return float(match.group(1).replace(',', ''))
         
         # 從全文搜索
-        text = soup.get_text()
+        text = doc.page_text()
         match = re.search(r'\$\s*([\d,]+)', text)
         if match:
             price = float(match.group(1).replace(',', ''))
@@ -349,9 +365,9 @@ class AutoScraper(BaseScraper):
         
         return None
     
-    def _extract_mileage(self, soup: BeautifulSoup) -> Optional[int]:
+    def _extract_mileage(self, doc: Document) -> Optional[int]:
         """提取里程（改進版 - 結合舊方法）"""
-        text = soup.get_text()
+        text = doc.page_text()
         
         # 多種模式匹配
         patterns = [
@@ -374,8 +390,8 @@ class AutoScraper(BaseScraper):
                     pass
         
         # 舊方法備用：在表格或列表中查找
-        for elem in soup.find_all(['td', 'dd', 'span', 'li']):
-            text = elem.get_text()
+        for elem in doc.css('td, dd, span, li'):
+            text = elem.text()
             match = re.search(r'([\d,]+)\s*(?:km|公里)', text, re.I)
             if match:
                 try:
@@ -387,9 +403,9 @@ class AutoScraper(BaseScraper):
         
         return None
     
-    def _extract_body_type(self, soup: BeautifulSoup) -> Optional[str]:
+    def _extract_body_type(self, doc: Document) -> Optional[str]:
         """提取車身類型"""
-        text = soup.get_text().lower()
+        text = doc.page_text().lower()
         body_types = {
             'sedan': 'Sedan',
             'suv': 'SUV',
@@ -408,9 +424,9 @@ class AutoScraper(BaseScraper):
                 return value
         return None
     
-    def _extract_transmission(self, soup: BeautifulSoup) -> Optional[str]:
+    def _extract_transmission(self, doc: Document) -> Optional[str]:
         """提取變速箱"""
-        text = soup.get_text().lower()
+        text = doc.page_text().lower()
         if 'automatic' in text or '自動' in text or 'auto' in text:
             return 'Automatic'
         elif 'manual' in text or '手動' in text:
@@ -419,9 +435,9 @@ class AutoScraper(BaseScraper):
             return 'CVT'
         return None
     
-    def _extract_fuel_type(self, soup: BeautifulSoup) -> Optional[str]:
+    def _extract_fuel_type(self, doc: Document) -> Optional[str]:
         """提取燃料類型"""
-        text = soup.get_text().lower()
+        text = doc.page_text().lower()
         if 'electric' in text or '電動' in text or 'ev' in text:
             return 'Electric'
         elif 'hybrid' in text or '混合' in text:
@@ -432,9 +448,9 @@ class AutoScraper(BaseScraper):
             return 'Gasoline'
         return None
     
-    def _extract_drivetrain(self, soup: BeautifulSoup) -> Optional[str]:
+    def _extract_drivetrain(self, doc: Document) -> Optional[str]:
         """提取驅動方式"""
-        text = soup.get_text().lower()
+        text = doc.page_text().lower()
         if 'awd' in text or 'all wheel' in text or '全驅' in text:
             return 'AWD'
         elif '4wd' in text or '4x4' in text or '四驅' in text:
@@ -445,31 +461,31 @@ class AutoScraper(BaseScraper):
             return 'RWD'
         return None
     
-    def _extract_color(self, soup: BeautifulSoup) -> Optional[str]:
+    def _extract_color(self, doc: Document) -> Optional[str]:
         """提取顏色"""
-        text = soup.get_text()
+        text = doc.page_text()
         match = re.search(r'(?:颜色|colour?|color)[：:\s]*(\S+)', text, re.I)
         if match:
             return match.group(1)
         return None
     
-    def _extract_vin(self, soup: BeautifulSoup) -> Optional[str]:
+    def _extract_vin(self, doc: Document) -> Optional[str]:
         """提取VIN碼"""
-        text = soup.get_text()
+        text = doc.page_text()
         # VIN 是17位字符
         match = re.search(r'VIN[：:\s]*([A-HJ-NPR-Z0-9]{17})', text, re.I)
         if match:
             return match.group(1)
         return None
     
-    def _extract_location(self, soup: BeautifulSoup) -> Dict:
+    def _extract_location(self, doc: Document) -> Dict:
         """提取位置信息"""
         location = {'city': None, 'province': 'ON'}
         
         # 查找位置元素
-        loc_elem = soup.find(class_=re.compile(r'location|address'))
+        loc_elem = doc.css_first('[class*="location"], [class*="address"]')
         if loc_elem:
-            text = loc_elem.get_text()
+            text = loc_elem.text()
             # 常見城市
             cities = ['Toronto', 'Markham', 'Richmond Hill', 'Vaughan', 
                       'Mississauga', 'Scarborough', 'North York', 'Brampton',
@@ -481,7 +497,7 @@ class AutoScraper(BaseScraper):
         
         return location
     
-    def _extract_seller(self, soup: BeautifulSoup) -> tuple:
+    def _extract_seller(self, doc: Document, page_data: Dict) -> tuple:
         """
         提取賣家信息（改進版 - 優先從 JSON 提取）
         
@@ -497,12 +513,8 @@ class AutoScraper(BaseScraper):
         contact_phone = None
         
         # 優先從 __NEXT_DATA__ JSON 提取
-        next_data = soup.find('script', id='__NEXT_DATA__')
-        if next_data and next_data.string:
+        if page_data:
             try:
-                data = json.loads(next_data.string)
-                page_data = data.get('props', {}).get('pageProps', {}).get('data', {})
-                
                 # 提取電話 - 優先順序: user.mobile > salesperson > dealer
                 user = page_data.get('user', {})
                 if user and user.get('mobile'):
@@ -535,52 +547,60 @@ class AutoScraper(BaseScraper):
                     elif dealer and dealer.get('name'):
                         seller_name = dealer.get('name')
                 
-            except (json.JSONDecodeError, KeyError, TypeError):
+            except (KeyError, TypeError, AttributeError):
                 pass
         
         # 後備方案：從 HTML 文本提取
         if not contact_phone:
-            text = soup.get_text()
-            
-            # 方法1: 從 class 查找電話
-            phone_elem = soup.find(class_=re.compile(r'phone|tel|contact'))
-            if phone_elem:
-                phone_text = phone_elem.get_text()
-                match = re.search(r'(\d{3}[-.\s]?\d{3}[-.\s]?\d{4})', phone_text)
+            with profiling.stage('regex'):
+                contact_phone = self._extract_phone_fallback(doc)
+        
+        return seller_type, seller_name, contact_phone
+    
+    def _extract_phone_fallback(self, doc: Document) -> Optional[str]:
+        """從 HTML 文本用正則提取電話 (全文掃描，較慢)"""
+        contact_phone = None
+        text = doc.page_text()
+        
+        # 方法1: 從 class 查找電話
+        phone_elem = doc.css_first('[class*="phone"], [class*="tel"], [class*="contact"]')
+        if phone_elem:
+            phone_text = phone_elem.text()
+            match = re.search(r'(\d{3}[-.\s]?\d{3}[-.\s]?\d{4})', phone_text)
+            if match:
+                contact_phone = match.group(1)
+        
+        # 方法2: 從全文用正則提取電話
+        if not contact_phone:
+            phone_patterns = [
+                r'(\d{3}[-.\s]\d{3}[-.\s]\d{4})',  # 416-555-1234
+                r'\((\d{3})\)\s*(\d{3})[-.\s](\d{4})',  # (416) 555-1234
+                r'(\d{10})',  # 4165551234
+            ]
+            for pattern in phone_patterns:
+                match = re.search(pattern, text)
                 if match:
-                    contact_phone = match.group(1)
-            
-            # 方法2: 從全文用正則提取電話
-            if not contact_phone:
-                phone_patterns = [
-                    r'(\d{3}[-.\s]\d{3}[-.\s]\d{4})',  # 416-555-1234
-                    r'\((\d{3})\)\s*(\d{3})[-.\s](\d{4})',  # (416) 555-1234
-                    r'(\d{10})',  # 4165551234
-                ]
-                for pattern in phone_patterns:
-                    match = re.search(pattern, text)
-                    if match:
-                        if len(match.groups()) == 3:
-                            contact_phone = f"{match.group(1)}-{match.group(2)}-{match.group(3)}"
+                    if len(match.groups()) == 3:
+                        contact_phone = f"{match.group(1)}-{match.group(2)}-{match.group(3)}"
+                    else:
+                        phone = match.group(1).replace(' ', '').replace('.', '-')
+                        if len(phone) == 10:
+                            contact_phone = f"{phone[:3]}-{phone[3:6]}-{phone[6:]}"
                         else:
-                            phone = match.group(1).replace(' ', '').replace('.', '-')
-                            if len(phone) == 10:
-                                contact_phone = f"{phone[:3]}-{phone[3:6]}-{phone[6:]}"
-                            else:
-                                contact_phone = phone
-                        break
-            
-            # 方法3: 查找 href="tel:" 連結
-            if not contact_phone:
-                tel_link = soup.find('a', href=re.compile(r'^tel:'))
-                if tel_link:
-                    phone = tel_link.get('href', '').replace('tel:', '').strip()
-                    if phone:
-                        contact_phone = phone
+                            contact_phone = phone
+                    break
         
-        return seller_type, seller_name, contact_phone
+        # 方法3: 查找 href="tel:" 連結
+        if not contact_phone:
+            tel_link = doc.css_first('a[href^="tel:"]')
+            if tel_link:
+                phone = tel_link.attr('href', '').replace('tel:', '').strip()
+                if phone:
+                    contact_phone = phone
+        
+        return contact_phone
     
-    def _extract_promotions(self, soup: BeautifulSoup) -> Dict:
+    def _extract_promotions(self, doc: Document) -> Dict:
         """
         提取 Promotions 標籤
         基於 二手車項目頁頁schema.json
@@ -594,7 +614,7 @@ class AutoScraper(BaseScraper):
         }
         
         # 查找標籤元素
-        text = soup.get_text().lower()
+        text = doc.page_text().lower()
         
         for label, key in self.PROMOTION_LABELS.items():
             if label.lower() in text:
@@ -608,37 +628,36 @@ class AutoScraper(BaseScraper):
         
         return promotions
     
-    def _extract_description(self, soup: BeautifulSoup) -> str:
+    def _extract_description(self, doc: Document) -> str:
         """提取描述"""
-        desc_elem = soup.find(class_=re.compile(r'description|content|detail'))
+        desc_elem = doc.css_first('[class*="description"], [class*="content"], [class*="detail"]')
         if desc_elem:
-            for tag in desc_elem.find_all(['script', 'style']):
-                tag.decompose()
-            return self.clean_text(desc_elem.get_text())[:2000]
+            # script / style 解析時已移除
+            return self.clean_text(desc_elem.text())[:2000]
         return ""
     
-    def _extract_features(self, soup: BeautifulSoup) -> List[str]:
+    def _extract_features(self, doc: Document) -> List[str]:
         """提取特點/配置"""
         features = []
-        feature_elem = soup.find(class_=re.compile(r'feature|option|equipment'))
+        feature_elem = doc.css_first('[class*="feature"], [class*="option"], [class*="equipment"]')
         if feature_elem:
-            for li in feature_elem.find_all('li'):
-                features.append(self.clean_text(li.get_text()))
+            for li in feature_elem.css('li'):
+                features.append(self.clean_text(li.text()))
         return features[:30]
     
-    def _extract_images(self, soup: BeautifulSoup) -> List[str]:
+    def _extract_images(self, doc: Document) -> List[str]:
         """提取圖片"""
         images = []
-        for img in soup.find_all('img'):
-            src = img.get('data-src') or img.get('src')
+        for img in doc.css('img'):
+            src = img.attr('data-src') or img.attr('src')
             if src and ('51img' in src or 'storage' in src):
                 if 'logo' not in src and 'icon' not in src:
                     images.append(src)
         return list(set(images))[:20]
     
-    def _extract_post_date(self, soup: BeautifulSoup) -> Optional[str]:
+    def _extract_post_date(self, doc: Document) -> Optional[str]:
         """提取發布日期"""
-        text = soup.get_text()
+        text = doc.page_text()
         
         # 相對時間
         match = re.search(r'(\d+)\s*天前', text)
@@ -657,79 +676,6 @@ class AutoScraper(BaseScraper):
             return match.group(1).replace('/', '-')
         
         return datetime.now().strftime('%Y-%m-%d')
-    
-    def save_item(self, data: Dict) -> bool:
-        """保存汽車到資料庫（匹配 models.py 的 auto_listings 架構）"""
-        try:
-            # 繁體中文轉換
-            title = self.to_traditional(data['title'])
-            description = self.to_traditional(data['description'])
-            features = self.to_traditional(data.get('features'))
-            dealer_name = self.to_traditional(data.get('seller_name'))
-            city = self.to_traditional(data.get('location'))
-            color = self.to_traditional(data.get('color'))
-            body_type = self.to_traditional(data.get('body_type'))
-            
-            # 處理 promotions
-            promotions = data.get('promotions', {})
-            if isinstance(promotions, str):
-                import json
-                try:
-                    promotions = json.loads(promotions)
-                except:
-                    promotions = {}
-            
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO auto_listings (
-                    listing_id, url, title, listing_type, make, model, year,
-                    body_type, color, transmission, drivetrain, fuel_type,
-                    kilometers, price, city,
-                    dealer_name, dealer_phone, vin,
-                    features, description, images,
-                    promo_same_day_approval, promo_no_credit_ok, promo_no_job_ok,
-                    promo_delivery_available, promo_warranty_available,
-                    post_date
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                data['listing_id'],
-                data['url'],
-                title,
-                data.get('listing_type'),
-                data.get('make'),
-                data.get('model'),
-                data.get('year'),
-                body_type,
-                color,
-                data.get('transmission'),
-                data.get('drivetrain'),
-                data.get('fuel_type'),
-                data.get('mileage'),  # mileage -> kilometers
-                data.get('price'),
-                city,
-                dealer_name,
-                data.get('contact_phone'),
-                data.get('vin'),
-                features,
-                description,
-                data.get('image_urls'),
-                promotions.get('same_day_approval', 0),
-                promotions.get('no_credit_ok', 0),
-                promotions.get('no_job_ok', 0),
-                promotions.get('delivery_available', 0),
-                promotions.get('warranty_available', 0),
-                data.get('post_date'),
-            ))
-            
-            conn.commit()
-            conn.close()
-            self.logger.info(f"保存汽車: {title[:30]}...")
-            return True
-        except Exception as e:
-            self.logger.error(f"保存汽車失敗: {e}")
-            return False
 
 
 if __name__ == "__main__":
@@ -13,7 +13,6 @@ from datetime import datetime
 from urllib.parse import urljoin, urlparse
 from typing import Optional, List, Dict, Any
 
-import requests
 from bs4 import BeautifulSoup
 from opencc import OpenCC
 
@@ -23,46 +22,47 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 try:
     from .models import (
-        init_database, add_url_to_queue, mark_url_visited, 
-        get_unvisited_urls, log_scrape, to_json
+        init_database, log_scrape, to_json, set_shard, get_connection
     )
+    from . import profiling
+    from . import archive
+    from .http_client import get_session, DEFAULT_HEADERS
+    from .schema import BatchWriter
+    from . import html_parser
+    from . import checkpoints
+    from . import log_pipeline
+    from . import frontier
+    from . import discovery
+    from . import scheduler
 except ImportError:
     from models import (
-        init_database, add_url_to_queue, mark_url_visited, 
-        get_unvisited_urls, log_scrape, to_json
+        init_database, log_scrape, to_json, set_shard, get_connection
     )
+    import profiling
+    import archive
+    from http_client import get_session, DEFAULT_HEADERS
+    from schema import BatchWriter
+    import html_parser
+    import checkpoints
+    import log_pipeline
+    import frontier
+    import discovery
+    import scheduler
 
 
 # ============== 日誌設置 ==============
 def setup_logger(name: str) -> logging.Logger:
-    """設置日誌器"""
-    log_dir = os.path.join(os.path.dirname(__file__), "..", "logs")
-    os.makedirs(log_dir, exist_ok=True)
-    
-    log_file = os.path.join(log_dir, f"{datetime.now().strftime('%Y%m%d')}_logs.log")
-    
+    """
+    設置日誌器
+    只掛共享的 QueueHandler，格式化、寫盤和輪轉在後台線程完成 (見 log_pipeline.py)
+    """
     logger = logging.getLogger(name)
     logger.setLevel(logging.DEBUG)
     
     if logger.handlers:
         return logger
     
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-    file_handler.setLevel(logging.DEBUG)
-    
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-    
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
+    logger.addHandler(log_pipeline.get_handler())
     return logger
 
 
@@ -73,19 +73,37 @@ class BaseScraper(ABC):
     BASE_URL = "https://www.51.ca"
     URL_TYPE = "general"
     
-    # HTTP 請求頭
-    DEFAULT_HEADERS = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-    }
+    # HTTP 請求頭 (共享客戶端已默認帶上)
+    DEFAULT_HEADERS = DEFAULT_HEADERS
+    
+    # 共享 HTTP 客戶端配置 (連接池大小應不少於並發數)
+    HTTP_POOL_SIZE = 10
+    HTTP2 = False
+    
+    # 資料表定義 (schema.py)，save_item / save_items 按此生成的 upsert 批量寫入
+    SCHEMA = None
+    
+    # make_doc 的 HTML 解析後端 (None = html_parser.default_backend())
+    HTML_BACKEND = None
+    
+    # sitemap / feed 發現 (discovery.py): 詳情頁 URL 路徑的正則，None = 只從列表頁發現
+    DETAIL_URL_PATTERN = None
+    # 除 robots.txt 聲明的 sitemap 外額外讀取的 RSS / Atom feed
+    FEED_URLS: List[str] = []
     
     def __init__(self, use_browser: bool = False, headless: bool = True):
         self.use_browser = use_browser
         self.headless = headless
+        # 開啟分庫時本爬蟲寫入自己的資料庫文件 (見 shards.py)
+        set_shard(self.SCRAPER_NAME)
         self.logger = setup_logger(self.SCRAPER_NAME)
-        self.session = requests.Session()
-        self.session.headers.update(self.DEFAULT_HEADERS)
+        # 逐項進度日誌 (限速，見 log_pipeline.Throttle)
+        self.progress_log = log_pipeline.Throttle(self.logger)
+        self.session = get_session(pool_size=self.HTTP_POOL_SIZE, http2=self.HTTP2)
+        # 待爬 URL 隊列 (後端由 SCRAPER_FRONTIER 選擇，見 frontier.py)
+        self.frontier = frontier.get_frontier()
+        # 入隊優先級按產出計算 (見 scheduler.py)
+        self.scheduler = scheduler.Scheduler(self.frontier, self.URL_TYPE)
         
         # Playwright (可選)
         self.browser = None
@@ -103,6 +121,8 @@ class BaseScraper(ABC):
         
         # 簡繁轉換器 (s2twp: 簡體到台灣繁體並轉換用詞)
         self.cc = OpenCC('s2twp')
+        
+        self._writer = None
     
     def start_browser(self):
         """啟動瀏覽器 (需要時才使用)"""
@@ -137,15 +157,20 @@ class BaseScraper(ABC):
     def fetch_page(self, url: str, timeout: int = 10) -> Optional[str]:
         """獲取頁面內容"""
         try:
-            if self.use_browser and self.page:
-                self.page.goto(url, wait_until='networkidle', timeout=timeout * 1000)
-                return self.page.content()
-            else:
-                response = self.session.get(url, timeout=timeout)
-                response.raise_for_status()
-                # 優先使用 UTF-8，避免編碼檢測錯誤
-                response.encoding = 'utf-8'
-                return response.text
+            with profiling.stage('fetch'):
+                if self.use_browser and self.page:
+                    response = self.page.goto(url, wait_until='networkidle', timeout=timeout * 1000)
+                    html = self.page.content()
+                    archive.record(self.SCRAPER_NAME, None, body=html, url=url,
+                                   status=response.status if response else 200)
+                    return html
+                else:
+                    response = self.session.get(url, timeout=timeout)
+                    self.archive_response(response)
+                    response.raise_for_status()
+                    # 優先使用 UTF-8，避免編碼檢測錯誤
+                    response.encoding = 'utf-8'
+                    return response.text
         except Exception as e:
             self.logger.error(f"獲取頁面失敗 {url}: {e}")
             return None
@@ -153,15 +178,31 @@ class BaseScraper(ABC):
     def fetch_json(self, url: str, timeout: int = 10) -> Optional[Dict]:
         """獲取JSON數據 (用於API)"""
         try:
-            response = self.session.get(url, timeout=timeout)
-            response.raise_for_status()
-            return response.json()
+            with profiling.stage('fetch'):
+                response = self.session.get(url, timeout=timeout)
+                self.archive_response(response)
+                response.raise_for_status()
+                return response.json()
         except Exception as e:
             self.logger.error(f"獲取JSON失敗 {url}: {e}")
             return None
     
+    def archive_response(self, response, body=None):
+        """將響應寫入原始響應存檔 (未啟用 --archive 時為空操作)"""
+        archive.record(self.SCRAPER_NAME, response, body=body)
+    
     # ============== 工具方法 ==============
     
+    def make_soup(self, html: str, parser: str = 'lxml') -> BeautifulSoup:
+        """構建 BeautifulSoup 樹 (計入 soup 階段)"""
+        with profiling.stage('soup'):
+            return BeautifulSoup(html, parser)
+    
+    def make_doc(self, html: str) -> 'html_parser.Document':
+        """構建 CSS 選擇器文檔 (selectolax / lxml 快速路徑，計入 soup 階段)"""
+        with profiling.stage('soup'):
+            return html_parser.parse_html(html, self.HTML_BACKEND)
+    
     def clean_text(self, text: str) -> str:
         """清理文本並轉換為繁體中文"""
         if not text:
@@ -176,7 +217,8 @@ class BaseScraper(ABC):
         if not text:
             return ""
         try:
-            return self.cc.convert(text)
+            with profiling.stage('opencc'):
+                return self.cc.convert(text)
         except:
             return text
     
@@ -185,6 +227,8 @@ class BaseScraper(ABC):
         """提取元素文本"""
         if element is None:
             return ""
+        if isinstance(element, html_parser.Node):
+            return element.text(strip=True)
         return element.get_text(strip=True) if hasattr(element, 'get_text') else str(element)
     
     @staticmethod
@@ -229,10 +273,56 @@ class BaseScraper(ABC):
         """解析詳情頁面，返回項目數據"""
         pass
     
-    @abstractmethod
+    # ============== 保存 / 離線重新解析 ==============
+    
     def save_item(self, data: Dict) -> bool:
-        """保存項目到資料庫"""
-        pass
+        """保存單個項目到資料庫"""
+        return self.save_items([data]) == 1
+    
+    def is_new_item(self, data: Dict) -> bool:
+        """資料庫中是否還沒有該項目 (按 SCHEMA 的業務主鍵；未定義 SCHEMA 時視為新項目)"""
+        if self.SCHEMA is None or data.get(self.SCHEMA.key) is None:
+            return True
+        conn = get_connection()
+        try:
+            return conn.execute(
+                f"SELECT 1 FROM {self.SCHEMA.table} WHERE {self.SCHEMA.key} = ?",
+                (str(data[self.SCHEMA.key]),)
+            ).fetchone() is None
+        finally:
+            conn.close()
+    
+    def save_items(self, items: List[Dict], checkpoint: Optional[Dict] = None) -> int:
+        """
+        批量保存項目 (一次 executemany、一次提交)，返回成功數量
+        
+        Args:
+            checkpoint: 分頁斷點 (category / transaction_type / page / cursor)，
+                        與這批項目在同一事務中寫入 scrape_checkpoints (見 checkpoints.py)
+        """
+        if self.SCHEMA is None:
+            raise NotImplementedError(f"{type(self).__name__} 未定義 SCHEMA，需覆寫 save_item / save_items")
+        if not items and checkpoint is None:
+            return 0
+        if self._writer is None:
+            self._writer = BatchWriter(self.SCHEMA, to_traditional=self.to_traditional, log=self.logger)
+        before_commit = None
+        if checkpoint is not None:
+            before_commit = lambda conn: checkpoints.record(conn, self.SCRAPER_NAME, **checkpoint)
+        saved = self._writer.write(items, before_commit=before_commit)
+        self.logger.debug(f"保存 {saved}/{len(items)} 條到 {self.SCHEMA.table}")
+        return saved
+    
+    def parse_archived(self, record) -> List[Dict]:
+        """
+        從存檔的原始響應重新解析項目 (scrapers/reparse.py 使用，不訪問網絡)
+        默認: 列表頁只產生 URL 不返回項目，詳情頁交給 parse_detail_page；
+        API / JSON 響應由子類覆寫處理
+        """
+        if record.status != 200 or self.is_list_page(record.url):
+            return []
+        data = self.parse_detail_page(record.text, record.url)
+        return [data] if data else []
     
     # ============== 主要運行方法 ==============
     
@@ -252,23 +342,27 @@ class BaseScraper(ABC):
             self.start_browser()
         
         try:
-            # 添加起始URL到隊列 (列表頁面優先級較低，讓詳情頁面先處理)
+            # 添加起始URL到隊列
             urls = start_urls or self.get_start_urls()
-            for url in urls:
-                add_url_to_queue(url, self.URL_TYPE, priority=1)
+            if not start_urls and self.DETAIL_URL_PATTERN:
+                # sitemap / feed 已包含詳情頁時直接入隊，不再爬列表頁
+                if discovery.discover(self)['covered']:
+                    urls = []
+            self.scheduler.enqueue(urls)
             
-            # 處理URL隊列
+            # 處理URL隊列 (取出的 URL 帶租約，其他 worker 不會重複處理)
             while self.stats['pages_scraped'] < max_pages:
-                unvisited = get_unvisited_urls(self.URL_TYPE, limit=5)
+                unvisited = self.frontier.lease(self.URL_TYPE, limit=5)
                 if not unvisited:
                     self.logger.info("沒有更多未訪問的URL")
                     break
                 
-                for url in unvisited:
+                for index, url in enumerate(unvisited):
                     if self.stats['pages_scraped'] >= max_pages:
+                        self.frontier.release(unvisited[index:])
                         break
                     
-                    self.logger.info(f"正在處理: {url}")
+                    self.progress_log("正在處理: %s", url)
                     self._process_url(url)
                     self.stats['pages_scraped'] += 1
                     
@@ -287,30 +381,40 @@ class BaseScraper(ABC):
     
     def _process_url(self, url: str):
         """處理單個URL"""
-        html = self.fetch_page(url)
-        if not html:
-            mark_url_visited(url, error="Failed to fetch")
-            return
-        
-        try:
-            if self.is_list_page(url):
-                items = self.parse_list_page(html, url)
-                for item in items:
-                    if 'url' in item:
-                        # 詳情頁面設置較高優先級，確保優先處理
-                        add_url_to_queue(item['url'], self.URL_TYPE, source_url=url, priority=5)
-            else:
-                data = self.parse_detail_page(html, url)
-                if data:
-                    if self.save_item(data):
-                        self.stats['items_saved'] += 1
-            
-            mark_url_visited(url)
+        start = time.perf_counter()
+        with profiling.track_url(url), log_pipeline.url_context(url):
+            html = self.fetch_page(url)
+            if not html:
+                self.frontier.done(url, error="Failed to fetch")
+                return
             
-        except Exception as e:
-            self.logger.error(f"處理頁面錯誤 {url}: {e}")
-            mark_url_visited(url, error=str(e))
-            self.stats['errors'] += 1
+            try:
+                if self.is_list_page(url):
+                    with profiling.stage('parse'):
+                        items = self.parse_list_page(html, url)
+                    with profiling.stage('save'):
+                        added = self.scheduler.enqueue([item['url'] for item in items if 'url' in item],
+                                                       source_url=url)
+                    self.scheduler.record(url, new_links=added)
+                else:
+                    with profiling.stage('parse'):
+                        data = self.parse_detail_page(html, url)
+                    new_item = False
+                    if data:
+                        new_item = self.is_new_item(data)
+                        with profiling.stage('save'):
+                            saved = self.save_item(data)
+                        if saved:
+                            self.stats['items_saved'] += 1
+                    self.scheduler.record(url, new_items=int(new_item))
+                
+                self.frontier.done(url)
+                self.logger.debug("頁面完成", extra={'stage': 'done', 'duration': round(time.perf_counter() - start, 3)})
+                
+            except Exception as e:
+                self.logger.error(f"處理頁面錯誤 {url}: {e}")
+                self.frontier.done(url, error=str(e))
+                self.stats['errors'] += 1
     
     def _print_stats(self):
         """打印統計信息"""
@@ -0,0 +1,146 @@
+"""
+51.ca 爬蟲 - 分頁斷點續爬
+API 分頁爬蟲 (房屋 / 工作 / 集市) 每完成一頁，把 (爬蟲, 分類, 交易類型) 的頁碼和游標
+寫入 scrape_checkpoints，與該頁項目在同一事務中提交 (見 BaseScraper.save_items 的
+checkpoint 參數)；中斷後以 --resume 運行即從下一頁繼續，已完成的頁不再重抓。
+
+生命週期:
+    非 --resume 運行開始時清除該爬蟲的舊斷點 (reset)
+    每頁保存時記錄頁碼 (record，不單獨提交)
+    一個分類 / 交易類型正常結束時標記完成 (finish)，續爬時整段跳過
+    全部完成後清除 (clear_if_finished)；中斷或出錯時保留，供下次續爬
+
+用法:
+    start = checkpoints.resume_page('house', resume, transaction_type=1)   # None = 已完成
+    self.save_items(items, checkpoint={'transaction_type': 1, 'page': page, 'cursor': last_id})
+"""
+
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+try:
+    from .models import get_connection
+except ImportError:
+    from models import get_connection
+
+
+class Checkpoint(NamedTuple):
+    """一段分頁的斷點"""
+    page: int                   # 最後完成的頁碼
+    cursor: Optional[str]       # 游標 (游標分頁的下一頁游標；頁碼分頁時為該頁最後一項 ID)
+    finished: bool              # 該段已正常結束
+
+
+def _key(scraper: str, category, transaction_type) -> tuple:
+    # 主鍵欄位不用 NULL (NULL 在 UNIQUE 中互不相等)
+    return (scraper, str(category or ''), str(transaction_type or ''))
+
+
+def load(scraper: str, category='', transaction_type='') -> Optional[Checkpoint]:
+    """讀取斷點，沒有時返回 None"""
+    conn = get_connection()
+    try:
+        row = conn.execute("""
+            SELECT page, cursor, finished FROM scrape_checkpoints
+            WHERE scraper = ? AND category = ? AND transaction_type = ?
+        """, _key(scraper, category, transaction_type)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return Checkpoint(row['page'], row['cursor'], bool(row['finished']))
+
+
+def resume_page(scraper: str, resume: bool, category='', transaction_type='') -> Optional[int]:
+    """
+    本段應從哪一頁開始
+
+    Returns:
+        起始頁碼；resume 且該段已完成時返回 None
+    """
+    if not resume:
+        return 1
+    checkpoint = load(scraper, category, transaction_type)
+    if checkpoint is None:
+        return 1
+    if checkpoint.finished:
+        return None
+    return checkpoint.page + 1
+
+
+def record(conn, scraper: str, category='', transaction_type='', page: int = 0,
+           cursor=None, finished: bool = False):
+    """在調用方的事務中記錄斷點 (不提交)"""
+    conn.execute("""
+        INSERT INTO scrape_checkpoints
+            (scraper, category, transaction_type, page, cursor, finished, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (scraper, category, transaction_type) DO UPDATE SET
+            page = excluded.page,
+            cursor = excluded.cursor,
+            finished = excluded.finished,
+            updated_at = excluded.updated_at
+    """, _key(scraper, category, transaction_type) + (
+        page, None if cursor is None else str(cursor), int(finished), datetime.now().isoformat()
+    ))
+
+
+def finish(scraper: str, category='', transaction_type=''):
+    """標記一段已正常結束 (保留最後頁碼)"""
+    conn = get_connection()
+    try:
+        cursor = conn.execute("""
+            UPDATE scrape_checkpoints SET finished = 1, updated_at = ?
+            WHERE scraper = ? AND category = ? AND transaction_type = ?
+        """, (datetime.now().isoformat(),) + _key(scraper, category, transaction_type))
+        if cursor.rowcount == 0:
+            # 第一頁就沒有數據，仍需記錄完成，續爬時跳過
+            record(conn, scraper, category, transaction_type, finished=True)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def reset(scraper: str):
+    """清除爬蟲的全部斷點"""
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM scrape_checkpoints WHERE scraper = ?", (scraper,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def clear_if_finished(scraper: str) -> bool:
+    """所有段都已完成時清除斷點，返回是否已清除"""
+    conn = get_connection()
+    try:
+        conn.execute("""
+            DELETE FROM scrape_checkpoints
+            WHERE scraper = ?
+              AND NOT EXISTS (SELECT 1 FROM scrape_checkpoints
+                              WHERE scraper = ? AND finished = 0)
+        """, (scraper, scraper))
+        conn.commit()
+        return not _exists(conn, scraper)
+    finally:
+        conn.close()
+
+
+def _exists(conn, scraper: str) -> bool:
+    return conn.execute("SELECT 1 FROM scrape_checkpoints WHERE scraper = ? LIMIT 1",
+                        (scraper,)).fetchone() is not None
+
+
+def list_checkpoints(scraper: Optional[str] = None) -> List[dict]:
+    """列出斷點 (按更新時間倒序)"""
+    sql = "SELECT * FROM scrape_checkpoints"
+    params = ()
+    if scraper:
+        sql += " WHERE scraper = ?"
+        params = (scraper,)
+    conn = get_connection()
+    try:
+        return [dict(row) for row in conn.execute(sql + " ORDER BY updated_at DESC", params).fetchall()]
+    finally:
+        conn.close()
@@ -0,0 +1,237 @@
+"""
+51.ca 爬蟲 - 正文提取 (文本密度)
+不猜選擇器，按 Readability 的思路找正文容器:
+- 一次遍歷所有段落元素 (p / pre / blockquote)，按長度和標點給段落打分，
+  分數累加到父元素 (全額) 和祖父元素 (一半)
+- class / id 帶 article / content 等加分，comment / sidebar 等減分
+- 得分最高的幾個候選扣除鏈接密度後取最高者
+
+勝出容器的選擇器按站點緩存 (同一模板的頁面結構相同)，之後的頁面先試緩存的選擇器，
+命中且文本足夠時直接使用，不再評分。
+
+用法:
+    body = content_extractor.extract(doc, site='news', is_valid=self._is_valid_paragraph)
+    body.paragraphs, body.images, body.text, body.selector
+"""
+
+import re
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+try:
+    from .html_parser import Node
+except ImportError:
+    from html_parser import Node
+
+# 參與評分的段落元素
+PARAGRAPH_SELECTOR = 'p, pre, blockquote'
+
+# 段落最短長度 (更短的不計分，也不作為正文段落)
+MIN_PARAGRAPH_LENGTH = 15
+
+# 正文最短長度: 緩存的選擇器命中的文本不足時重新評分；容器內有效段落不足時退回整頁段落
+MIN_CONTENT_LENGTH = 100
+
+# 參與鏈接密度比較的候選數
+TOP_CANDIDATES = 5
+
+# 每個站點最多緩存的模板選擇器
+MAX_TEMPLATES = 8
+
+POSITIVE_PATTERN = re.compile(r'article|content|body|post|entry|text|main|arc', re.I)
+NEGATIVE_PATTERN = re.compile(r'comment|footer|sidebar|recommend|related|nav|menu|share|ad-|banner', re.I)
+CLASS_WEIGHT = 25
+
+_IDENT_PATTERN = re.compile(r'[A-Za-z_][\w-]*')
+
+_templates: Dict[str, List[str]] = {}
+_templates_lock = threading.Lock()
+
+
+class Content(NamedTuple):
+    """正文提取結果"""
+    paragraphs: List[str]
+    images: List[str]
+    text: str                   # 正文容器的全部文本 (未找到容器時為空)
+    selector: Optional[str]     # 命中 / 學到的容器選擇器
+    node: Optional[Node]
+
+
+def extract(doc, site: Optional[str] = None, hints: Sequence[str] = (),
+            is_valid: Optional[Callable[[str], bool]] = None) -> Content:
+    """
+    提取正文
+
+    Args:
+        site: 模板緩存的鍵 (通常是爬蟲名)，None 時不緩存
+        hints: 已知的正文容器選擇器，存在即採用 (如活動頁的 #arcbody)
+        is_valid: 段落過濾函數，默認只按長度
+    """
+    is_valid = is_valid or _long_enough
+    node, selector = _match_known(doc, site, hints)
+    if node is None:
+        node = _best_candidate(doc)
+        selector = _remember(doc, site, node) if node is not None else None
+
+    if node is None:
+        return Content(_valid_texts(doc.css('p'), is_valid), [], '', None, None)
+
+    paragraphs = _valid_texts(node.css('p'), is_valid)
+    if not paragraphs:
+        # 容器內沒有 <p> (純文本 + <br>)，按行切分
+        paragraphs = [line for line in (l.strip() for l in node.text().splitlines()) if is_valid(line)]
+    if len('\n\n'.join(paragraphs)) < MIN_CONTENT_LENGTH:
+        page_paragraphs = _valid_texts(doc.css('p'), is_valid)
+        if len('\n\n'.join(page_paragraphs)) > len('\n\n'.join(paragraphs)):
+            paragraphs = page_paragraphs
+    return Content(paragraphs, image_urls(node), node.text(), selector, node)
+
+
+def image_urls(node) -> List[str]:
+    """元素內的圖片 URL (優先懶加載屬性，去重保序，跳過 data URI)"""
+    return image_urls_of(node.css('img'))
+
+
+def image_urls_of(imgs) -> List[str]:
+    """img 元素列表的圖片 URL (規則同 image_urls)"""
+    urls = []
+    for img in imgs:
+        src = img.attr('data-src') or img.attr('data-srcset') or img.attr('src')
+        if src:
+            src = src.strip()
+        if src and not src.startswith('data:') and src not in urls:
+            urls.append(src)
+    return urls
+
+
+def learned_templates(site: str) -> List[str]:
+    """已緩存的模板選擇器 (最近命中的在前)"""
+    with _templates_lock:
+        return list(_templates.get(site, []))
+
+
+def clear_templates():
+    with _templates_lock:
+        _templates.clear()
+
+
+# ============== 評分 ==============
+
+def _best_candidate(doc) -> Optional[Node]:
+    """一次遍歷段落元素評分，返回扣除鏈接密度後得分最高的容器"""
+    scores = {}  # 容器 -> 得分
+
+    for elem in doc.css(PARAGRAPH_SELECTOR):
+        text = elem.text(strip=True)
+        if len(text) < MIN_PARAGRAPH_LENGTH:
+            continue
+        score = 1 + text.count(',') + text.count('，') + text.count('。') + min(len(text) // 100, 3)
+        parent = elem.parent
+        if parent is None:
+            continue
+        _add_score(scores, parent, score)
+        grandparent = parent.parent
+        if grandparent is not None:
+            _add_score(scores, grandparent, score / 2)
+
+    if not scores:
+        return None
+
+    top = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:TOP_CANDIDATES]
+    best, best_score = None, 0
+    for node, score in top:
+        score *= 1 - _link_density(node)
+        if score > best_score:
+            best, best_score = node, score
+    return best
+
+
+def _add_score(scores: Dict, node: Node, score: float):
+    if node not in scores:
+        if node.tag in ('html', 'body'):
+            return
+        scores[node] = _class_weight(node)
+    scores[node] += score
+
+
+def _class_weight(node: Node) -> float:
+    weight = 0
+    for value in (node.attr('class'), node.attr('id')):
+        if not value:
+            continue
+        if NEGATIVE_PATTERN.search(value):
+            weight -= CLASS_WEIGHT
+        if POSITIVE_PATTERN.search(value):
+            weight += CLASS_WEIGHT
+    return weight
+
+
+def _link_density(node: Node) -> float:
+    text_length = len(node.text(strip=True))
+    if not text_length:
+        return 1.0
+    link_length = sum(len(a.text(strip=True)) for a in node.css('a'))
+    return min(link_length / text_length, 1.0)
+
+
+def _valid_texts(elems, is_valid) -> List[str]:
+    texts = []
+    for elem in elems:
+        text = elem.text(strip=True)
+        if is_valid(text):
+            texts.append(text)
+    return texts
+
+
+def _long_enough(text: str) -> bool:
+    return len(text) >= MIN_PARAGRAPH_LENGTH
+
+
+# ============== 模板緩存 ==============
+
+def _match_known(doc, site: Optional[str], hints: Sequence[str]):
+    """先試已知選擇器: hints 存在即採用；緩存的選擇器需有足夠文本"""
+    for selector in hints:
+        node = doc.css_first(selector)
+        if node is not None:
+            return node, selector
+    if site is None:
+        return None, None
+    for selector in learned_templates(site):
+        node = doc.css_first(selector)
+        if node is not None and len(node.text(strip=True)) >= MIN_CONTENT_LENGTH:
+            _promote(site, selector)
+            return node, selector
+    return None, None
+
+
+def _selector_for(doc, node: Node) -> Optional[str]:
+    """為容器生成選擇器 (id 或 標籤+class)，只在它能唯一定位到該容器時返回"""
+    node_id = node.attr('id')
+    if node_id and _IDENT_PATTERN.fullmatch(node_id) and not re.search(r'\d{3,}', node_id):
+        selector = f'#{node_id}'
+    else:
+        classes = [c for c in node.classes
+                   if _IDENT_PATTERN.fullmatch(c) and not re.search(r'\d{3,}', c)]
+        if not classes:
+            return None
+        selector = node.tag + ''.join(f'.{c}' for c in classes)
+    return selector if doc.css_first(selector) == node else None
+
+
+def _remember(doc, site: Optional[str], node: Node) -> Optional[str]:
+    selector = _selector_for(doc, node)
+    if site is not None and selector:
+        _promote(site, selector)
+    return selector
+
+
+def _promote(site: str, selector: str):
+    with _templates_lock:
+        selectors = _templates.setdefault(site, [])
+        if selectors and selectors[0] == selector:
+            return
+        if selector in selectors:
+            selectors.remove(selector)
+        selectors.insert(0, selector)
+        del selectors[MAX_TEMPLATES:]
@@ -0,0 +1,124 @@
+"""
+51.ca 爬蟲 - 詳情請求規劃
+API 爬蟲 (房屋 / 集市) 的列表接口已給出大部分欄位，詳情接口只補充描述、圖片、聯繫方式等
+發布後很少變化的欄位。刷新時按列表記錄與資料庫中已存的行逐項判斷是否需要請求詳情:
+
+    new       資料庫中沒有該項目
+    changed   列表可見的欄位 (價格、標題、房型 ...) 有變化
+    missing   從未取得過詳情 (detail_fetched_at 為空) 或必需的詳情欄位為空 (同 update_missing_details)
+
+其餘項目不請求詳情，詳情欄位從已存的行補回 (upsert 會覆蓋整行，不補回會被列表值清空)。
+
+用法:
+    planner = DetailPlanner(HOUSE_LISTINGS, HOUSE_COMPARE_FIELDS, HOUSE_DETAIL_FIELDS,
+                            required_fields=('description',), to_traditional=self.to_traditional)
+    for item, reason in zip(items, planner.plan(items)):
+        if reason:
+            item.update(fetch_detail(item))
+            planner.mark_fetched(item)
+"""
+
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+try:
+    from .models import get_connection
+except ImportError:
+    from models import get_connection
+
+# 記錄詳情取得時間的欄位 (見 schema.py)
+FETCHED_FIELD = 'detail_fetched_at'
+
+# 每條查詢的主鍵數 (低於 SQLite 參數上限)
+LOOKUP_CHUNK = 500
+
+
+def _same(new, stored) -> bool:
+    """列表值與已存值是否相同 (欄位類型親和性會把數字存成文本或把文本存成數字)"""
+    if new in (None, '') or stored in (None, ''):
+        return new in (None, '') and stored in (None, '')
+    try:
+        return float(new) == float(stored)
+    except (TypeError, ValueError):
+        return str(new) == str(stored)
+
+
+class DetailPlanner:
+    """
+    Args:
+        schema: 資料表定義 (schema.TableSchema)
+        compare_fields: 列表可見、變化時需要重抓詳情的欄位
+        detail_fields: 只由詳情接口提供的欄位 (跳過請求時從已存的行補回)
+        required_fields: 為空時視為缺少詳情的欄位
+        to_traditional: 簡繁轉換 (比較前按寫入時的轉換處理列表值)
+    """
+
+    def __init__(self, schema, compare_fields: Iterable[str], detail_fields: Iterable[str],
+                 required_fields: Iterable[str] = (), to_traditional: Optional[Callable] = None):
+        self.schema = schema
+        fields = {f.name: f for f in schema.write_fields}
+        self.compare_fields = [fields[name] for name in compare_fields]
+        self.detail_fields = list(detail_fields)
+        self.required_fields = list(required_fields)
+        self.to_traditional = to_traditional
+        self.stats = {'new': 0, 'changed': 0, 'missing': 0, 'skipped': 0}
+
+    def plan(self, items: List[Dict]) -> List[Optional[str]]:
+        """
+        每個項目需要請求詳情的原因 ('new' / 'changed' / 'missing')，不需要時為 None
+
+        不需要請求的項目會就地補上已存的詳情欄位
+        """
+        stored = self._load([item.get(self.schema.key) for item in items])
+        reasons = []
+        for item in items:
+            row = stored.get(str(item.get(self.schema.key)))
+            reason = self._reason(item, row)
+            if reason is None:
+                for name in self.detail_fields + [FETCHED_FIELD]:
+                    item[name] = row[name]
+                self.stats['skipped'] += 1
+            else:
+                self.stats[reason] += 1
+            reasons.append(reason)
+        return reasons
+
+    @staticmethod
+    def mark_fetched(item: Dict):
+        """記錄已取得詳情 (隨項目一起寫入)"""
+        item[FETCHED_FIELD] = datetime.now().isoformat(timespec='seconds')
+
+    def summary(self) -> str:
+        fetched = self.stats['new'] + self.stats['changed'] + self.stats['missing']
+        return (f"詳情請求 {fetched} (新 {self.stats['new']} / 變化 {self.stats['changed']} / "
+                f"缺詳情 {self.stats['missing']})，跳過 {self.stats['skipped']}")
+
+    def _reason(self, item: Dict, row) -> Optional[str]:
+        if row is None:
+            return 'new'
+        for field in self.compare_fields:
+            if not _same(field.value(item, self.to_traditional), row[field.name]):
+                return 'changed'
+        if not row[FETCHED_FIELD] or any(row[name] in (None, '') for name in self.required_fields):
+            return 'missing'
+        return None
+
+    def _load(self, keys: List) -> Dict[str, Dict]:
+        """按業務主鍵批量讀取已存的行"""
+        keys = [str(key) for key in dict.fromkeys(keys) if key is not None]
+        columns = dict.fromkeys([self.schema.key, FETCHED_FIELD]
+                                + [f.name for f in self.compare_fields]
+                                + self.detail_fields + self.required_fields)
+        stored = {}
+        conn = get_connection()
+        try:
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[start:start + LOOKUP_CHUNK]
+                rows = conn.execute(
+                    f"SELECT {', '.join(columns)} FROM {self.schema.table} "
+                    f"WHERE {self.schema.key} IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                stored.update((str(row[self.schema.key]), row) for row in rows)
+        finally:
+            conn.close()
+        return stored
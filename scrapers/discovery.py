@@ -0,0 +1,361 @@
+"""
+51.ca 爬蟲 - sitemap / feed URL 發現
+從 robots.txt 聲明的 sitemap (沒有聲明時試 /sitemap.xml) 和爬蟲的 FEED_URLS 直接取得詳情頁 URL，
+不再為了收集鏈接而爬列表頁:
+
+    - sitemap、sitemap 索引、RSS 2.0 / RSS 1.0、Atom 用同一個 iterparse 流式解析，
+      逐條產出後即從樹上移除，數萬條 URL 的 sitemap 也不整個載入內存
+    - 每個文件記錄 ETag / Last-Modified (discovery_sources 表)，下次條件請求，未修改時 304 跳過；
+      sitemap 索引中 lastmod 未變的子 sitemap 不再下載
+    - 匹配 DETAIL_URL_PATTERN 的 URL 連同 lastmod 分批經 scheduler 按產出計算優先級後交給
+      frontier.add_discovered: 新 URL 入隊，lastmod 晚於上次訪問的已訪問 URL 重新入隊，其餘不變
+
+沒有 sitemap / feed 包含本爬蟲的詳情頁時返回 covered=0，爬蟲照常從列表頁開始 (見 BaseScraper.run)。
+
+用法:
+    python -m scrapers.discovery news auto event house
+"""
+
+import io
+import re
+import gzip
+import json
+import logging
+import xml.etree.ElementTree as ET
+from collections import deque
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterator, List, NamedTuple, Optional
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+try:
+    from .models import get_connection
+    from .http_client import get_session
+except ImportError:
+    from models import get_connection
+    from http_client import get_session
+
+logger = logging.getLogger(__name__)
+
+# 每批交給 frontier 的 URL 數
+BATCH_SIZE = 2000
+
+# sitemap 索引最大嵌套層數
+MAX_DEPTH = 3
+
+# 單次發現最多讀取的 sitemap / feed 文件數
+MAX_DOCUMENTS = 200
+
+# (連接, 讀取) 超時；大 sitemap 流式讀取，讀取超時按單次讀計
+REQUEST_TIMEOUT = (5, 60)
+
+STAT_KEYS = ('sources', 'covered', 'fetched', 'unchanged', 'found', 'queued')
+
+
+class Entry(NamedTuple):
+    """sitemap / feed 中的一條記錄"""
+    url: str
+    lastmod: Optional[str]      # 本地時間 'YYYY-MM-DD HH:MM:SS'，未提供時為 None
+    is_sitemap: bool            # sitemap 索引中的子 sitemap
+
+
+# ============== 解析 ==============
+
+def _local(tag: str) -> str:
+    """去掉命名空間的標籤名"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def normalize_time(text: Optional[str]) -> Optional[str]:
+    """W3C 日期 (sitemap / Atom) 或 RFC 822 日期 (RSS) 轉為本地時間字符串，與 url_queue.visited_at 可比較"""
+    text = (text or '').strip()
+    if not text:
+        return None
+    try:
+        value = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            value = parsedate_to_datetime(text)
+        except (TypeError, ValueError):
+            return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return str(value.replace(microsecond=0))
+
+
+def _entry(kind: str, elem) -> Optional[Entry]:
+    """一個已結束的元素對應的記錄 (不是記錄元素時返回 None)"""
+    tag = _local(elem.tag)
+    if kind in ('urlset', 'sitemapindex') and tag in ('url', 'sitemap'):
+        values = {_local(child.tag): (child.text or '').strip() for child in elem}
+        if values.get('loc'):
+            return Entry(values['loc'], normalize_time(values.get('lastmod')), tag == 'sitemap')
+    elif tag == 'item':
+        # RSS 2.0 / RSS 1.0 (RDF)
+        values = {_local(child.tag): (child.text or '').strip() for child in elem}
+        link = values.get('link') or elem.get('{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about')
+        if link:
+            return Entry(link, normalize_time(values.get('pubDate') or values.get('date')), False)
+    elif tag == 'entry' and kind == 'feed':
+        # Atom: rel="alternate" (或不帶 rel) 的 link
+        link = None
+        updated = None
+        for child in elem:
+            name = _local(child.tag)
+            if name == 'link' and child.get('rel', 'alternate') == 'alternate':
+                link = link or child.get('href')
+            elif name in ('updated', 'published') and updated is None:
+                updated = child.text
+        if link:
+            return Entry(link, normalize_time(updated), False)
+    return None
+
+
+def parse_document(stream) -> Iterator[Entry]:
+    """
+    流式解析 sitemap / sitemap 索引 / RSS / Atom
+
+    Args:
+        stream: 二進制文件對象 (如 response.raw)
+    """
+    parents = []
+    kind = None
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if kind is None:
+                kind = _local(elem.tag)
+            parents.append(elem)
+            continue
+        parents.pop()
+        entry = _entry(kind, elem)
+        if entry is None:
+            continue
+        # 產出後從父元素移除，已解析的部分不留在內存中
+        if parents:
+            parents[-1].remove(elem)
+        yield entry
+
+
+# ============== 抓取 ==============
+
+def sitemaps_from_robots(base_url: str, session=None) -> List[str]:
+    """robots.txt 中聲明的 sitemap；沒有聲明時返回 [/sitemap.xml]"""
+    session = session or get_session()
+    parsed = urlparse(base_url)
+    origin = f"{parsed.scheme}://{parsed.netloc}"
+    sitemaps = []
+    try:
+        response = session.get(f"{origin}/robots.txt", timeout=REQUEST_TIMEOUT)
+        if response.status_code == 200:
+            for line in response.text.splitlines():
+                key, _, value = line.partition(':')
+                if key.strip().lower() == 'sitemap' and value.strip():
+                    sitemaps.append(urljoin(origin, value.strip()))
+    except requests.RequestException as e:
+        logger.debug(f"讀取 robots.txt 失敗 {origin}: {e}")
+    return sitemaps or [f"{origin}/sitemap.xml"]
+
+
+def _body(response):
+    """響應體的流式文件對象 (解開傳輸壓縮和 .xml.gz sitemap)"""
+    response.raw.decode_content = True
+    # 讀完後不自動關閉，BufferedReader 才能正常讀到 EOF
+    response.raw.auto_close = False
+    body = io.BufferedReader(response.raw)
+    if body.peek(2)[:2] == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj=body)
+    return body
+
+
+# ============== 狀態 ==============
+
+def _load_state(url_type: str, source: str) -> Optional[Dict]:
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            "SELECT * FROM discovery_sources WHERE url_type = ? AND source = ?", (url_type, source)
+        ).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+
+def _save_state(url_type: str, source: str, response, lastmod: Optional[str], urls: int,
+                children: List):
+    conn = get_connection()
+    try:
+        conn.execute("""
+            INSERT OR REPLACE INTO discovery_sources
+                (url_type, source, etag, last_modified, lastmod, urls, children, checked_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (url_type, source, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+              lastmod, urls, json.dumps(children) if children else None, datetime.now()))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# ============== 發現 ==============
+
+class Discovery:
+    """一個 URL 類型 (爬蟲) 的 sitemap / feed 發現"""
+
+    def __init__(self, url_type: str, base_url: str, detail_pattern: str, scheduler,
+                 feed_urls: List[str] = None, session=None):
+        self.url_type = url_type
+        self.base_url = base_url
+        self.host = urlparse(base_url).netloc
+        self.detail_pattern = re.compile(detail_pattern)
+        self.scheduler = scheduler
+        self.feed_urls = list(feed_urls or [])
+        self.session = session or get_session()
+
+    def match(self, url: str) -> Optional[str]:
+        """屬於本爬蟲的詳情頁 URL (去掉查詢和錨點)，否則返回 None"""
+        parsed = urlparse(url.strip())
+        if parsed.netloc != self.host or not self.detail_pattern.search(parsed.path):
+            return None
+        return f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+
+    def run(self, max_documents: int = MAX_DOCUMENTS) -> Dict[str, int]:
+        """
+        讀取全部 sitemap / feed 並入隊
+
+        Returns:
+            {'sources': 存在的 sitemap / feed 數, 'covered': 其中包含本爬蟲詳情頁的數量,
+             'fetched': 下載解析的文件數, 'unchanged': 未修改跳過的文件數,
+             'found': 匹配的 URL 數, 'queued': 新入隊或重新入隊數}
+        """
+        stats = dict.fromkeys(STAT_KEYS, 0)
+        pending = deque((url, 0, None) for url in sitemaps_from_robots(self.base_url, self.session))
+        pending.extend((url, 0, None) for url in self.feed_urls)
+        seen = set()
+
+        while pending and stats['fetched'] < max_documents:
+            source, depth, lastmod = pending.popleft()
+            if source in seen:
+                continue
+            seen.add(source)
+            state = _load_state(self.url_type, source)
+
+            # 索引中的 lastmod 未變: 子 sitemap 內容未變
+            if lastmod and state and state['lastmod'] and lastmod <= state['lastmod']:
+                self._unchanged(state, stats)
+                continue
+
+            headers = {}
+            if state and state['etag']:
+                headers['If-None-Match'] = state['etag']
+            if state and state['last_modified']:
+                headers['If-Modified-Since'] = state['last_modified']
+            try:
+                response = self.session.get(source, headers=headers, stream=True, timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                logger.warning(f"讀取 {source} 失敗: {e}")
+                continue
+
+            with response:
+                if response.status_code == 304:
+                    # 索引本身未變，子 sitemap 仍按各自的 lastmod / ETag 檢查
+                    pending.extend((url, depth + 1, child_lastmod)
+                                   for url, child_lastmod in json.loads(state['children'] or '[]'))
+                    self._unchanged(state, stats)
+                    continue
+                if response.status_code != 200:
+                    logger.debug(f"{source} 返回 {response.status_code}")
+                    continue
+                children = []
+                try:
+                    count = self._consume(parse_document(_body(response)), children, stats)
+                except (ET.ParseError, OSError) as e:
+                    logger.warning(f"解析 {source} 失敗: {e}")
+                    continue
+                _save_state(self.url_type, source, response, lastmod, count, children)
+                if depth < MAX_DEPTH:
+                    pending.extend((url, depth + 1, child_lastmod) for url, child_lastmod in children)
+            stats['sources'] += 1
+            stats['fetched'] += 1
+            stats['covered'] += bool(count)
+
+        logger.info(
+            f"[{self.url_type}] URL 發現: {stats['sources']} 個 sitemap / feed "
+            f"(下載 {stats['fetched']}, 未修改 {stats['unchanged']})，"
+            f"匹配 {stats['found']} 個 URL，入隊 {stats['queued']}"
+        )
+        return stats
+
+    @staticmethod
+    def _unchanged(state: Dict, stats: Dict):
+        stats['sources'] += 1
+        stats['unchanged'] += 1
+        stats['covered'] += bool(state['urls'])
+
+    def _consume(self, entries: Iterator[Entry], children: List, stats) -> int:
+        """子 sitemap 收集到 children，詳情頁 URL 分批入隊，返回匹配數"""
+        batch = []
+        count = 0
+        for entry in entries:
+            if entry.is_sitemap:
+                children.append((urljoin(self.base_url, entry.url), entry.lastmod))
+                continue
+            url = self.match(entry.url)
+            if not url:
+                continue
+            batch.append((url, entry.lastmod))
+            count += 1
+            if len(batch) >= BATCH_SIZE:
+                stats['queued'] += self._flush(batch)
+                batch = []
+        if batch:
+            stats['queued'] += self._flush(batch)
+        stats['found'] += count
+        return count
+
+    def _flush(self, batch) -> int:
+        return self.scheduler.enqueue_discovered(batch)
+
+
+def discover(scraper, max_documents: int = MAX_DOCUMENTS) -> Dict[str, int]:
+    """按爬蟲的 BASE_URL / DETAIL_URL_PATTERN / FEED_URLS 發現 URL 並經其 scheduler 入隊"""
+    if not scraper.DETAIL_URL_PATTERN:
+        return dict.fromkeys(STAT_KEYS, 0)
+    return Discovery(
+        scraper.URL_TYPE,
+        scraper.BASE_URL,
+        scraper.DETAIL_URL_PATTERN,
+        scraper.scheduler,
+        feed_urls=scraper.FEED_URLS,
+    ).run(max_documents)
+
+
+def main():
+    import argparse
+    import importlib
+    scrapers = {
+        'news': ('scrapers.news_scraper', 'NewsScraper'),
+        'house': ('scrapers.house_scraper', 'HouseScraper'),
+        'auto': ('scrapers.auto_scraper', 'AutoScraper'),
+        'event': ('scrapers.event_scraper', 'EventScraper'),
+    }
+    parser = argparse.ArgumentParser(description='從 sitemap / RSS / Atom 發現詳情頁 URL 並入隊')
+    parser.add_argument('scrapers', nargs='+', choices=sorted(scrapers), help='爬蟲名稱')
+    parser.add_argument('--max-documents', type=int, default=MAX_DOCUMENTS,
+                        help=f'最多讀取的 sitemap / feed 文件數 (默認: {MAX_DOCUMENTS})')
+    args = parser.parse_args()
+
+    try:
+        from .models import init_database
+    except ImportError:
+        from models import init_database
+    for name in args.scrapers:
+        module, cls = scrapers[name]
+        scraper = getattr(importlib.import_module(module), cls)()
+        init_database()
+        stats = discover(scraper, args.max_documents)
+        print(f"{name}: {stats}")
+
+
+if __name__ == '__main__':
+    main()
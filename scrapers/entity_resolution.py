@@ -0,0 +1,401 @@
+"""
+51.ca 爬蟲 - 跨爬取模式的實體合併
+同一實體可能以不同主鍵出現多次:
+
+    house_listings   API 模式 (MLS 編號) 和 run_html (出租頁 URL 中的數字) 各存一行
+    market_posts     賣家重新發布 / 不同爬蟲版本各存一行
+    auto_listings    車源同時出現在集市 (source != 'market') 和汽車頻道
+
+按分塊鍵 (blocking key) 把可能重複的行分組，只在組內兩兩比較，整體接近線性:
+
+    房屋         規範化地址 (門牌 + 街名) + 價格區間 (相鄰區間各出一個鍵，差距在 PRICE_TOLERANCE 內必定同組)；
+                 確認: 單位號相同或一方缺失、價格差距在容差內、交易類型 / 臥室數不衝突
+    集市 / 汽車  聯繫電話 (沒有時用賣家 uid) + 標題字符 3-gram 的 MinHash (NUM_HASHES 個鍵)，車架號直接作鍵；
+                 確認: 同一聯繫方式、標題 Jaccard 相似度 >= TITLE_SIMILARITY、價格差距在容差內
+超過 MAX_BLOCK_SIZE 的組 (如公共電話) 不比較，避免退化為平方級。
+
+確認重複的行用並查集合併為實體，每行的 canonical_id 指向主庫 entities 表中的實體
+(primary_table / primary_id 為代表行: 汽車優先於集市，其次 id 最小)。重新運行時沿用已有的實體 id。
+去重後的統計 / 導出只取 canonical_id 為空 (未合併的新行) 或代表行，見 primary_rows_sql()。
+
+用法:
+    python -m scrapers.entity_resolution
+    python -m scrapers.entity_resolution --dry-run
+    python testing/run.py --resolve
+"""
+
+import re
+import math
+import sqlite3
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from . import models
+    from . import shards
+except ImportError:
+    import models
+    import shards
+
+logger = logging.getLogger(__name__)
+
+# 價格差距容差 (相對較高的價格)
+PRICE_TOLERANCE = 0.05
+
+# 標題相似度閾值 (3-gram Jaccard)
+TITLE_SIMILARITY = 0.6
+
+# 每個聯繫方式的 MinHash 鍵數 (相似度 0.6 的兩行至少共享一個鍵的概率約 97%)
+NUM_HASHES = 4
+
+# 超過此行數的分塊不做兩兩比較
+MAX_BLOCK_SIZE = 50
+
+# 代表行優先的表 (同一實體出現在汽車頻道和集市時以汽車為準)
+TABLE_RANK = {'auto_listings': 0, 'house_listings': 0, 'market_posts': 1}
+
+# 地址中的街道類型縮寫
+STREET_ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'av': 'ave', 'road': 'rd', 'drive': 'dr', 'boulevard': 'blvd',
+    'crescent': 'cres', 'court': 'crt', 'ct': 'crt', 'place': 'pl', 'lane': 'ln', 'circle': 'cir',
+    'parkway': 'pkwy', 'square': 'sq', 'trail': 'trl', 'terrace': 'terr', 'highway': 'hwy',
+    'gardens': 'gdns', 'heights': 'hts', 'way': 'way', 'gate': 'gt',
+    'east': 'e', 'west': 'w', 'north': 'n', 'south': 's',
+}
+
+
+# ============== 規範化 ==============
+
+def normalize_address(text: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    地址 -> (門牌 + 街名, 單位號)
+    '1203-88 Harbour Street' / '88 Harbour St, Unit 1203, Toronto' -> ('88 harbour st', '1203')
+    """
+    if not text:
+        return None, None
+    street = text.split(',')[0].lower().strip()
+    unit = None
+    match = re.search(r'(?:unit|apt|suite|#)\s*([\w]+)', text.lower())
+    if match:
+        unit = match.group(1)
+        street = street.replace(match.group(0), ' ')
+    match = re.match(r'\s*([a-z]?\d+[a-z]?)\s*-\s*(\d+.*)', street)
+    if match:
+        unit = unit or match.group(1)
+        street = match.group(2)
+    tokens = [STREET_ABBREVIATIONS.get(t, t) for t in re.findall(r'[a-z0-9]+', street)]
+    if not tokens or not tokens[0][0].isdigit():
+        return None, unit
+    return ' '.join(tokens), unit
+
+
+def normalize_phone(text: Optional[str]) -> Optional[str]:
+    """電話只保留數字 (北美號碼取後 10 位)；非數字的加密電話原樣返回"""
+    if not text:
+        return None
+    digits = re.sub(r'\D', '', str(text))
+    if len(digits) >= 10:
+        return digits[-10:]
+    return str(text).strip() or None
+
+
+def title_shingles(title: Optional[str], size: int = 3) -> frozenset:
+    """標題去掉空白和標點後的字符 n-gram (中英文通用)"""
+    text = re.sub(r'[\W_]+', '', (title or '').lower())
+    if len(text) <= size:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + size] for i in range(len(text) - size + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def price_bands(price) -> List[str]:
+    """價格所在的對數區間及其上一個區間 (差距在容差內的兩個價格至少共享一個)"""
+    if not price or price <= 0:
+        return ['-']
+    band = math.floor(math.log(price) / math.log(1 + PRICE_TOLERANCE))
+    return [str(band), str(band + 1)]
+
+
+def _price_close(a, b) -> bool:
+    if not a or not b:
+        return True
+    return abs(a - b) <= PRICE_TOLERANCE * max(a, b)
+
+
+def _compatible(a, b) -> bool:
+    """兩個可選值不衝突 (一方缺失或相等)"""
+    return a in (None, '') or b in (None, '') or str(a) == str(b)
+
+
+# ============== 記錄與分塊鍵 ==============
+
+class Record:
+    """參與比較的一行"""
+
+    __slots__ = ('table', 'id', 'canonical_id', 'price', 'fields')
+
+    def __init__(self, table: str, row, fields: Dict):
+        self.table = table
+        self.id = row['id']
+        self.canonical_id = row['canonical_id']
+        self.price = row['price']
+        self.fields = fields
+
+    @property
+    def ref(self) -> Tuple[str, int]:
+        return self.table, self.id
+
+
+def _house_records(conn) -> List[Record]:
+    records = []
+    for row in conn.execute("""
+        SELECT id, canonical_id, price, address, listing_type, bedrooms FROM house_listings
+    """):
+        street, unit = normalize_address(row['address'])
+        records.append(Record('house_listings', row, {
+            'street': street, 'unit': unit,
+            'listing_type': row['listing_type'], 'bedrooms': row['bedrooms'],
+        }))
+    return records
+
+
+def _listing_records(conn) -> List[Record]:
+    records = []
+    sources = [
+        ('market_posts', "SELECT id, canonical_id, price, title, contact_phone AS phone, "
+                         "user_uid AS uid, NULL AS vin FROM market_posts"),
+        ('auto_listings', "SELECT id, canonical_id, price, title, dealer_phone AS phone, "
+                          "NULL AS uid, vin FROM auto_listings"),
+    ]
+    for table, sql in sources:
+        try:
+            rows = conn.execute(sql).fetchall()
+        except sqlite3.OperationalError:
+            continue
+        for row in rows:
+            phone = normalize_phone(row['phone'])
+            contact = f"tel:{phone}" if phone else (f"uid:{row['uid']}" if row['uid'] else None)
+            records.append(Record(table, row, {
+                'contact': contact,
+                'shingles': title_shingles(row['title']),
+                'vin': (row['vin'] or '').strip().upper() or None,
+            }))
+    return records
+
+
+def _house_keys(record: Record) -> Iterable[str]:
+    if record.fields['street']:
+        for band in price_bands(record.price):
+            yield f"{record.fields['street']}|{band}"
+
+
+def _house_same(a: Record, b: Record) -> bool:
+    return (_compatible(a.fields['unit'], b.fields['unit'])
+            and _price_close(a.price, b.price)
+            and _compatible(a.fields['listing_type'], b.fields['listing_type'])
+            and _compatible(a.fields['bedrooms'], b.fields['bedrooms']))
+
+
+def _listing_keys(record: Record) -> Iterable[str]:
+    if record.fields['vin']:
+        yield f"vin:{record.fields['vin']}"
+    contact, shingles = record.fields['contact'], record.fields['shingles']
+    if contact and shingles:
+        # MinHash: 每個種子取哈希最小的 3-gram (只在本進程內比較，hash() 的隨機化不影響)
+        for seed in range(NUM_HASHES):
+            yield f"{contact}|{seed}|{min(shingles, key=lambda s: hash((seed, s)))}"
+
+
+def _listing_same(a: Record, b: Record) -> bool:
+    if a.fields['vin'] and a.fields['vin'] == b.fields['vin']:
+        return True
+    return (a.fields['contact'] == b.fields['contact']
+            and jaccard(a.fields['shingles'], b.fields['shingles']) >= TITLE_SIMILARITY
+            and _price_close(a.price, b.price))
+
+
+# 實體類型 -> (讀取記錄, 分塊鍵, 確認重複)
+KINDS = {
+    'house': (_house_records, _house_keys, _house_same),
+    'listing': (_listing_records, _listing_keys, _listing_same),
+}
+
+
+# ============== 合併 ==============
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent
+        root = parent.setdefault(x, x)
+        while root != parent[root]:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def cluster(records: List[Record], keys, same, stats: Optional[Dict] = None) -> List[List[Record]]:
+    """按分塊鍵分組、組內兩兩確認，返回實體 (行的列表)"""
+    stats = stats if stats is not None else {}
+    blocks = {}
+    for index, record in enumerate(records):
+        for key in keys(record):
+            blocks.setdefault(key, []).append(index)
+
+    uf = _UnionFind()
+    compared = skipped = 0
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        if len(members) > MAX_BLOCK_SIZE:
+            skipped += 1
+            continue
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if uf.find(a) == uf.find(b):
+                    continue
+                compared += 1
+                if same(records[a], records[b]):
+                    uf.union(a, b)
+
+    groups = {}
+    for index in range(len(records)):
+        groups.setdefault(uf.find(index), []).append(records[index])
+    stats.update(blocks=len(blocks), compared=compared, oversized_blocks=skipped)
+    return list(groups.values())
+
+
+def _primary(group: List[Record]) -> Record:
+    return min(group, key=lambda r: (TABLE_RANK.get(r.table, 9), r.id))
+
+
+def assign(groups: List[List[Record]], next_id: int) -> Tuple[List[Dict], int]:
+    """
+    為每個實體選定 id: 沿用成員已有的最小 canonical_id (實體拆分時其餘部分用新 id)
+
+    Returns:
+        ([{'id', 'primary', 'members'}], 下一個可用 id)
+    """
+    entities = []
+    used = set()
+    # 大的實體先選，拆分時保留原 id 的是主要部分
+    for group in sorted(groups, key=len, reverse=True):
+        existing = sorted({r.canonical_id for r in group if r.canonical_id is not None} - used)
+        if existing:
+            entity_id = existing[0]
+        else:
+            entity_id = next_id
+            next_id += 1
+        used.add(entity_id)
+        entities.append({'id': entity_id, 'primary': _primary(group), 'members': group})
+    return entities, next_id
+
+
+def _database_paths() -> List[str]:
+    """含爬蟲資料表的資料庫文件: 主庫 + 全部分庫"""
+    return [models.DB_PATH] + list(shards.shard_files().values())
+
+
+def _write(entities: List[Dict], kind: str):
+    """更新各庫的 canonical_id (只寫有變化的行) 和主庫的 entities 表"""
+    changes = {}
+    for entity in entities:
+        for record in entity['members']:
+            if record.canonical_id != entity['id']:
+                changes.setdefault(record.table, []).append((entity['id'], record.id))
+
+    for path in _database_paths():
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table, rows in changes.items():
+                if table in tables:
+                    # 分庫的 id 互不重疊，不在本庫的 id 不會更新任何行
+                    conn.executemany(f"UPDATE {table} SET canonical_id = ? WHERE id = ?", rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+    now = datetime.now()
+    with models.use_shard(''):
+        conn = models.get_connection()
+        try:
+            conn.execute("DELETE FROM entities WHERE kind = ?", (kind,))
+            conn.executemany("""
+                INSERT OR REPLACE INTO entities (id, kind, primary_table, primary_id, members, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [(e['id'], kind, e['primary'].table, e['primary'].id, len(e['members']), now)
+                  for e in entities])
+            conn.commit()
+        finally:
+            conn.close()
+    return sum(len(rows) for rows in changes.values())
+
+
+def resolve(kind: str, dry_run: bool = False) -> Dict:
+    """合併一類實體，返回統計"""
+    load, keys, same = KINDS[kind]
+    conn = models.get_read_connection()
+    try:
+        records = load(conn)
+    finally:
+        conn.close()
+
+    stats = {'kind': kind, 'rows': len(records)}
+    groups = cluster(records, keys, same, stats)
+    with models.use_shard(''):
+        conn = models.get_connection()
+        try:
+            next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM entities").fetchone()[0]
+        finally:
+            conn.close()
+    # 本類已有的實體 id 也不能分給新實體 (其他類的實體在 entities 表中)
+    next_id = max([next_id] + [r.canonical_id + 1 for r in records if r.canonical_id is not None])
+    entities, _ = assign(groups, next_id)
+    stats['entities'] = len(entities)
+    stats['duplicates'] = len(records) - len(entities)
+    stats['updated'] = 0 if dry_run else _write(entities, kind)
+    return stats
+
+
+def resolve_all(dry_run: bool = False) -> List[Dict]:
+    return [resolve(kind, dry_run=dry_run) for kind in KINDS]
+
+
+def primary_rows_sql(table: str) -> str:
+    """去重查詢的 WHERE 條件: 未合併的行或實體的代表行"""
+    return (f"({table}.canonical_id IS NULL OR EXISTS (SELECT 1 FROM entities e "
+            f"WHERE e.id = {table}.canonical_id AND e.primary_table = '{table}' AND e.primary_id = {table}.id))")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='合併不同爬取模式產生的重複房源 / 商品 / 車源')
+    parser.add_argument('--kind', choices=sorted(KINDS), help='只處理一類 (默認全部)')
+    parser.add_argument('--dry-run', action='store_true', help='只統計，不寫入 canonical_id')
+    args = parser.parse_args()
+
+    models.init_database()
+    results = [resolve(args.kind, args.dry_run)] if args.kind else resolve_all(args.dry_run)
+    for stats in results:
+        print(f"{stats['kind']}: {stats['rows']} 行 -> {stats['entities']} 個實體 "
+              f"(重複 {stats['duplicates']}，更新 {stats['updated']} 行；"
+              f"分塊 {stats['blocks']}，比較 {stats['compared']} 對，跳過過大分塊 {stats['oversized_blocks']})")
+
+
+if __name__ == '__main__':
+    main()
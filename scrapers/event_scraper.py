@@ -11,8 +11,6 @@ import re
 from typing import List, Dict, Optional
 from datetime import datetime
 
-from bs4 import BeautifulSoup
-
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -20,11 +18,13 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Handle both direct execution and package import
 try:
     from .base import BaseScraper
-    from .models import get_connection
+    from .schema import EVENTS
+    from . import content_extractor
 except ImportError:
     # Direct execution - use absolute imports
     from base import BaseScraper
-    from models import get_connection
+    from schema import EVENTS
+    import content_extractor
 
 
 class EventScraper(BaseScraper):
@@ -33,6 +33,8 @@ class EventScraper(BaseScraper):
     SCRAPER_NAME = "event"
     BASE_URL = "https://info.51.ca"  # 活動在 info.51.ca 子域名
     URL_TYPE = "event"
+    DETAIL_URL_PATTERN = r'/events/posts/\d+$'
+    SCHEMA = EVENTS
     
     # 活動分類
     CATEGORIES = [
@@ -59,16 +61,16 @@ class EventScraper(BaseScraper):
         解析活動列表頁面
         使用: li.wg51__feeds-item.event 選擇器
         """
-        soup = BeautifulSoup(html, "lxml")
+        doc = self.make_doc(html)
         items = []
         seen_urls = set()
         
         # 方法1: li.wg51__feeds-item.event (活動頁面的活動的locat方法.txt)
-        event_items = soup.select('li.wg51__feeds-item.event')
+        event_items = doc.css('li.wg51__feeds-item.event')
         for item in event_items:
-            link = item.find('a', href=True)
+            link = item.css_first('a[href]')
             if link:
-                href = link.get('href', '')
+                href = link.attr('href', '')
                 if href.startswith('/'):
                     event_url = f"{self.BASE_URL}{href}"
                 elif href.startswith('http'):
@@ -81,18 +83,18 @@ class EventScraper(BaseScraper):
                     seen_urls.add(event_url)
                     
                     # 提取 data-id
-                    event_id = link.get('data-id') or self.extract_id_from_url(event_url, r'/(\d+)$')
+                    event_id = link.attr('data-id') or self.extract_id_from_url(event_url, r'/(\d+)$')
                     items.append({
                         'url': event_url,
                         'event_id': event_id,
                     })
         
         # 方法2: li.wg51__feeds-item.stream-mixed-large (推廣/廣告)
-        promo_items = soup.select('li.wg51__feeds-item.stream-mixed-large')
+        promo_items = doc.css('li.wg51__feeds-item.stream-mixed-large')
         for item in promo_items:
-            link = item.find('a', href=True)
+            link = item.css_first('a[href]')
             if link:
-                href = link.get('href', '')
+                href = link.attr('href', '')
                 if '/events/posts/' in href:
                     if href.startswith('/'):
                         event_url = f"{self.BASE_URL}{href}"
@@ -107,9 +109,11 @@ class EventScraper(BaseScraper):
                         items.append({'url': event_url})
         
         # 方法3: 通用連結搜索 - 匹配 /events/posts/數字
-        event_links = soup.find_all('a', href=re.compile(r'/events/posts/\d+'))
+        event_links = doc.css('a[href*="/events/posts/"]')
         for link in event_links:
-            href = link.get('href', '')
+            href = link.attr('href', '')
+            if not re.search(r'/events/posts/\d+', href):
+                continue
             if href.startswith('/'):
                 event_url = f"{self.BASE_URL}{href}"
             elif href.startswith('http'):
@@ -130,7 +134,7 @@ class EventScraper(BaseScraper):
         解析活動詳情頁面
         CSS Selectors 來自 活動詳情頁面結構.txt
         """
-        soup = BeautifulSoup(html, "lxml")
+        doc = self.make_doc(html)
         
         event_id = self.extract_id_from_url(url, r'/(\d+)$')
         if not event_id:
@@ -138,24 +142,24 @@ class EventScraper(BaseScraper):
         
         # 標題: #article-main h1
         title = ""
-        title_elem = soup.select_one('#article-main h1')
+        title_elem = doc.css_first('#article-main h1')
         if title_elem:
-            title = self.clean_text(title_elem.get_text())
+            title = self.clean_text(title_elem.text())
         
         # 發佈時間: #article-main .article-meta .source span:nth-of-type(1)
         published_at = None
-        pub_elem = soup.select_one('#article-main .article-meta .source span')
+        pub_elem = doc.css_first('#article-main .article-meta .source span')
         if pub_elem:
-            published_at = self.clean_text(pub_elem.get_text())
+            published_at = self.clean_text(pub_elem.text())
         
         # 來源: #article-main .article-meta .source span:nth-of-type(2)
         source = None
-        source_elems = soup.select('#article-main .article-meta .source span')
+        source_elems = doc.css('#article-main .article-meta .source span')
         if len(source_elems) > 1:
-            source = self.clean_text(source_elems[1].get_text())
+            source = self.clean_text(source_elems[1].text())
         
         # 活動卡片: .events-card
-        card = soup.select_one('.events-card')
+        card = doc.css_first('.events-card')
         
         # 活動時間
         start_time = None
@@ -163,12 +167,12 @@ class EventScraper(BaseScraper):
         event_time_display = None
         if card:
             # 查找 dt + dd 配對
-            dts = card.find_all('dt')
+            dts = card.css('dt')
             for dt in dts:
-                dt_text = dt.get_text().strip()
-                dd = dt.find_next_sibling('dd')
+                dt_text = dt.text().strip()
+                dd = dt.next_sibling('dd')
                 if dd:
-                    dd_text = self.clean_text(dd.get_text())
+                    dd_text = self.clean_text(dd.text())
                     
                     if '活动时间' in dt_text or '活動時間' in dt_text:
                         event_time_display = dd_text
@@ -190,17 +194,17 @@ class EventScraper(BaseScraper):
         # 電話: dt:contains("联系电话") + dd 或 .events-card a.phone
         phone = self._extract_dd_value(card, ['联系电话', '聯繫電話', '電話'])
         if not phone and card:
-            phone_elem = card.select_one('a.phone')
+            phone_elem = card.css_first('a.phone')
             if phone_elem:
-                phone = self.clean_text(phone_elem.get_text())
+                phone = self.clean_text(phone_elem.text())
         
         # 電郵: dt:contains("电子邮箱") + dd
         email = self._extract_dd_value(card, ['电子邮箱', '電子郵箱', 'Email'])
         # 如果是 Cloudflare 保護的
         if not email and card:
-            email_elem = card.select_one('span.__cf_email__')
+            email_elem = card.css_first('span.__cf_email__')
             if email_elem:
-                encoded = email_elem.get('data-cfemail', '')
+                encoded = email_elem.attr('data-cfemail', '')
                 if encoded:
                     email = self.decode_cloudflare_email(encoded)
         
@@ -210,22 +214,10 @@ class EventScraper(BaseScraper):
         if address:
             address = re.sub(r'\s*\[.*地圖.*\]', '', address).strip()
         
-        # 正文 HTML: #arcbody
-        content = ""
-        content_elem = soup.select_one('#arcbody')
-        if content_elem:
-            # 移除腳本
-            for tag in content_elem.find_all(['script', 'style']):
-                tag.decompose()
-            content = self.clean_text(content_elem.get_text())
-        
-        # 正文圖片: #arcbody img.detail-lazy-image [data-src]
-        images = []
-        if content_elem:
-            for img in content_elem.select('img.detail-lazy-image'):
-                src = img.get('data-src') or img.get('data-srcset') or img.get('src')
-                if src and not src.startswith('data:'):
-                    images.append(src)
+        # 正文和正文圖片: 模板為 #arcbody，其他模板按文本密度提取 (見 content_extractor)
+        body = content_extractor.extract(doc, site=self.SCRAPER_NAME, hints=['#arcbody'])
+        content = self.clean_text('\n\n'.join(body.paragraphs))
+        images = self._extract_images(body)
         
         # 判斷類型
         event_type = '活動'
@@ -250,6 +242,33 @@ class EventScraper(BaseScraper):
             'image_urls': self.to_json(images[:10]),
         }
     
+    def _extract_images(self, body) -> List[str]:
+        """
+        正文圖片: #arcbody 模板只取 img.detail-lazy-image，
+        其他模板取容器內的圖片並排除 logo / icon / SVG 等
+        """
+        srcs = body.images
+        if body.selector == '#arcbody' and body.node is not None:
+            srcs = content_extractor.image_urls_of(body.node.css('img.detail-lazy-image'))
+        
+        images = []
+        for src in srcs:
+            lowered = src.lower()
+            if lowered.split('?')[0].endswith('.svg'):
+                continue
+            if any(x in lowered for x in ['logo', 'icon', 'avatar', 'button', 'banner', 'qrcode']):
+                continue
+            
+            # 補全 URL
+            if src.startswith('//'):
+                src = 'https:' + src
+            elif src.startswith('/'):
+                src = self.BASE_URL + src
+            
+            images.append(src)
+        
+        return images
+    
     def _extract_dd_value(self, card, dt_contains) -> Optional[str]:
         """
         從 dt + dd 配對中提取值
@@ -262,63 +281,15 @@ class EventScraper(BaseScraper):
         if isinstance(dt_contains, str):
             dt_contains = [dt_contains]
         
-        dts = card.find_all('dt')
+        dts = card.css('dt')
         for dt in dts:
-            dt_text = dt.get_text()
+            dt_text = dt.text()
             for label in dt_contains:
                 if label in dt_text:
-                    dd = dt.find_next_sibling('dd')
+                    dd = dt.next_sibling('dd')
                     if dd:
-                        return self.clean_text(dd.get_text())
+                        return self.clean_text(dd.text())
         return None
-    
-    def save_item(self, data: Dict) -> bool:
-        """保存活動到資料庫（匹配 models.py 的 events 架構）"""
-        try:
-            # 繁體中文轉換
-            title = self.to_traditional(data.get('title'))
-            description = self.to_traditional(data.get('description'))
-            location = self.to_traditional(data.get('location'))
-            address = self.to_traditional(data.get('address'))
-            contact_person = self.to_traditional(data.get('contact_person'))
-            source = self.to_traditional(data.get('source'))
-            
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO events (
-                    event_id, url, title, event_type,
-                    start_time, end_time, location, region, address,
-                    contact_person, contact_phone, contact_email,
-                    content, content_images, source, published_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                data.get('event_id'),
-                data.get('url'),
-                title,
-                data.get('event_type'),
-                data.get('start_time'),
-                data.get('end_time'),
-                location,
-                location,  # region = location
-                address,
-                contact_person,
-                data.get('contact_phone'),
-                data.get('contact_email'),
-                description,
-                data.get('image_urls'),  # content_images
-                source,
-                data.get('published_at'),
-            ))
-            
-            conn.commit()
-            conn.close()
-            self.logger.info(f"保存活動: {title[:30] if title else 'N/A'}...")
-            return True
-        except Exception as e:
-            self.logger.error(f"保存活動失敗: {e}")
-            return False
 
 
 if __name__ == "__main__":
@@ -0,0 +1,678 @@
+"""
+51.ca 爬蟲 - URL 隊列 (crawl frontier)
+BaseScraper.run / HouseScraper.run_html 只經此接口存取待爬 URL，後端可替換:
+
+    sqlite   - url_queue 表 (默認，同一磁盤上的進程共享)
+    memory   - 進程內 (測試用)
+    redis    - Redis 協議 (RESP)，多台機器共享同一隊列；優先級用有序集合，租約到期自動歸還
+
+取 URL 採用租約: lease() 取出的 URL 在 LEASE_SECONDS 內不會再分給其他 worker，
+處理完成調用 done()，未處理的用 release() 歸還；worker 崩潰時租約到期後自動重新分配。
+
+環境變量 SCRAPER_FRONTIER 選擇後端:
+    SCRAPER_FRONTIER=memory
+    SCRAPER_FRONTIER=redis://:password@10.0.0.5:6379/0
+
+優先級越大越先取出；爬蟲經 scheduler.py 按產出計算優先級後入隊。
+
+用法:
+    queue = frontier.get_frontier()
+    queue.add_many(urls, 'news', source_url=list_url, priority=5)
+    for url in queue.lease('news', limit=5):
+        ...
+        queue.done(url)                 # 或 queue.done(url, error='...')
+"""
+
+import os
+import json
+import time
+import heapq
+import hashlib
+import socket
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+try:
+    from .models import get_connection, url_fingerprint
+except ImportError:
+    from models import get_connection, url_fingerprint
+
+# 租約時長 (秒): 超時未完成的 URL 重新分配
+LEASE_SECONDS = 300
+
+# 出錯次數達到此數的 URL 不再分配 (與 url_queue.retry_count 一致)
+MAX_RETRIES = 3
+
+# Redis 鍵前綴
+REDIS_PREFIX = 'frontier'
+
+
+class Frontier(ABC):
+    """URL 隊列接口 (URL 全局唯一，重複添加忽略)"""
+
+    name = ''
+
+    @abstractmethod
+    def add_many(self, urls: Iterable[str], url_type: str, source_url: Optional[str] = None,
+                 priority: float = 0) -> int:
+        """批量添加，返回新加入的數量"""
+
+    def add(self, url: str, url_type: str, source_url: Optional[str] = None, priority: float = 0) -> bool:
+        return self.add_many([url], url_type, source_url, priority) > 0
+
+    def add_discovered(self, entries: Iterable[Tuple[str, Optional[str]]], url_type: str,
+                       source_url: Optional[str] = None, priority: float = 0) -> int:
+        """
+        批量添加 sitemap / feed 發現的 (URL, lastmod)，返回新加入或重新入隊的數量
+        默認忽略 lastmod (只加入新 URL)；SQLite 後端會把 lastmod 晚於上次訪問的 URL 重新入隊
+        """
+        return self.add_many([url for url, _ in entries], url_type, source_url, priority)
+
+    @abstractmethod
+    def lease(self, url_type: str, limit: int = 10, lease_seconds: float = LEASE_SECONDS) -> List[str]:
+        """取出最多 limit 個待爬 URL (優先級高、加入早的在前) 並加租約"""
+
+    @abstractmethod
+    def done(self, url: str, error: Optional[str] = None):
+        """處理完成 (出錯也算完成，記錄錯誤並累計重試次數)"""
+
+    @abstractmethod
+    def release(self, urls: Iterable[str]):
+        """歸還未處理的租約"""
+
+    @abstractmethod
+    def stats(self, url_type: Optional[str] = None) -> Dict[str, int]:
+        """{'pending': 待爬 (含租約中), 'leased': 租約中, 'visited': 已完成}"""
+
+    @abstractmethod
+    def source_of(self, url: str) -> Optional[str]:
+        """URL 入隊時的來源頁 (起始頁或未知時為 None)"""
+
+    @abstractmethod
+    def pending(self, url_type: str) -> List[Tuple[str, Optional[str]]]:
+        """待爬 URL 及其來源頁 (scheduler 重新計分用)"""
+
+    @abstractmethod
+    def reprioritize(self, priorities: Dict[str, float]):
+        """更新待爬 URL 的優先級"""
+
+    def close(self):
+        pass
+
+
+# ============== SQLite ==============
+
+class SqliteFrontier(Frontier):
+    """url_queue 表；租約記在 leased_until (Unix 秒)"""
+
+    name = 'sqlite'
+
+    def add_many(self, urls, url_type, source_url=None, priority=0):
+        rows = [(url, url_type, source_url, priority, url_fingerprint(url))
+                for url in dict.fromkeys(urls)]
+        if not rows:
+            return 0
+        conn = get_connection()
+        try:
+            # 已被 maintenance 清理的 URL 只剩指紋，同樣視為已存在
+            # (rowcount 不含觸發器的寫入，total_changes 會把 table_versions 的計數也算進去)
+            cursor = conn.executemany("""
+                INSERT OR IGNORE INTO url_queue (url, url_type, source_url, priority)
+                SELECT ?, ?, ?, ?
+                WHERE NOT EXISTS (SELECT 1 FROM url_fingerprints WHERE fp = ?)
+            """, rows)
+            added = cursor.rowcount
+            conn.commit()
+            return added
+        finally:
+            conn.close()
+
+    def add_discovered(self, entries, url_type, source_url=None, priority=0):
+        rows = [(url, url_type, source_url, priority, lastmod, url_fingerprint(url), lastmod)
+                for url, lastmod in dict(entries).items()]
+        if not rows:
+            return 0
+        conn = get_connection()
+        try:
+            # lastmod 與 visited_at 同為本地時間；頁面在上次訪問後有修改時重新入隊
+            # (已清理為指紋的 URL 按指紋記下的訪問時間判斷，沒有記錄訪問時間的舊指紋仍跳過)
+            cursor = conn.executemany("""
+                INSERT INTO url_queue (url, url_type, source_url, priority, lastmod)
+                SELECT ?, ?, ?, ?, ?
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM url_fingerprints WHERE fp = ?
+                      AND (visited_at IS NULL OR COALESCE(?, '') <= visited_at)
+                )
+                ON CONFLICT (url) DO UPDATE SET
+                    visited = 0, retry_count = 0, lastmod = excluded.lastmod
+                WHERE excluded.lastmod > COALESCE(url_queue.lastmod, '')
+                  AND excluded.lastmod > COALESCE(url_queue.visited_at, '')
+            """, rows)
+            changed = cursor.rowcount
+            conn.commit()
+            return changed
+        finally:
+            conn.close()
+
+    def lease(self, url_type, limit=10, lease_seconds=LEASE_SECONDS):
+        now = time.time()
+        conn = get_connection()
+        try:
+            # 選取與加租約在同一語句中完成，多個進程不會取到同一 URL
+            rows = conn.execute("""
+                UPDATE url_queue SET leased_until = ?
+                WHERE id IN (
+                    SELECT id FROM url_queue
+                    WHERE url_type = ? AND visited = 0 AND retry_count < ?
+                      AND (leased_until IS NULL OR leased_until < ?)
+                    ORDER BY priority DESC, added_at ASC, id ASC
+                    LIMIT ?
+                )
+                RETURNING url, priority, id
+            """, (now + lease_seconds, url_type, MAX_RETRIES, now, limit)).fetchall()
+            conn.commit()
+        finally:
+            conn.close()
+        # RETURNING 不保證順序
+        return [row['url'] for row in sorted(rows, key=lambda r: (-r['priority'], r['id']))]
+
+    def done(self, url, error=None):
+        conn = get_connection()
+        try:
+            if error:
+                conn.execute("""
+                    UPDATE url_queue
+                    SET visited = 1, visited_at = ?, last_error = ?, retry_count = retry_count + 1,
+                        leased_until = NULL
+                    WHERE url = ?
+                """, (datetime.now(), error, url))
+            else:
+                conn.execute("""
+                    UPDATE url_queue SET visited = 1, visited_at = ?, leased_until = NULL
+                    WHERE url = ?
+                """, (datetime.now(), url))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def release(self, urls):
+        urls = [(url,) for url in urls]
+        if not urls:
+            return
+        conn = get_connection()
+        try:
+            conn.executemany("UPDATE url_queue SET leased_until = NULL WHERE url = ?", urls)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self, url_type=None):
+        where, params = ('WHERE url_type = ?', (url_type,)) if url_type else ('', ())
+        conn = get_connection()
+        try:
+            row = conn.execute(f"""
+                SELECT COALESCE(SUM(visited = 0), 0) AS pending,
+                       COALESCE(SUM(visited = 0 AND leased_until >= ?), 0) AS leased,
+                       COALESCE(SUM(visited = 1), 0) AS visited
+                FROM url_queue {where}
+            """, (time.time(),) + params).fetchone()
+        finally:
+            conn.close()
+        return dict(row)
+
+    def source_of(self, url):
+        conn = get_connection()
+        try:
+            row = conn.execute("SELECT source_url FROM url_queue WHERE url = ?", (url,)).fetchone()
+        finally:
+            conn.close()
+        return row['source_url'] if row else None
+
+    def pending(self, url_type):
+        conn = get_connection()
+        try:
+            rows = conn.execute("""
+                SELECT url, source_url FROM url_queue WHERE url_type = ? AND visited = 0
+            """, (url_type,)).fetchall()
+        finally:
+            conn.close()
+        return [(row['url'], row['source_url']) for row in rows]
+
+    def reprioritize(self, priorities):
+        rows = [(priority, url) for url, priority in priorities.items()]
+        if not rows:
+            return
+        conn = get_connection()
+        try:
+            conn.executemany("UPDATE url_queue SET priority = ? WHERE url = ? AND visited = 0", rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+# ============== 內存 ==============
+
+class MemoryFrontier(Frontier):
+    """進程內隊列 (測試用)"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}      # url -> {'url_type', 'source_url', 'priority', 'seq', 'visited', 'retries', 'error'}
+        self._heaps = {}        # url_type -> [(-priority, seq, url)]
+        self._leases = {}       # url -> 到期時間
+        self._seq = 0
+
+    def add_many(self, urls, url_type, source_url=None, priority=0):
+        added = 0
+        with self._lock:
+            for url in urls:
+                if url in self._entries:
+                    continue
+                self._seq += 1
+                self._entries[url] = {'url_type': url_type, 'source_url': source_url, 'priority': priority,
+                                      'seq': self._seq, 'visited': False, 'retries': 0, 'error': None}
+                heapq.heappush(self._heaps.setdefault(url_type, []), (-priority, self._seq, url))
+                added += 1
+        return added
+
+    def lease(self, url_type, limit=10, lease_seconds=LEASE_SECONDS):
+        now = time.monotonic()
+        with self._lock:
+            self._requeue_expired(now)
+            heap = self._heaps.get(url_type, [])
+            urls = []
+            while heap and len(urls) < limit:
+                neg_priority, _, url = heapq.heappop(heap)
+                entry = self._entries[url]
+                if entry['visited'] or entry['retries'] >= MAX_RETRIES or url in self._leases:
+                    continue
+                # reprioritize 後留在堆中的舊條目
+                if -neg_priority != entry['priority']:
+                    continue
+                self._leases[url] = now + lease_seconds
+                urls.append(url)
+            return urls
+
+    def done(self, url, error=None):
+        with self._lock:
+            self._leases.pop(url, None)
+            entry = self._entries.get(url)
+            if entry is None:
+                return
+            entry['visited'] = True
+            if error:
+                entry['error'] = error
+                entry['retries'] += 1
+
+    def release(self, urls):
+        with self._lock:
+            for url in urls:
+                if self._leases.pop(url, None) is not None:
+                    self._push(url)
+
+    def stats(self, url_type=None):
+        with self._lock:
+            entries = [e for e in self._entries.values() if url_type is None or e['url_type'] == url_type]
+            leased = sum(1 for url in self._leases
+                         if url_type is None or self._entries[url]['url_type'] == url_type)
+        visited = sum(1 for e in entries if e['visited'])
+        return {'pending': len(entries) - visited, 'leased': leased, 'visited': visited}
+
+    def source_of(self, url):
+        entry = self._entries.get(url)
+        return entry['source_url'] if entry else None
+
+    def pending(self, url_type):
+        with self._lock:
+            return [(url, e['source_url']) for url, e in self._entries.items()
+                    if e['url_type'] == url_type and not e['visited']]
+
+    def reprioritize(self, priorities):
+        with self._lock:
+            for url, priority in priorities.items():
+                entry = self._entries.get(url)
+                if entry is None or entry['visited'] or entry['priority'] == priority:
+                    continue
+                entry['priority'] = priority
+                if url not in self._leases:
+                    self._push(url)
+
+    def _push(self, url):
+        entry = self._entries[url]
+        heapq.heappush(self._heaps.setdefault(entry['url_type'], []), (-entry['priority'], entry['seq'], url))
+
+    def _requeue_expired(self, now):
+        for url, expires in list(self._leases.items()):
+            if expires < now:
+                del self._leases[url]
+                self._push(url)
+
+
+# ============== Redis (RESP) ==============
+
+class RespError(Exception):
+    """Redis 服務端返回的錯誤"""
+
+
+class _RespClient:
+    """最小的 RESP2 客戶端 (只需要 socket，支持流水線)"""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: Optional[str] = None,
+                 timeout: float = 10):
+        self._address = (host, port)
+        self._db = db
+        self._password = password
+        self._timeout = timeout
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connect()
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def pipeline(self, commands: List[tuple]) -> list:
+        """一次發送多條命令，按順序返回結果；任一命令出錯時拋出 RespError"""
+        with self._lock:
+            if self._sock is None:
+                # 上次調用中途斷開，重新連接
+                self._connect()
+            replies = self._roundtrip(commands)
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+    def _connect(self):
+        self._sock = socket.create_connection(self._address, timeout=self._timeout)
+        self._file = self._sock.makefile('rb')
+        setup = []
+        if self._password:
+            setup.append(('AUTH', self._password))
+        if self._db:
+            setup.append(('SELECT', self._db))
+        for reply in self._roundtrip(setup) if setup else []:
+            if isinstance(reply, RespError):
+                self._disconnect()
+                raise reply
+
+    def _roundtrip(self, commands: List[tuple]) -> list:
+        payload = b''.join(_encode_command(command) for command in commands)
+        try:
+            self._sock.sendall(payload)
+            return [self._read() for _ in commands]
+        except (OSError, RespError):
+            # 超時 / 斷開時未讀完的響應留在連接中，繼續使用會讀到上一條命令的響應；
+            # 丟棄連接，下次調用時重新連接
+            self._disconnect()
+            raise
+
+    def _disconnect(self):
+        try:
+            if self._file is not None:
+                self._file.close()
+            if self._sock is not None:
+                self._sock.close()
+        except OSError:
+            pass
+        self._sock = None
+        self._file = None
+
+    def _read(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Redis 連接已關閉")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode('utf-8')
+        if kind == b'-':
+            return RespError(rest.decode('utf-8'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            return self._file.read(length + 2)[:-2].decode('utf-8')
+        if kind == b'*':
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self._read() for _ in range(length)]
+        raise RespError(f"無法識別的響應: {line[:50]!r}")
+
+
+def _encode_command(args) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+        parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+    return b''.join(parts)
+
+
+# 多步操作在服務端以 Lua 腳本原子執行: 客戶端分步調用時中途斷開會讓 URL 不在任何集合中
+# (元數據已寫入但未入隊，或已取出但未加租約)，之後既不會被取出也不會被回收
+
+# KEYS: urls, pending, seq；ARGV: url_type, source_url ('' 為無), priority, url...
+_REDIS_ADD = """
+local added = 0
+local priority = tonumber(ARGV[3])
+for i = 4, #ARGV do
+    local url = ARGV[i]
+    if redis.call('HEXISTS', KEYS[1], url) == 0 then
+        local seq = redis.call('INCR', KEYS[3])
+        local meta = {url_type = ARGV[1], priority = priority, seq = seq, visited = 0, retries = 0}
+        if ARGV[2] ~= '' then
+            meta['source_url'] = ARGV[2]
+        end
+        redis.call('HSET', KEYS[1], url, cjson.encode(meta))
+        -- Lua 數字轉為命令參數時只保留 14 位有效數字，分數按完整精度格式化
+        redis.call('ZADD', KEYS[2], string.format('%.17g', priority * 1e10 - seq), url)
+        added = added + 1
+    end
+end
+return added
+"""
+
+# 到期租約放回待爬集合 (KEYS: urls, pending, leased；ARGV[1]: now)
+_REDIS_REQUEUE_BODY = """
+local requeued = 0
+for _, url in ipairs(redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1])) do
+    redis.call('ZREM', KEYS[3], url)
+    local raw = redis.call('HGET', KEYS[1], url)
+    if raw then
+        local meta = cjson.decode(raw)
+        if meta['visited'] == 0 then
+            redis.call('ZADD', KEYS[2], string.format('%.17g', meta['priority'] * 1e10 - meta['seq']), url)
+            requeued = requeued + 1
+        end
+    end
+end
+"""
+
+_REDIS_REQUEUE_EXPIRED = _REDIS_REQUEUE_BODY + "return requeued\n"
+
+# 先回收到期租約再取出 (KEYS: urls, pending, leased；ARGV: now, 租約到期時間, limit)
+_REDIS_LEASE = _REDIS_REQUEUE_BODY + """
+local popped = redis.call('ZPOPMAX', KEYS[2], ARGV[3])
+local urls = {}
+for i = 1, #popped, 2 do
+    urls[#urls + 1] = popped[i]
+    redis.call('ZADD', KEYS[3], ARGV[2], popped[i])
+end
+return urls
+"""
+
+# KEYS: pending, leased；ARGV: 分數, url (ZREM 成功的一方負責放回，避免與到期回收重複入隊)
+_REDIS_RELEASE = """
+if redis.call('ZREM', KEYS[2], ARGV[2]) == 1 then
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class RedisFrontier(Frontier):
+    """
+    Redis 後端，鍵:
+        {prefix}:urls                 哈希 url -> 元數據 JSON (類型 / 優先級 / 序號 / 狀態)，已存在的 URL 不再加入
+        {prefix}:pending:{url_type}   有序集合，分數 = 優先級 * 1e10 - 序號 (ZPOPMAX 取優先級高、加入早的)
+        {prefix}:leased:{url_type}    有序集合，分數 = 租約到期時間
+        {prefix}:seq                  序號計數器
+    加入 / 取出 / 到期回收 / 歸還各為一個 Lua 腳本，在服務端原子執行
+    """
+
+    name = 'redis'
+
+    def __init__(self, url: str = 'redis://127.0.0.1:6379/0', prefix: str = REDIS_PREFIX):
+        parts = urlsplit(url)
+        db = parts.path.strip('/')
+        self._client = _RespClient(parts.hostname or '127.0.0.1', parts.port or 6379,
+                                   db=int(db) if db else 0, password=parts.password)
+        self.prefix = prefix
+        self._scripts = {}      # 腳本 -> SHA1
+
+    def _key(self, *parts) -> str:
+        return ':'.join((self.prefix,) + parts)
+
+    @staticmethod
+    def _score(meta: Dict) -> float:
+        return meta['priority'] * 1e10 - meta['seq']
+
+    def add_many(self, urls, url_type, source_url=None, priority=0):
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return 0
+        return self._eval(_REDIS_ADD, [self._key('urls'), self._key('pending', url_type), self._key('seq')],
+                          [url_type, source_url or '', priority] + urls)
+
+    def lease(self, url_type, limit=10, lease_seconds=LEASE_SECONDS):
+        now = time.time()
+        return self._eval(_REDIS_LEASE, self._type_keys(url_type), [now, now + lease_seconds, limit]) or []
+
+    def done(self, url, error=None):
+        meta = self._meta(url)
+        if meta is None:
+            return
+        meta['visited'] = 1
+        meta['visited_at'] = datetime.now().isoformat()
+        if error:
+            meta['error'] = error
+            meta['retries'] += 1
+        self._client.pipeline([
+            ('HSET', self._key('urls'), url, json.dumps(meta, ensure_ascii=False)),
+            ('ZREM', self._key('leased', meta['url_type']), url),
+        ])
+
+    def release(self, urls):
+        for url in urls:
+            meta = self._meta(url)
+            if meta is None:
+                continue
+            self._eval(_REDIS_RELEASE, self._type_keys(meta['url_type'])[1:], [self._score(meta), url])
+
+    def stats(self, url_type=None):
+        metas = [json.loads(v) for v in self._client.execute('HVALS', self._key('urls')) or []]
+        if url_type:
+            metas = [m for m in metas if m['url_type'] == url_type]
+        types = {url_type} if url_type else {m['url_type'] for m in metas}
+        leased = sum(self._client.pipeline([('ZCARD', self._key('leased', t)) for t in types])) if types else 0
+        visited = sum(1 for m in metas if m['visited'])
+        return {'pending': len(metas) - visited, 'leased': leased, 'visited': visited}
+
+    def source_of(self, url):
+        meta = self._meta(url)
+        return meta.get('source_url') if meta else None
+
+    def pending(self, url_type):
+        values = self._client.execute('HGETALL', self._key('urls')) or []
+        result = []
+        for url, raw in zip(values[0::2], values[1::2]):
+            meta = json.loads(raw)
+            if meta['url_type'] == url_type and not meta['visited']:
+                result.append((url, meta.get('source_url')))
+        return result
+
+    def reprioritize(self, priorities):
+        for url, priority in priorities.items():
+            meta = self._meta(url)
+            if meta is None or meta['visited'] or meta['priority'] == priority:
+                continue
+            meta['priority'] = priority
+            # XX: 租約中的 URL 不在待爬集合中，歸還時按新的優先級放回
+            self._client.pipeline([
+                ('HSET', self._key('urls'), url, json.dumps(meta, ensure_ascii=False)),
+                ('ZADD', self._key('pending', meta['url_type']), 'XX', self._score(meta), url),
+            ])
+
+    def close(self):
+        self._client.close()
+
+    def _meta(self, url) -> Optional[Dict]:
+        raw = self._client.execute('HGET', self._key('urls'), url)
+        return json.loads(raw) if raw else None
+
+    def _requeue_expired(self, url_type, now) -> int:
+        return self._eval(_REDIS_REQUEUE_EXPIRED, self._type_keys(url_type), [now])
+
+    def _type_keys(self, url_type) -> List[str]:
+        return [self._key('urls'), self._key('pending', url_type), self._key('leased', url_type)]
+
+    def _eval(self, script: str, keys: List[str], args: list):
+        """執行 Lua 腳本 (先按 SHA1 調用已緩存的腳本，服務端沒有時再發送全文)"""
+        sha = self._scripts.get(script)
+        if sha is None:
+            sha = self._scripts[script] = hashlib.sha1(script.encode('utf-8')).hexdigest()
+        try:
+            return self._client.execute('EVALSHA', sha, len(keys), *keys, *args)
+        except RespError as e:
+            if not str(e).startswith('NOSCRIPT'):
+                raise
+            return self._client.execute('EVAL', script, len(keys), *keys, *args)
+
+
+# ============== 選擇後端 ==============
+
+_frontier = None
+_frontier_lock = threading.Lock()
+
+
+def create_frontier(spec: Optional[str] = None) -> Frontier:
+    """按描述創建後端: sqlite / memory / redis://..."""
+    spec = (spec or 'sqlite').strip()
+    if spec == 'sqlite':
+        return SqliteFrontier()
+    if spec == 'memory':
+        return MemoryFrontier()
+    if spec.startswith(('redis://', 'rediss://')) or spec == 'redis':
+        if spec.startswith('rediss://'):
+            raise ValueError("不支持 TLS 連接 (rediss://)")
+        return RedisFrontier(spec if spec != 'redis' else 'redis://127.0.0.1:6379/0')
+    raise ValueError(f"未知的 URL 隊列後端: {spec}")
+
+
+def get_frontier() -> Frontier:
+    """進程內共享的隊列 (環境變量 SCRAPER_FRONTIER 指定後端，默認 sqlite)"""
+    global _frontier
+    with _frontier_lock:
+        if _frontier is None:
+            _frontier = create_frontier(os.environ.get('SCRAPER_FRONTIER'))
+        return _frontier
+
+
+def set_frontier(frontier: Optional[Frontier]):
+    """替換共享的隊列 (None = 下次按環境變量重新創建)"""
+    global _frontier
+    with _frontier_lock:
+        _frontier = frontier
@@ -0,0 +1,134 @@
+"""
+51.ca 爬蟲 - 房源地理查詢
+基於 house_geo R-tree 索引 (見 models.init_database) 的矩形範圍、半徑和最近鄰查詢。
+R-tree 先篩出候選，再按實際座標精確過濾 / 計算距離，數十萬房源也只需毫秒級。
+
+用法:
+    geo.search_bbox(43.64, 43.67, -79.40, -79.37, listing_type='出租')
+    geo.search_radius(43.6532, -79.3832, 2.0, max_price=3000)
+    geo.nearest(43.6532, -79.3832, k=10, property_type='公寓')
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from .models import get_read_connection
+except ImportError:
+    from models import get_read_connection
+
+EARTH_RADIUS_KM = 6371.0088
+
+# 返回的房源欄位
+RESULT_COLUMNS = (
+    'h.id', 'h.listing_id', 'h.url', 'h.title', 'h.listing_type', 'h.property_type',
+    'h.price', 'h.address', 'h.city', 'h.bedrooms', 'h.bathrooms', 'h.lat', 'h.lon',
+)
+
+# 最近鄰查詢的搜索半徑上限 (公里)
+MAX_KNN_RADIUS_KM = 200.0
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """兩點球面距離 (公里)"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """包含指定圓的經緯度矩形 (min_lat, max_lat, min_lon, max_lon)"""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(lat))
+    dlon = 180.0 if cos_lat < 1e-6 else min(180.0, math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)))
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+def _filters(listing_type: str = None, property_type: str = None,
+             min_price: float = None, max_price: float = None) -> Tuple[str, list]:
+    conditions, params = [], []
+    if listing_type:
+        conditions.append("h.listing_type = ?")
+        params.append(listing_type)
+    if property_type:
+        conditions.append("h.property_type = ?")
+        params.append(property_type)
+    if min_price is not None:
+        conditions.append("h.price >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        conditions.append("h.price <= ?")
+        params.append(max_price)
+    return ''.join(f" AND {c}" for c in conditions), params
+
+
+def _query_box(conn, min_lat, max_lat, min_lon, max_lon, filters: Dict,
+               limit: Optional[int] = None) -> List[Dict]:
+    where, params = _filters(**filters)
+    sql = f"""
+        SELECT {', '.join(RESULT_COLUMNS)}
+        FROM house_geo g
+        JOIN house_listings h ON h.id = g.id
+        WHERE g.max_lat >= ? AND g.min_lat <= ?
+          AND g.max_lon >= ? AND g.min_lon <= ?
+          AND h.lat BETWEEN ? AND ? AND h.lon BETWEEN ? AND ?
+          {where}
+    """
+    args = [min_lat, max_lat, min_lon, max_lon, min_lat, max_lat, min_lon, max_lon] + params
+    if limit:
+        sql += " LIMIT ?"
+        args.append(limit)
+    return [dict(row) for row in conn.execute(sql, args).fetchall()]
+
+
+def _with_connection(conn, func):
+    if conn is not None:
+        return func(conn)
+    conn = get_read_connection()
+    try:
+        return func(conn)
+    finally:
+        conn.close()
+
+
+def search_bbox(min_lat: float, max_lat: float, min_lon: float, max_lon: float,
+                limit: int = 500, conn=None, **filters) -> List[Dict]:
+    """
+    矩形範圍查詢
+
+    Args:
+        filters: listing_type / property_type / min_price / max_price
+        conn: 可選資料庫連接 (默認使用爬蟲資料庫)
+    """
+    return _with_connection(conn, lambda c: _query_box(c, min_lat, max_lat, min_lon, max_lon, filters, limit))
+
+
+def search_radius(lat: float, lon: float, radius_km: float, limit: int = 500,
+                  conn=None, **filters) -> List[Dict]:
+    """半徑查詢，結果按距離排序並帶 distance_km"""
+    def run(c):
+        candidates = _query_box(c, *bounding_box(lat, lon, radius_km), filters)
+        results = []
+        for row in candidates:
+            distance = haversine_km(lat, lon, row['lat'], row['lon'])
+            if distance <= radius_km:
+                row['distance_km'] = round(distance, 3)
+                results.append(row)
+        results.sort(key=lambda r: r['distance_km'])
+        return results[:limit]
+    return _with_connection(conn, run)
+
+
+def nearest(lat: float, lon: float, k: int = 10, conn=None,
+            max_radius_km: float = MAX_KNN_RADIUS_KM, **filters) -> List[Dict]:
+    """最近的 k 個房源 (逐步擴大搜索半徑直到找夠 k 個)"""
+    def run(c):
+        radius = 1.0
+        while True:
+            results = search_radius(lat, lon, radius, limit=k, conn=c, **filters)
+            if len(results) >= k or radius >= max_radius_km:
+                return results
+            radius = min(radius * 2, max_radius_km)
+    return _with_connection(conn, run)
@@ -12,9 +12,7 @@ import re
 import json
 from typing import List, Dict, Optional
 from datetime import datetime
-
-import requests
-from bs4 import BeautifulSoup
+from urllib.parse import urlparse, parse_qs
 
 import sys
 import os
@@ -24,9 +22,21 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 try:
     from .base import BaseScraper
     from .models import get_connection
+    from .schema import HOUSE_LISTINGS
+    from . import profiling
+    from . import archive
+    from . import checkpoints
+    from . import discovery
+    from .detail_planner import DetailPlanner
 except ImportError:
     from base import BaseScraper
     from models import get_connection
+    from schema import HOUSE_LISTINGS
+    import profiling
+    import archive
+    import checkpoints
+    import discovery
+    from detail_planner import DetailPlanner
 
 
 class HouseScraper(BaseScraper):
@@ -36,6 +46,14 @@ class HouseScraper(BaseScraper):
     BASE_URL = "https://house.51.ca"
     API_URL = "https://house.51.ca/api/v7"
     URL_TYPE = "house"
+    DETAIL_URL_PATTERN = r'/rental/ontario/.+/\d+$'
+    SCHEMA = HOUSE_LISTINGS
+    
+    # 列表 API 可見的欄位 (變化時重抓詳情) 和由詳情 API 補充的欄位
+    LIST_FIELDS = ('title', 'listing_type', 'property_type', 'price', 'address', 'bedrooms',
+                   'dens', 'bathrooms', 'parking', 'sqft', 'listing_date')
+    DETAIL_FIELDS = ('description', 'image_urls', 'agent_name', 'agent_phone', 'agent_company',
+                     'lat', 'lon', 'features')
     
     # 房屋類型映射 (buildingType ID -> 名稱)
     BUILDING_TYPES = {
@@ -94,7 +112,7 @@ class HouseScraper(BaseScraper):
         """獲取起始URL列表 - API 版本不需要"""
         return []
     
-    def run(self, max_pages: int = 50, fetch_details: bool = False):
+    def run(self, max_pages: int = 50, fetch_details: bool = False, resume: bool = False):
         """
         運行爬蟲 - API 版本
         直接從 API 獲取數據，不需要解析 HTML
@@ -102,10 +120,12 @@ class HouseScraper(BaseScraper):
         Args:
             max_pages: 最大頁數
             fetch_details: 是否獲取詳細資訊 (描述、經紀電話等)
+            resume: 從上次中斷的斷點繼續 (見 checkpoints.py)
         """
         self.logger.info("=" * 60)
         self.logger.info(f"開始運行 {self.SCRAPER_NAME} 爬蟲 (API 版)")
         self.logger.info(f"  - 獲取詳情: {'是' if fetch_details else '否'}")
+        self.logger.info(f"  - 斷點續爬: {'是' if resume else '否'}")
         self.logger.info("=" * 60)
         
         # 初始化數據庫
@@ -114,6 +134,8 @@ class HouseScraper(BaseScraper):
         except ImportError:
             from models import init_database
         init_database()
+        if not resume:
+            checkpoints.reset(self.SCRAPER_NAME)
         
         start_time = datetime.now()
         total_saved = 0
@@ -124,7 +146,8 @@ class HouseScraper(BaseScraper):
         saved, errors = self._fetch_properties(
             transaction_type=1, 
             max_pages=max_pages // 2,
-            fetch_details=fetch_details
+            fetch_details=fetch_details,
+            resume=resume
         )
         total_saved += saved
         total_errors += errors
@@ -134,11 +157,15 @@ class HouseScraper(BaseScraper):
         saved, errors = self._fetch_properties(
             transaction_type=2, 
             max_pages=max_pages // 2,
-            fetch_details=fetch_details
+            fetch_details=fetch_details,
+            resume=resume
         )
         total_saved += saved
         total_errors += errors
         
+        if not checkpoints.clear_if_finished(self.SCRAPER_NAME):
+            self.logger.info("有未完成的分頁，斷點已保留，可用 --resume 繼續")
+        
         elapsed = (datetime.now() - start_time).total_seconds()
         
         self.logger.info("=" * 60)
@@ -148,14 +175,16 @@ class HouseScraper(BaseScraper):
         self.logger.info(f"  - 運行時間: {elapsed:.2f} 秒")
         self.logger.info("=" * 60)
     
-    def _fetch_properties(self, transaction_type: int = 1, max_pages: int = 25, fetch_details: bool = False) -> tuple:
+    def _fetch_properties(self, transaction_type: int = 1, max_pages: int = 25, fetch_details: bool = False,
+                          resume: bool = False) -> tuple:
         """
         從 API 獲取房屋列表
         
         Args:
             transaction_type: 1=買賣, 2=出租
-            max_pages: 最大頁數
+            max_pages: 最大頁數 (續爬時仍以此為最後一頁)
             fetch_details: 是否獲取詳細資訊
+            resume: 從斷點的下一頁開始
         
         Returns:
             (saved_count, error_count)
@@ -164,71 +193,122 @@ class HouseScraper(BaseScraper):
         errors = 0
         limit = 50  # 每頁數量
         
-        for page in range(1, max_pages + 1):
-            try:
-                url = f"{self.API_URL}/property"
-                params = {
-                    'limit': limit,
-                    'page': page,
-                    'transactionType': transaction_type,
-                    'province': 'ontario',  # 只抓安省
-                }
-                
-                response = requests.get(
+        start_page = checkpoints.resume_page(self.SCRAPER_NAME, resume, transaction_type=transaction_type)
+        if start_page is None:
+            self.logger.info(f"交易類型 {transaction_type} 上次已完成，跳過")
+            return saved, errors
+        if start_page > 1:
+            self.logger.info(f"從斷點繼續: 第 {start_page} 頁")
+        
+        # 斷點只在之前的頁全部完成時前移，失敗的頁留給續爬重試
+        contiguous = True
+        for page in range(start_page, max_pages + 1):
+            url = f"{self.API_URL}/property"
+            checkpoint = {'transaction_type': transaction_type, 'page': page} if contiguous else None
+            with profiling.track_url(f"{url}?transactionType={transaction_type}&page={page}"):
+                result = self._fetch_properties_page(url, page, limit, transaction_type, fetch_details,
+                                                     checkpoint=checkpoint)
+            if result is None:
+                break
+            page_saved, page_errors, completed = result
+            saved += page_saved
+            errors += page_errors
+            contiguous = contiguous and completed
+        
+        if contiguous:
+            checkpoints.finish(self.SCRAPER_NAME, transaction_type=transaction_type)
+        return saved, errors
+    
+    def _fetch_properties_page(self, url: str, page: int, limit: int, transaction_type: int,
+                               fetch_details: bool, checkpoint: Optional[Dict] = None) -> Optional[tuple]:
+        """
+        獲取並保存一頁房屋
+        
+        Args:
+            checkpoint: 分頁斷點，與本頁項目一起寫入
+        
+        Returns:
+            (saved_count, error_count, completed)，沒有更多數據時返回 None；
+            completed 表示本頁已保存 (請求或響應出錯時為 False)
+        """
+        saved = 0
+        errors = 0
+        try:
+            params = {
+                'limit': limit,
+                'page': page,
+                'transactionType': transaction_type,
+                'province': 'ontario',  # 只抓安省
+            }
+            
+            with profiling.stage('fetch'):
+                response = self.session.get(
                     url,
                     params=params,
-                    headers={
-                        'User-Agent': self.DEFAULT_HEADERS['User-Agent'],
-                        'Accept': 'application/json',
-                    },
-                    timeout=30
+                    headers={'Accept': 'application/json'},
                 )
-                
-                if response.status_code != 200:
-                    self.logger.error(f"API 錯誤: {response.status_code}")
-                    errors += 1
-                    continue
-                
+            self.archive_response(response)
+            
+            if response.status_code != 200:
+                self.logger.error(f"API 錯誤: {response.status_code}")
+                return saved, errors + 1, False
+            
+            with profiling.stage('parse'):
                 data = response.json()
-                
-                if data.get('status') != 1:
-                    self.logger.error(f"API 返回錯誤: {data.get('message')}")
-                    errors += 1
-                    continue
-                
-                properties = data.get('data', [])
-                
-                if not properties:
-                    self.logger.info(f"頁面 {page} 沒有更多數據")
-                    break
-                
-                for prop in properties:
-                    try:
+            
+            if data.get('status') != 1:
+                self.logger.error(f"API 返回錯誤: {data.get('message')}")
+                return saved, errors + 1, False
+            
+            properties = data.get('data', [])
+            
+            if not properties:
+                self.logger.info(f"頁面 {page} 沒有更多數據")
+                return None
+            
+            page_items = []
+            for prop in properties:
+                try:
+                    with profiling.stage('parse'):
                         parsed = self._parse_api_property(prop, transaction_type)
-                        if parsed:
-                            # 如果需要詳情，獲取詳細資訊
-                            if fetch_details:
-                                detail = self._fetch_property_detail(parsed['listing_id'])
-                                if detail:
-                                    parsed.update(detail)
-                            
-                            if self.save_item(parsed):
-                                saved += 1
-                    except Exception as e:
-                        self.logger.error(f"解析房屋失敗: {e}")
-                        errors += 1
-                
-                self.logger.info(f"頁面 {page}: 獲取 {len(properties)} 個房屋")
-                
-                # 延遲避免請求過快
-                import time
-                time.sleep(0.5)
-                
-            except Exception as e:
-                self.logger.error(f"頁面 {page} 請求失敗: {e}")
-                errors += 1
+                    if parsed:
+                        page_items.append(parsed)
+                except Exception as e:
+                    self.logger.error(f"解析房屋失敗: {e}")
+                    errors += 1
+            
+            # 如果需要詳情，只請求新房源、列表欄位有變化或缺詳情的房源 (見 detail_planner.py)
+            if fetch_details and page_items:
+                planner = DetailPlanner(self.SCHEMA, self.LIST_FIELDS, self.DETAIL_FIELDS,
+                                        required_fields=('description',),
+                                        to_traditional=self.to_traditional)
+                for parsed, reason in zip(page_items, planner.plan(page_items)):
+                    if reason:
+                        detail = self._fetch_property_detail(parsed['listing_id'])
+                        if detail:
+                            parsed.update(detail)
+                            planner.mark_fetched(parsed)
+                self.logger.info(f"頁面 {page}: {planner.summary()}")
+            
+            # 整頁一次寫入 (斷點游標記為本頁最後一個房源)
+            if checkpoint is not None and page_items:
+                checkpoint = dict(checkpoint, cursor=page_items[-1].get('listing_id'))
+            with profiling.stage('save'):
+                page_saved = self.save_items(page_items, checkpoint=checkpoint)
+            saved += page_saved
+            errors += len(page_items) - page_saved
+            
+            self.logger.info(f"頁面 {page}: 獲取 {len(properties)} 個房屋")
+            
+            # 延遲避免請求過快
+            import time
+            time.sleep(0.5)
+            
+        except Exception as e:
+            self.logger.error(f"頁面 {page} 請求失敗: {e}")
+            return saved, errors + 1, False
         
-        return saved, errors
+        return saved, errors, True
     
     def _fetch_property_detail(self, listing_id: str) -> Optional[Dict]:
         """
@@ -244,14 +324,12 @@ class HouseScraper(BaseScraper):
         try:
             url = f"{self.API_URL}/property/detail/{listing_id}"
             
-            response = requests.get(
-                url,
-                headers={
-                    'User-Agent': self.DEFAULT_HEADERS['User-Agent'],
-                    'Accept': 'application/json',
-                },
-                timeout=30
-            )
+            with profiling.stage('fetch'):
+                response = self.session.get(
+                    url,
+                    headers={'Accept': 'application/json'},
+                )
+            self.archive_response(response)
             
             if response.status_code != 200:
                 return None
@@ -261,64 +339,7 @@ class HouseScraper(BaseScraper):
             if data.get('status') != 1:
                 return None
             
-            detail = data.get('data', {})
-            
-            # 解析詳情
-            result = {}
-            
-            # 房源描述 (section6)
-            description = detail.get('section6')
-            if description:
-                result['description'] = description.strip()
-            
-            # 完整圖片列表 (section1)
-            section1 = detail.get('section1', {})
-            photos = section1.get('photos', [])
-            if photos:
-                image_urls = [p.get('url') for p in photos if p.get('url')]
-                result['image_urls'] = json.dumps(image_urls, ensure_ascii=False)
-            
-            # 經紀資訊 (listingAgents)
-            listing_agents = detail.get('listingAgents')
-            if listing_agents:
-                if isinstance(listing_agents, list) and listing_agents:
-                    agent = listing_agents[0]
-                elif isinstance(listing_agents, dict):
-                    agent = listing_agents
-                else:
-                    agent = None
-                
-                if agent:
-                    result['agent_name'] = agent.get('name')
-                    phones = agent.get('phone', [])
-                    if phones:
-                        result['agent_phone'] = phones[0] if isinstance(phones, list) else phones
-            
-            # 經紀公司 (listingBrokerage)
-            brokerage = detail.get('listingBrokerage', {})
-            if brokerage:
-                result['agent_company'] = brokerage.get('name')
-            
-            # 座標 (section2)
-            section2 = detail.get('section2', {})
-            coordinate = section2.get('coordinate', {})
-            if coordinate:
-                result['lat'] = float(coordinate.get('lat', 0)) if coordinate.get('lat') else None
-                result['lon'] = float(coordinate.get('lon', 0)) if coordinate.get('lon') else None
-            
-            # 房屋設施 (section5d1)
-            section5d1 = detail.get('section5d1', {})
-            features = []
-            for group_key in ['g4', 'g6']:  # g4=設施, g6=建築設施
-                group = section5d1.get(group_key, [])
-                for item in group:
-                    key = item.get('key')
-                    value = item.get('value')
-                    if key and value:
-                        features.append(f"{key}: {value}")
-            
-            if features:
-                result['features'] = json.dumps(features, ensure_ascii=False)
+            result = self._parse_property_detail(data.get('data', {}))
             
             # 延遲避免請求過快
             time.sleep(0.3)
@@ -328,6 +349,66 @@ class HouseScraper(BaseScraper):
         except Exception as e:
             self.logger.error(f"獲取詳情失敗 {listing_id}: {e}")
             return None
+    
+    def _parse_property_detail(self, detail: Dict) -> Dict:
+        """解析詳情 API 的 data 部分"""
+        result = {}
+        
+        # 房源描述 (section6)
+        description = detail.get('section6')
+        if description:
+            result['description'] = description.strip()
+        
+        # 完整圖片列表 (section1)
+        section1 = detail.get('section1', {})
+        photos = section1.get('photos', [])
+        if photos:
+            image_urls = [p.get('url') for p in photos if p.get('url')]
+            result['image_urls'] = json.dumps(image_urls, ensure_ascii=False)
+        
+        # 經紀資訊 (listingAgents)
+        listing_agents = detail.get('listingAgents')
+        if listing_agents:
+            if isinstance(listing_agents, list) and listing_agents:
+                agent = listing_agents[0]
+            elif isinstance(listing_agents, dict):
+                agent = listing_agents
+            else:
+                agent = None
+            
+            if agent:
+                result['agent_name'] = agent.get('name')
+                phones = agent.get('phone', [])
+                if phones:
+                    result['agent_phone'] = phones[0] if isinstance(phones, list) else phones
+        
+        # 經紀公司 (listingBrokerage)
+        brokerage = detail.get('listingBrokerage', {})
+        if brokerage:
+            result['agent_company'] = brokerage.get('name')
+        
+        # 座標 (section2)
+        section2 = detail.get('section2', {})
+        coordinate = section2.get('coordinate', {})
+        if coordinate:
+            result['lat'] = float(coordinate.get('lat', 0)) if coordinate.get('lat') else None
+            result['lon'] = float(coordinate.get('lon', 0)) if coordinate.get('lon') else None
+        
+        # 房屋設施 (section5d1)
+        section5d1 = detail.get('section5d1', {})
+        features = []
+        for group_key in ['g4', 'g6']:  # g4=設施, g6=建築設施
+            group = section5d1.get(group_key, [])
+            for item in group:
+                key = item.get('key')
+                value = item.get('value')
+                if key and value:
+                    features.append(f"{key}: {value}")
+        
+        if features:
+            result['features'] = json.dumps(features, ensure_ascii=False)
+    
+        return result
 
     def _parse_api_property(self, prop: Dict, transaction_type: int) -> Optional[Dict]:
         """
@@ -454,6 +535,40 @@ class HouseScraper(BaseScraper):
             'lon': location.get('lon'),
         }
     
+    def parse_archived(self, record) -> List[Dict]:
+        """
+        從存檔響應重新解析
+        API 列表響應逐個解析房源，並合併存檔中對應的詳情 API 響應；
+        HTML 頁面沿用 parse_detail_page
+        """
+        if record.status != 200:
+            return []
+        detail_prefix = f"{self.API_URL}/property/detail/"
+        if record.url.startswith(detail_prefix):
+            return []  # 詳情在對應的列表記錄中合併
+        if not record.url.startswith(f"{self.API_URL}/property"):
+            return super().parse_archived(record)
+        
+        data = record.json()
+        if data.get('status') != 1:
+            return []
+        query = parse_qs(urlparse(record.url).query)
+        transaction_type = int(query.get('transactionType', ['1'])[0])
+        
+        store = archive.get_archive()
+        items = []
+        for prop in data.get('data', []):
+            parsed = self._parse_api_property(prop, transaction_type)
+            if not parsed:
+                continue
+            detail = store.latest(f"{detail_prefix}{parsed['listing_id']}")
+            if detail and detail.status == 200:
+                payload = detail.json()
+                if payload.get('status') == 1:
+                    parsed.update(self._parse_property_detail(payload.get('data', {})))
+            items.append(parsed)
+        return items
+    
     def is_list_page(self, url: str) -> bool:
         """判斷是否為列表頁面"""
         # 列表頁面通常不包含數字ID
@@ -463,7 +578,7 @@ class HouseScraper(BaseScraper):
     
     def parse_list_page(self, html: str, url: str) -> List[Dict]:
         """解析房屋列表頁面，提取詳情頁面URL"""
-        soup = BeautifulSoup(html, 'lxml')
+        soup = self.make_soup(html)
         items = []
         
         # 查找租房鏈接
@@ -481,7 +596,7 @@ class HouseScraper(BaseScraper):
     
     def parse_detail_page(self, html: str, url: str) -> Optional[Dict]:
         """解析租房詳情頁面 (用戶發布的房源)"""
-        soup = BeautifulSoup(html, 'lxml')
+        soup = self.make_soup(html)
         data = {'url': url}
         
         # 從 URL 提取 ID
@@ -609,11 +724,14 @@ class HouseScraper(BaseScraper):
         
         # 初始化數據庫
         try:
-            from .models import init_database, get_unvisited_urls, mark_url_visited, add_url_to_queue
+            from .models import init_database
         except ImportError:
-            from models import init_database, get_unvisited_urls, mark_url_visited, add_url_to_queue
+            from models import init_database
         init_database()
         
+        # 從 sitemap / feed 補充房源 URL (沒有時只處理隊列中已有的，見 add_house_urls.py)
+        discovery.discover(self)
+        
         start_time = datetime.now()
         saved = 0
         errors = 0
@@ -621,50 +739,59 @@ class HouseScraper(BaseScraper):
         
         while processed < max_pages:
             # 獲取未訪問的 URL
-            unvisited = get_unvisited_urls(self.URL_TYPE, limit=10)
+            unvisited = self.frontier.lease(self.URL_TYPE, limit=10)
             if not unvisited:
                 self.logger.info("沒有更多未訪問的 URL")
                 break
             
-            for url in unvisited:
+            for index, url in enumerate(unvisited):
                 if processed >= max_pages:
+                    self.frontier.release(unvisited[index:])
                     break
                 
                 self.logger.info(f"處理: {url}")
-                html = self.fetch_page(url)
-                
-                if not html:
-                    mark_url_visited(url, error="Failed to fetch")
-                    errors += 1
-                    processed += 1
-                    continue
-                
-                try:
-                    if self.is_list_page(url):
-                        # 列表頁面 - 提取更多 URL
-                        items = self.parse_list_page(html, url)
-                        for item in items:
-                            if 'url' in item:
-                                add_url_to_queue(item['url'], self.URL_TYPE, source_url=url, priority=5)
-                        self.logger.info(f"  發現 {len(items)} 個房源 URL")
-                    else:
-                        # 詳情頁面 - 解析並保存
-                        data = self.parse_detail_page(html, url)
-                        if data:
-                            if self.save_item(data):
-                                saved += 1
-                                self.logger.info(f"  保存: {data.get('title', 'N/A')[:30]}")
-                            else:
-                                errors += 1
-                        else:
-                            self.logger.warning(f"  無法解析頁面")
+                with profiling.track_url(url):
+                    html = self.fetch_page(url)
                     
-                    mark_url_visited(url)
+                    if not html:
+                        self.frontier.done(url, error="Failed to fetch")
+                        errors += 1
+                        processed += 1
+                        continue
                     
-                except Exception as e:
-                    self.logger.error(f"  錯誤: {e}")
-                    mark_url_visited(url, error=str(e))
-                    errors += 1
+                    try:
+                        if self.is_list_page(url):
+                            # 列表頁面 - 提取更多 URL
+                            with profiling.stage('parse'):
+                                items = self.parse_list_page(html, url)
+                            added = self.scheduler.enqueue([item['url'] for item in items if 'url' in item],
+                                                           source_url=url)
+                            self.scheduler.record(url, new_links=added)
+                            self.logger.info(f"  發現 {len(items)} 個房源 URL")
+                        else:
+                            # 詳情頁面 - 解析並保存
+                            with profiling.stage('parse'):
+                                data = self.parse_detail_page(html, url)
+                            new_item = False
+                            if data:
+                                new_item = self.is_new_item(data)
+                                with profiling.stage('save'):
+                                    ok = self.save_item(data)
+                                if ok:
+                                    saved += 1
+                                    self.logger.info(f"  保存: {data.get('title', 'N/A')[:30]}")
+                                else:
+                                    errors += 1
+                            else:
+                                self.logger.warning(f"  無法解析頁面")
+                            self.scheduler.record(url, new_items=int(new_item))
+                        
+                        self.frontier.done(url)
+                        
+                    except Exception as e:
+                        self.logger.error(f"  錯誤: {e}")
+                        self.frontier.done(url, error=str(e))
+                        errors += 1
                 
                 processed += 1
                 time.sleep(0.5)  # 避免請求過快
@@ -679,63 +806,6 @@ class HouseScraper(BaseScraper):
         self.logger.info(f"  - 運行時間: {elapsed:.2f} 秒")
         self.logger.info("=" * 60)
     
-    def save_item(self, data: Dict) -> bool:
-        """保存房屋到資料庫"""
-        try:
-            # 繁體中文轉換
-            title = self.to_traditional(data.get('title'))
-            address = self.to_traditional(data.get('address'))
-            community = self.to_traditional(data.get('community'))
-            description = self.to_traditional(data.get('description'))
-            
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO house_listings (
-                    listing_id, url, title, listing_type, property_type,
-                    price, price_unit, address, city, province, community,
-                    postal_code, bedrooms, dens, bathrooms, parking, sqft,
-                    description, features,
-                    agent_name, agent_phone, agent_company,
-                    image_urls, listing_date, lat, lon
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                data.get('listing_id'),
-                data.get('url'),
-                title,
-                data.get('listing_type'),
-                data.get('property_type'),
-                data.get('price'),
-                data.get('price_unit'),
-                address,
-                data.get('city'),
-                data.get('province'),
-                community,
-                data.get('postal_code'),
-                data.get('bedrooms'),
-                data.get('dens'),
-                data.get('bathrooms'),
-                data.get('parking'),
-                data.get('sqft'),
-                description,
-                data.get('features'),
-                data.get('agent_name'),
-                data.get('agent_phone'),
-                data.get('agent_company'),
-                data.get('image_urls'),
-                data.get('listing_date'),
-                data.get('lat'),
-                data.get('lon'),
-            ))
-            
-            conn.commit()
-            conn.close()
-            return True
-        except Exception as e:
-            self.logger.error(f"保存房屋失敗: {e}")
-            return False
-    
     def update_missing_details(self, limit: int = 100):
         """
         更新現有記錄中缺少詳情的房屋
@@ -794,6 +864,8 @@ class HouseScraper(BaseScraper):
                             values.append(value)
                 
                 if updates:
+                    updates.append("detail_fetched_at = ?")
+                    values.append(datetime.now().isoformat(timespec='seconds'))
                     values.append(listing_id)
                     sql = f"UPDATE house_listings SET {', '.join(updates)} WHERE listing_id = ?"
                     cursor.execute(sql, values)
@@ -809,16 +881,21 @@ class HouseScraper(BaseScraper):
         self.logger.info("=" * 60)
 
 
-if __name__ == "__main__":
+def _main():
     import sys
     
     scraper = HouseScraper()
     
+    # --resume: API 模式從上次中斷的頁繼續
+    resume = '--resume' in sys.argv
+    if resume:
+        sys.argv.remove('--resume')
+    
     # 檢查命令行參數
     if len(sys.argv) > 1:
         if sys.argv[1] == '--details':
             # 獲取詳情模式 (API)
-            scraper.run(max_pages=10, fetch_details=True)
+            scraper.run(max_pages=10, fetch_details=True, resume=resume)
         elif sys.argv[1] == '--update-details':
             # 更新現有記錄的詳情
             scraper.update_missing_details(limit=int(sys.argv[2]) if len(sys.argv) > 2 else 100)
@@ -829,10 +906,10 @@ if __name__ == "__main__":
         elif sys.argv[1] == '--api':
             # API 模式
             max_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 50
-            scraper.run(max_pages=max_pages)
+            scraper.run(max_pages=max_pages, resume=resume)
         else:
             # 數字參數 - 使用 API 模式
-            scraper.run(max_pages=int(sys.argv[1]))
+            scraper.run(max_pages=int(sys.argv[1]), resume=resume)
     else:
         # 默認：HTML 模式處理隊列
         print("用法:")
@@ -841,5 +918,16 @@ if __name__ == "__main__":
         print("  --details             : API 模式，獲取詳細資訊")
         print("  --update-details [n]  : 更新現有記錄的詳情")
         print("  [number]              : API 模式，指定頁數")
+        print("  --resume              : API 模式從上次中斷的頁繼續 (可與上述選項組合)")
+        print("  --profile             : 以性能分析模式運行 (可與上述選項組合)")
         print("\n運行 HTML 模式...")
         scraper.run_html(max_pages=100)
+
+
+if __name__ == "__main__":
+    # --profile: 性能分析模式，報告寫入 logs/
+    if '--profile' in sys.argv:
+        sys.argv.remove('--profile')
+        profiling.run_profiled(HouseScraper.SCRAPER_NAME, _main)
+    else:
+        _main()
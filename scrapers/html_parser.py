@@ -0,0 +1,372 @@
+"""
+51.ca 爬蟲 - HTML 解析後端
+統一的 CSS 選擇器接口 (Document / Node)，按可用性選擇後端:
+
+    selectolax (lexbor)  - C 實現，最快
+    lxml + cssselect     - C 實現
+    BeautifulSoup        - 純 Python 樹，最慢，作為後備
+
+三個後端的文本語義一致 (僅空白處理略有差異): text() 對應 BeautifulSoup 的
+get_text()，text(strip=True) 對應 get_text(strip=True)；<script> / <style> 在解析後即移除
+(帶 id 的 <script> 內容先保存，可用 json_script() 讀取，如 __NEXT_DATA__)。
+
+用法:
+    doc = html_parser.parse_html(html)                   # 自動選擇後端
+    doc = html_parser.parse_html(html, backend='bs4')    # 指定後端
+    for a in doc.css('a[href*="/articles/"]'):
+        a.attr('href'), a.text(strip=True)
+
+環境變量 SCRAPER_HTML_BACKEND=selectolax|lxml|bs4 可全局指定後端。
+"""
+
+import os
+from typing import Dict, Iterator, List, Optional
+
+BACKENDS = ('selectolax', 'lxml', 'bs4')
+
+# 解析後移除的標籤 (其文本不計入 text())
+STRIP_TAGS = ('script', 'style', 'template')
+
+
+def _available(name: str) -> bool:
+    try:
+        if name == 'selectolax':
+            from selectolax.lexbor import LexborHTMLParser  # noqa: F401
+        elif name == 'lxml':
+            import lxml.html  # noqa: F401
+            import cssselect  # noqa: F401
+        else:
+            import bs4  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def available_backends() -> List[str]:
+    """已安裝的後端 (按速度排序)"""
+    return [name for name in BACKENDS if _available(name)]
+
+
+_default_backend = None
+
+
+def default_backend() -> str:
+    """默認後端: 環境變量指定的，否則為最快的可用後端"""
+    global _default_backend
+    if _default_backend is None:
+        requested = os.environ.get('SCRAPER_HTML_BACKEND', '').strip().lower()
+        backends = available_backends()
+        _default_backend = requested if requested in backends else backends[0]
+    return _default_backend
+
+
+def parse_html(html, backend: Optional[str] = None) -> 'Document':
+    """解析 HTML (str 或 bytes)，返回 Document"""
+    backend = backend or default_backend()
+    if backend == 'selectolax':
+        return _SelectolaxDocument(html)
+    if backend == 'lxml':
+        return _LxmlDocument(html)
+    if backend == 'bs4':
+        return _SoupDocument(html)
+    raise ValueError(f"未知的 HTML 解析後端: {backend}")
+
+
+# ============== 接口 ==============
+
+class Node:
+    """元素節點"""
+
+    tag = ''
+
+    def css(self, selector: str) -> List['Node']:
+        """所有匹配選擇器的後代 (文檔順序)"""
+        raise NotImplementedError
+
+    def css_first(self, selector: str) -> Optional['Node']:
+        """第一個匹配選擇器的後代"""
+        nodes = self.css(selector)
+        return nodes[0] if nodes else None
+
+    def text(self, strip: bool = False) -> str:
+        """文本內容 (strip=True 時逐段去除空白後拼接)"""
+        raise NotImplementedError
+
+    def attr(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """屬性值 (class 等多值屬性返回原始字符串)"""
+        raise NotImplementedError
+    
+    @property
+    def parent(self) -> Optional['Node']:
+        """父元素 (<html> 的父元素為 None)"""
+        raise NotImplementedError
+
+    @property
+    def classes(self) -> List[str]:
+        return (self.attr('class') or '').split()
+
+    def next_siblings(self) -> Iterator['Node']:
+        """之後的兄弟元素"""
+        raise NotImplementedError
+
+    def next_sibling(self, tag: Optional[str] = None) -> Optional['Node']:
+        """之後第一個 (指定標籤的) 兄弟元素"""
+        for sibling in self.next_siblings():
+            if tag is None or sibling.tag == tag:
+                return sibling
+        return None
+
+    def remove(self):
+        """從樹中刪除 (子節點一併刪除)"""
+        raise NotImplementedError
+
+    def _key(self):
+        """底層節點的身份 (同一元素的不同包裝相等)"""
+        raise NotImplementedError
+    
+    def __eq__(self, other):
+        return isinstance(other, Node) and self._key() == other._key()
+    
+    def __hash__(self):
+        return hash(self._key())
+    
+    def __bool__(self):
+        return True
+
+
+class Document(Node):
+    """整個頁面"""
+
+    backend = ''
+
+    def __init__(self):
+        self._scripts = {}
+        self._text_cache = None
+
+    def json_script(self, script_id: str) -> Optional[str]:
+        """帶 id 的 <script> 的原始內容 (解析時保存，如 __NEXT_DATA__)"""
+        return self._scripts.get(script_id)
+
+    def page_text(self) -> str:
+        """整頁文本 (緩存，多個提取函數共用一次遍歷)"""
+        if self._text_cache is None:
+            self._text_cache = self.text()
+        return self._text_cache
+
+    def remove_all(self, selector: str) -> int:
+        """刪除所有匹配的元素，返回數量"""
+        nodes = self.css(selector)
+        for node in nodes:
+            node.remove()
+        if nodes:
+            self._text_cache = None
+        return len(nodes)
+
+
+# ============== selectolax (lexbor) ==============
+
+class _SelectolaxNode(Node):
+    __slots__ = ('_node',)
+
+    def __init__(self, node):
+        self._node = node
+
+    @property
+    def tag(self):
+        return self._node.tag
+
+    def css(self, selector):
+        return [_SelectolaxNode(n) for n in self._node.css(selector)]
+
+    def css_first(self, selector):
+        node = self._node.css_first(selector)
+        return _SelectolaxNode(node) if node is not None else None
+
+    def text(self, strip=False):
+        return self._node.text(deep=True, separator='', strip=strip)
+
+    def attr(self, name, default=None):
+        value = self._node.attributes.get(name, default)
+        return default if value is None else value
+    
+    @property
+    def parent(self):
+        node = self._node.parent
+        if node is None or not node.tag or node.tag.startswith('-'):
+            return None
+        return _SelectolaxNode(node)
+    
+    def _key(self):
+        return self._node.mem_id
+
+    def next_siblings(self):
+        node = self._node.next
+        while node is not None:
+            if node.tag and not node.tag.startswith(('-', '_', '!')):
+                yield _SelectolaxNode(node)
+            node = node.next
+
+    def remove(self):
+        # 只摘除不銷毀: 已刪除元素的後代可能仍在待刪列表中
+        self._node.remove()
+
+
+class _SelectolaxDocument(_SelectolaxNode, Document):
+    backend = 'selectolax'
+
+    def __init__(self, html):
+        from selectolax.lexbor import LexborHTMLParser
+        Document.__init__(self)
+        if isinstance(html, bytes):
+            html = html.decode('utf-8', errors='replace')
+        tree = LexborHTMLParser(html or '')
+        for script in tree.css('script[id]'):
+            self._scripts[script.attributes.get('id')] = script.text(deep=True)
+        tree.strip_tags(list(STRIP_TAGS))
+        self._tree = tree
+        _SelectolaxNode.__init__(self, tree.root)
+
+    def css(self, selector):
+        return [_SelectolaxNode(n) for n in self._tree.css(selector)]
+
+    def css_first(self, selector):
+        node = self._tree.css_first(selector)
+        return _SelectolaxNode(node) if node is not None else None
+
+    def text(self, strip=False):
+        root = self._tree.root
+        return root.text(deep=True, separator='', strip=strip) if root is not None else ''
+
+
+# ============== lxml ==============
+
+class _LxmlNode(Node):
+    __slots__ = ('_el',)
+
+    def __init__(self, el):
+        self._el = el
+
+    @property
+    def tag(self):
+        return self._el.tag
+
+    def css(self, selector):
+        return [_LxmlNode(el) for el in self._el.cssselect(selector)]
+
+    def text(self, strip=False):
+        if strip:
+            return ''.join(s.strip() for s in self._el.itertext())
+        return ''.join(self._el.itertext())
+
+    def attr(self, name, default=None):
+        return self._el.get(name, default)
+    
+    @property
+    def parent(self):
+        el = self._el.getparent()
+        return _LxmlNode(el) if el is not None else None
+    
+    def _key(self):
+        # 有引用存活時 lxml 對同一元素返回同一代理對象
+        return id(self._el)
+
+    def next_siblings(self):
+        for el in self._el.itersiblings():
+            if isinstance(el.tag, str):
+                yield _LxmlNode(el)
+
+    def remove(self):
+        self._el.drop_tree()
+
+
+class _LxmlDocument(_LxmlNode, Document):
+    backend = 'lxml'
+
+    def __init__(self, html):
+        import lxml.html
+        from lxml import etree
+        Document.__init__(self)
+        if isinstance(html, str):
+            # 帶 XML 編碼聲明的 str 會被 lxml 拒絕
+            html = html.encode('utf-8')
+        parser = lxml.html.HTMLParser(encoding='utf-8')
+        try:
+            root = lxml.html.document_fromstring(html or b'<html></html>', parser=parser)
+        except etree.ParserError:
+            root = lxml.html.document_fromstring(b'<html></html>', parser=parser)
+        for script in root.iter('script'):
+            if script.get('id'):
+                self._scripts[script.get('id')] = script.text or ''
+        etree.strip_elements(root, *STRIP_TAGS, with_tail=False)
+        # 註釋不計入文本
+        etree.strip_elements(root, etree.Comment, with_tail=False)
+        _LxmlNode.__init__(self, root)
+
+
+# ============== BeautifulSoup ==============
+
+class _SoupNode(Node):
+    __slots__ = ('_tag',)
+
+    def __init__(self, tag):
+        self._tag = tag
+
+    @property
+    def tag(self):
+        return self._tag.name
+
+    def css(self, selector):
+        return [_SoupNode(t) for t in self._tag.select(selector)]
+
+    def css_first(self, selector):
+        tag = self._tag.select_one(selector)
+        return _SoupNode(tag) if tag is not None else None
+
+    def text(self, strip=False):
+        return self._tag.get_text(strip=strip)
+
+    def attr(self, name, default=None):
+        value = self._tag.get(name, default)
+        return ' '.join(value) if isinstance(value, list) else value
+    
+    @property
+    def parent(self):
+        tag = self._tag.parent
+        if tag is None or tag.parent is None:
+            # BeautifulSoup 對象本身不算元素
+            return None
+        return _SoupNode(tag)
+    
+    def _key(self):
+        # Tag 的 == / hash 按結構比較，身份用 id
+        return id(self._tag)
+
+    def next_siblings(self):
+        for sibling in self._tag.find_next_siblings():
+            yield _SoupNode(sibling)
+
+    def remove(self):
+        self._tag.decompose()
+
+
+class _SoupDocument(_SoupNode, Document):
+    backend = 'bs4'
+
+    def __init__(self, html):
+        from bs4 import BeautifulSoup
+        Document.__init__(self)
+        parser = 'lxml' if _lxml_installed() else 'html.parser'
+        soup = BeautifulSoup(html or '', parser)
+        for script in soup.find_all('script', id=True):
+            self._scripts[script['id']] = script.string or ''
+        for tag in soup(list(STRIP_TAGS)):
+            tag.decompose()
+        _SoupNode.__init__(self, soup)
+
+
+def _lxml_installed() -> bool:
+    try:
+        import lxml  # noqa: F401
+        return True
+    except ImportError:
+        return False
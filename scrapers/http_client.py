@@ -0,0 +1,181 @@
+"""
+51.ca 爬蟲 - 共享 HTTP 客戶端
+所有爬蟲共用同一個客戶端工廠:
+- keep-alive 連接池 (大小按並發數配置)，避免每次請求重新 TCP+TLS 握手
+- gzip / brotli 壓縮協商 (安裝 brotli 時自動啟用 br)
+- 可選 HTTP/2 (需要 httpx[http2])
+- DNS 緩存
+- 統一超時和重試
+"""
+
+import socket
+import threading
+import time
+import logging
+from typing import Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 統一超時 (連接, 讀取) 秒
+DEFAULT_TIMEOUT: Tuple[float, float] = (5, 30)
+
+# 連接池大小 (每個 host 的 keep-alive 連接數，應不少於並發數)
+DEFAULT_POOL_SIZE = 10
+
+# DNS 緩存有效期 (秒)
+DNS_CACHE_TTL = 300
+
+# 通用請求頭
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+}
+
+logger = logging.getLogger(__name__)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _accept_encoding() -> str:
+    """根據已安裝的解壓庫決定 Accept-Encoding"""
+    try:
+        import brotli  # noqa: F401
+        return 'gzip, deflate, br'
+    except ImportError:
+        pass
+    try:
+        import brotlicffi  # noqa: F401
+        return 'gzip, deflate, br'
+    except ImportError:
+        return 'gzip, deflate'
+
+
+# ============== DNS 緩存 ==============
+
+_original_getaddrinfo = socket.getaddrinfo
+_dns_cache = {}
+_dns_lock = threading.Lock()
+
+
+def _cached_getaddrinfo(host, port, *args, **kwargs):
+    """帶 TTL 的 getaddrinfo 緩存"""
+    key = (host, port, args, tuple(sorted(kwargs.items())))
+    now = time.monotonic()
+    entry = _dns_cache.get(key)
+    if entry and entry[0] > now:
+        return entry[1]
+    result = _original_getaddrinfo(host, port, *args, **kwargs)
+    with _dns_lock:
+        _dns_cache[key] = (now + DNS_CACHE_TTL, result)
+    return result
+
+
+def enable_dns_cache():
+    """啟用進程級 DNS 緩存 (重複調用無副作用)"""
+    socket.getaddrinfo = _cached_getaddrinfo
+
+
+def clear_dns_cache():
+    """清空 DNS 緩存"""
+    with _dns_lock:
+        _dns_cache.clear()
+
+
+# ============== 客戶端 ==============
+
+class TimeoutSession(requests.Session):
+    """未指定 timeout 時使用統一默認超時的 Session"""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.default_timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.default_timeout
+        return super().request(method, url, **kwargs)
+
+
+def _create_requests_session(pool_size: int, timeout, retries: int) -> requests.Session:
+    session = TimeoutSession(timeout=timeout)
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    session.headers['Accept-Encoding'] = _accept_encoding()
+    return session
+
+
+def _create_http2_client(pool_size: int, timeout, retries: int):
+    """HTTP/2 客戶端 (httpx)，接口與 requests.Session 的常用部分兼容"""
+    import httpx
+    connect_timeout, read_timeout = timeout
+    client = httpx.Client(
+        http2=True,
+        headers=DEFAULT_HEADERS,
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        # 傳入 transport 時 Client 的 limits 參數無效，連接池大小設在 transport 上
+        transport=httpx.HTTPTransport(
+            http2=True,
+            retries=retries,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        ),
+        follow_redirects=True,
+    )
+    client.headers['Accept-Encoding'] = _accept_encoding()
+    return client
+
+
+def get_session(pool_size: int = DEFAULT_POOL_SIZE, http2: bool = False,
+                timeout=DEFAULT_TIMEOUT, retries: int = 2, dns_cache: bool = True):
+    """
+    獲取共享 HTTP 客戶端 (相同配置返回同一實例)
+
+    Args:
+        pool_size: 連接池大小，應不少於並發請求數
+        http2: 是否使用 HTTP/2 (未安裝 httpx[http2] 時退回 requests)
+        timeout: 默認超時 (連接, 讀取)
+        retries: 連接錯誤 / 5xx 重試次數
+        dns_cache: 是否啟用 DNS 緩存
+    """
+    if dns_cache:
+        enable_dns_cache()
+
+    key = (pool_size, http2, tuple(timeout), retries)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            return client
+
+        if http2:
+            try:
+                client = _create_http2_client(pool_size, timeout, retries)
+            except ImportError:
+                logger.warning("未安裝 httpx[http2]，改用 HTTP/1.1 連接池")
+        if client is None:
+            client = _create_requests_session(pool_size, timeout, retries)
+
+        _clients[key] = client
+        return client
+
+
+def close_all():
+    """關閉所有共享客戶端"""
+    with _clients_lock:
+        for client in _clients.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+        _clients.clear()
@@ -6,17 +6,17 @@
     python -m scrapers.jobs_scraper --max-jobs 100
 """
 
-import json
 import re
 import time
 from typing import List, Dict, Optional
-from datetime import datetime
-from bs4 import BeautifulSoup
-import requests
 from playwright.sync_api import sync_playwright, Page, Browser
 
 from .base import BaseScraper
-from .models import get_connection
+from .models import init_database
+from .schema import JOBS
+from . import profiling
+from . import archive
+from . import checkpoints
 
 
 class JobsScraper(BaseScraper):
@@ -25,6 +25,7 @@ class JobsScraper(BaseScraper):
     SCRAPER_NAME = "jobs"
     BASE_URL = "https://www.51.ca/jobs"
     API_URL = "https://www.51.ca/jobs/api/job-posts"
+    SCHEMA = JOBS
     
     def __init__(self):
         super().__init__()
@@ -45,10 +46,6 @@ class JobsScraper(BaseScraper):
     def parse_detail_page(self, html: str, url: str) -> Optional[Dict]:
         return None
     
-    def save_item(self, data: Dict) -> bool:
-        """保存項目到資料庫 - 實現抽象方法"""
-        return self.save_job(data)
-    
     def _init_browser(self, headless: bool = True):
         """初始化瀏覽器"""
         self._playwright = sync_playwright().start()
@@ -76,7 +73,6 @@ class JobsScraper(BaseScraper):
             (jobs, pagination) - 工作列表和分頁信息
         """
         headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Accept': 'application/json',
             'Referer': f'{self.BASE_URL}/job-posts',
         }
@@ -84,7 +80,9 @@ class JobsScraper(BaseScraper):
         url = f"{self.API_URL}?page={page}&perPage={per_page}"
         
         try:
-            resp = requests.get(url, headers=headers, timeout=30)
+            with profiling.stage('fetch'):
+                resp = self.session.get(url, headers=headers)
+            self.archive_response(resp)
             if resp.status_code != 200:
                 self.logger.error(f"API 請求失敗: {resp.status_code}")
                 return [], None
@@ -96,7 +94,7 @@ class JobsScraper(BaseScraper):
             html_data = data.get('data', {})
             html_content = html_data.get('html', '') if isinstance(html_data, dict) else html_data
             
-            soup = BeautifulSoup(html_content, 'html.parser')
+            soup = self.make_soup(html_content)
             
             jobs = []
             job_items = soup.select('.job-item')
@@ -165,8 +163,10 @@ class JobsScraper(BaseScraper):
         """獲取工作詳情（含電話）"""
         try:
             url = f"{self.BASE_URL}/job-posts/{job_id}"
-            self._page.goto(url, wait_until='networkidle', timeout=15000)
+            response = self._page.goto(url, wait_until='networkidle', timeout=15000)
             time.sleep(0.5)
+            archive.record(self.SCRAPER_NAME, None, body=self._page.content(), url=url,
+                           status=response.status if response else 200)
             
             detail = {}
             
@@ -236,88 +236,38 @@ class JobsScraper(BaseScraper):
             self.logger.debug(f"獲取詳情失敗 {job_id}: {e}")
             return None
     
-    def save_job(self, job: Dict) -> bool:
-        """保存工作到數據庫"""
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            # 創建表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS jobs (
-                    id INTEGER PRIMARY KEY,
-                    title TEXT,
-                    content TEXT,
-                    salary TEXT,
-                    location TEXT,
-                    address TEXT,
-                    category TEXT,
-                    publisher TEXT,
-                    phone TEXT,
-                    url TEXT,
-                    tags TEXT,
-                    view_count INTEGER DEFAULT 0,
-                    is_recommended BOOLEAN DEFAULT 0,
-                    created_at TEXT,
-                    updated_at TEXT,
-                    scraped_at TEXT,
-                    raw_data TEXT
-                )
-            ''')
-            
-            # 插入或更新
-            cursor.execute('''
-                INSERT OR REPLACE INTO jobs 
-                (id, title, content, salary, location, address, category, publisher, 
-                 phone, url, tags, view_count, is_recommended, 
-                 created_at, updated_at, scraped_at, raw_data)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                job.get('id'),
-                job.get('title', ''),
-                job.get('content', ''),
-                job.get('salary', ''),
-                job.get('location', ''),
-                job.get('address', ''),
-                job.get('category', ''),
-                job.get('publisher', ''),
-                job.get('phone', ''),
-                job.get('url', ''),
-                json.dumps(job.get('tags', []), ensure_ascii=False),
-                job.get('view_count', 0),
-                1 if job.get('is_recommended') else 0,
-                job.get('created_at', ''),
-                job.get('updated_at', ''),
-                datetime.now().isoformat(),
-                json.dumps(job.get('raw_data', {}), ensure_ascii=False) if job.get('raw_data') else ''
-            ))
-            
-            conn.commit()
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"保存失敗 {job.get('id')}: {e}")
-            return False
-    
     def run(self, max_jobs: int = 100, fetch_details: bool = True, 
-            headless: bool = True, per_page: int = 50):
+            headless: bool = True, per_page: int = 50, resume: bool = False):
         """
         運行爬蟲
         
         Args:
-            max_jobs: 最大抓取數量
+            max_jobs: 最大抓取數量 (續爬時計本次運行的數量)
             fetch_details: 是否獲取詳情（含電話）
             headless: 是否無頭模式
-            per_page: 每頁數量
+            per_page: 每頁數量 (續爬時需與上次相同)
+            resume: 從上次中斷的斷點繼續 (見 checkpoints.py)
         """
         self.logger.info(f"開始爬取工作，最大數量: {max_jobs}")
+        init_database()
+        if not resume:
+            checkpoints.reset(self.SCRAPER_NAME)
+        
+        page = checkpoints.resume_page(self.SCRAPER_NAME, resume)
+        if page is None:
+            self.logger.info("上次已爬取完成，沒有可繼續的斷點")
+            checkpoints.clear_if_finished(self.SCRAPER_NAME)
+            return []
+        if page > 1:
+            self.logger.info(f"從斷點繼續: 第 {page} 頁")
         
         try:
             if fetch_details:
                 self._init_browser(headless=headless)
             
             all_jobs = []
-            page = 1
+            saved = 0
+            finished = True
             
             while len(all_jobs) < max_jobs:
                 self.logger.info(f"獲取第 {page} 頁...")
@@ -325,25 +275,34 @@ class JobsScraper(BaseScraper):
                 jobs, pagination = self._fetch_job_list_from_api(page=page, per_page=per_page)
                 
                 if not jobs:
-                    self.logger.info("沒有更多數據")
+                    # pagination 為 None 表示請求失敗，保留斷點
+                    finished = pagination is not None
+                    self.logger.info("沒有更多數據" if finished else "列表請求失敗，停止")
                     break
                 
+                page_jobs = []
                 for job in jobs:
-                    if len(all_jobs) >= max_jobs:
+                    if len(all_jobs) + len(page_jobs) >= max_jobs:
                         break
                     
-                    # 獲取詳情
-                    if fetch_details:
-                        self.logger.info(f"  獲取詳情: {job['id']}")
-                        detail = self._fetch_job_detail(job['id'])
-                        if detail:
-                            job.update(detail)
-                        time.sleep(0.3)
-                    
-                    # 保存
-                    if self.save_job(job):
-                        all_jobs.append(job)
-                        self.logger.debug(f"  保存成功: {job['id']}")
+                    with profiling.track_url(job['url']):
+                        # 獲取詳情
+                        if fetch_details:
+                            self.logger.info(f"  獲取詳情: {job['id']}")
+                            with profiling.stage('fetch'):
+                                detail = self._fetch_job_detail(job['id'])
+                            if detail:
+                                job.update(detail)
+                            time.sleep(0.3)
+                    page_jobs.append(job)
+                
+                # 整頁一次寫入；整頁都已處理時才記錄斷點
+                checkpoint = None
+                if len(page_jobs) == len(jobs):
+                    checkpoint = {'page': page, 'cursor': page_jobs[-1].get('id')}
+                with profiling.stage('save'):
+                    saved += self.save_items(page_jobs, checkpoint=checkpoint)
+                all_jobs.extend(page_jobs)
                 
                 # 檢查是否有下一頁
                 if pagination:
@@ -354,7 +313,11 @@ class JobsScraper(BaseScraper):
                 
                 page += 1
             
-            self.logger.info(f"完成! 共保存 {len(all_jobs)} 個工作")
+            if finished:
+                checkpoints.finish(self.SCRAPER_NAME)
+                checkpoints.clear_if_finished(self.SCRAPER_NAME)
+            
+            self.logger.info(f"完成! 共保存 {saved}/{len(all_jobs)} 個工作")
             
             # 統計電話
             with_phone = sum(1 for j in all_jobs if j.get('phone'))
@@ -375,16 +338,24 @@ def main():
     parser.add_argument('--no-details', action='store_true', help='不獲取詳情')
     parser.add_argument('--no-headless', action='store_true', help='顯示瀏覽器')
     parser.add_argument('--per-page', type=int, default=50, help='每頁數量')
+    parser.add_argument('--resume', action='store_true', help='從上次中斷的頁繼續')
+    parser.add_argument('--profile', action='store_true', help='性能分析模式 (報告寫入 logs/)')
+    parser.add_argument('--profile-top', type=int, default=20, help='性能報告列出最慢的 URL 數量')
     
     args = parser.parse_args()
     
     scraper = JobsScraper()
-    scraper.run(
+    run_kwargs = dict(
         max_jobs=args.max_jobs,
         fetch_details=not args.no_details,
         headless=not args.no_headless,
-        per_page=args.per_page
+        per_page=args.per_page,
+        resume=args.resume
     )
+    if args.profile:
+        profiling.run_profiled(scraper.SCRAPER_NAME, scraper.run, top_n=args.profile_top, **run_kwargs)
+    else:
+        scraper.run(**run_kwargs)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,317 @@
+"""
+51.ca 爬蟲 - 日誌管道
+爬蟲日誌器只掛一個共享的 QueueHandler: 爬取線程只把 LogRecord 放入有界隊列 (不格式化、不寫盤)，
+由 QueueListener 後台線程統一格式化並寫出 (性能分析只採樣主線程，日誌不再出現在 profile 中):
+
+    控制台   INFO 及以上
+    文件     logs/YYYYMMDD_logs.log，DEBUG 及以上；跨天或超過 MAX_BYTES 時輪轉，
+             輪轉出的文件 gzip 壓縮為 YYYYMMDD_logs.N.log.gz，超過 RETENTION_DAYS 天的刪除
+
+隊列滿時丟棄新日誌而不阻塞爬取 (丟棄數在退出時報告)。
+
+JSON Lines 格式 (環境變量 SCRAPER_LOG_FORMAT=json 或 configure(json_format=True))，
+每行帶 scraper / url / stage / duration 欄位:
+    with log_pipeline.url_context(url):
+        logger.debug("頁面完成", extra={'stage': 'parse', 'duration': 0.12})
+
+逐項日誌限速 (每個間隔最多一條，略過的條數附在下一條後):
+    item_log = log_pipeline.Throttle(logger)
+    item_log("正在處理: %s", url)
+"""
+
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import queue
+import atexit
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+LOG_DIR = os.path.join(os.path.dirname(__file__), "..", "logs")
+
+# 單個日誌文件的大小上限 (超過即輪轉)
+MAX_BYTES = 50 * 1024 * 1024
+
+# 壓縮日誌保留天數
+RETENTION_DAYS = 30
+
+# 日誌隊列容量 (滿時丟棄，不阻塞爬取線程)
+QUEUE_SIZE = 10000
+
+# Throttle 默認間隔 (秒)
+THROTTLE_INTERVAL = 1.0
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# JSON Lines 中附帶的記錄欄位 (經 extra= 或 url_context 設置)
+CONTEXT_FIELDS = ('url', 'stage', 'duration')
+
+
+# ============== 上下文 ==============
+
+_context = threading.local()
+
+
+@contextmanager
+def url_context(url: str):
+    """其中產生的日誌帶上 url 欄位 (按線程)"""
+    previous = getattr(_context, 'url', None)
+    _context.url = url
+    try:
+        yield
+    finally:
+        _context.url = previous
+
+
+class _ContextFilter(logging.Filter):
+    """在調用線程上補上當前 URL (只做屬性賦值)"""
+
+    def filter(self, record):
+        if getattr(record, 'url', None) is None:
+            record.url = getattr(_context, 'url', None)
+        return True
+
+
+# ============== 隊列 ==============
+
+class _QueueHandler(QueueHandler):
+    """同進程隊列: 不預先格式化，隊列滿時丟棄"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 默認實現會在調用線程上格式化整條消息 (供跨進程傳遞)，同進程不需要
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # 隊列滿時等待寫出線程騰出空間，保證能停止
+        self.queue.put(self._sentinel)
+
+
+_queue = queue.Queue(QUEUE_SIZE)
+_handler = _QueueHandler(_queue)
+_handler.addFilter(_ContextFilter())
+_listener = None
+_lock = threading.Lock()
+_settings = {
+    'log_dir': LOG_DIR,
+    'json_format': os.environ.get('SCRAPER_LOG_FORMAT', '').strip().lower() == 'json',
+}
+
+
+def get_handler() -> logging.Handler:
+    """共享的 QueueHandler (首次調用時啟動後台寫出線程)"""
+    with _lock:
+        if _listener is None:
+            _start()
+    return _handler
+
+
+def configure(json_format: Optional[bool] = None, log_dir: Optional[str] = None):
+    """修改輸出設置；寫出線程已啟動時以新設置重啟 (已掛 QueueHandler 的日誌器不受影響)"""
+    with _lock:
+        if json_format is not None:
+            _settings['json_format'] = json_format
+        if log_dir is not None:
+            _settings['log_dir'] = log_dir
+        if _listener is not None:
+            _stop()
+            _start()
+
+
+def shutdown():
+    """寫出隊列中剩餘的日誌並停止後台線程 (退出時自動調用)"""
+    with _lock:
+        _stop()
+    if _handler.dropped:
+        sys.stderr.write(f"日誌隊列已滿，丟棄 {_handler.dropped} 條日誌\n")
+        _handler.dropped = 0
+
+
+def _start():
+    global _listener
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    console.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+    log_file = RotatingLogFile(_settings['log_dir'], json_format=_settings['json_format'])
+    _listener = _QueueListener(_queue, log_file, console, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop():
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+atexit.register(shutdown)
+
+
+# ============== 輸出 ==============
+
+class JsonFormatter(logging.Formatter):
+    """JSON Lines: time / level / scraper / message + 上下文欄位"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'scraper': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RotatingLogFile(logging.Handler):
+    """
+    按天 + 大小輪轉的日誌文件 (在寫出線程上運行)
+    當天文件 YYYYMMDD_logs.log；輪轉出的文件壓縮為 YYYYMMDD_logs.N.log.gz (N 從 1 遞增)
+    """
+
+    def __init__(self, log_dir: str = LOG_DIR, max_bytes: int = MAX_BYTES,
+                 retention_days: int = RETENTION_DAYS, json_format: bool = False):
+        super().__init__(logging.DEBUG)
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.retention_days = retention_days
+        self.setFormatter(JsonFormatter() if json_format
+                          else logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+        self._day = None
+        self._stream = None
+        self._size = 0
+        os.makedirs(log_dir, exist_ok=True)
+        # 之前運行遺留的舊日誌
+        self._compress_old(datetime.now().strftime('%Y%m%d'))
+
+    def emit(self, record):
+        try:
+            line = self.format(record) + '\n'
+            day = datetime.fromtimestamp(record.created).strftime('%Y%m%d')
+            if self._stream is None or day != self._day:
+                self._switch_day(day)
+            elif self._size >= self.max_bytes:
+                self._close_stream()
+                self._compress(self._path(day), day)
+                self._open(day)
+            self._stream.write(line)
+            self._size += len(line.encode('utf-8'))
+            if self._is_idle():
+                self._stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self.acquire()
+        try:
+            self._close_stream()
+        finally:
+            self.release()
+        super().close()
+
+    def _is_idle(self) -> bool:
+        # 隊列中還有待寫的記錄時延後 flush，批量寫盤
+        return _queue.empty()
+
+    def _path(self, day: str) -> str:
+        return os.path.join(self.log_dir, f"{day}_logs.log")
+
+    def _open(self, day: str):
+        path = self._path(day)
+        self._stream = open(path, 'a', encoding='utf-8')
+        self._size = os.path.getsize(path)
+        self._day = day
+
+    def _close_stream(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def _switch_day(self, day: str):
+        self._close_stream()
+        self._compress_old(day)
+        self._open(day)
+
+    def _compress_old(self, today: str):
+        """壓縮今天以前的未壓縮日誌，並刪除過期的壓縮日誌"""
+        for path in glob.glob(os.path.join(self.log_dir, '*_logs.log')):
+            day = os.path.basename(path)[:8]
+            if day.isdigit() and day < today:
+                self._compress(path, day)
+        cutoff = (datetime.strptime(today, '%Y%m%d') - timedelta(days=self.retention_days)).strftime('%Y%m%d')
+        for path in glob.glob(os.path.join(self.log_dir, '*_logs.*.log.gz')):
+            day = os.path.basename(path)[:8]
+            if day.isdigit() and day < cutoff:
+                os.remove(path)
+
+    def _compress(self, path: str, day: str):
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        parts = glob.glob(os.path.join(self.log_dir, f"{day}_logs.*.log.gz"))
+        numbers = [int(n) for n in (os.path.basename(p).split('.')[1] for p in parts) if n.isdigit()]
+        target = os.path.join(self.log_dir, f"{day}_logs.{max(numbers, default=0) + 1}.log.gz")
+        with open(path, 'rb') as src, gzip.open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+
+
+# ============== 限速 ==============
+
+class Throttle:
+    """
+    逐項日誌限速: 每 interval 秒最多輸出一條，其間略過的條數附在下一條後
+    消息用 % 參數傳入，被略過時不做格式化
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float = THROTTLE_INTERVAL,
+                 level: int = logging.INFO):
+        self.logger = logger
+        self.interval = interval
+        self.level = level
+        self._next = 0.0
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, msg: str, *args, **kwargs):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next:
+                self._suppressed += 1
+                return
+            self._next = now + self.interval
+            suppressed, self._suppressed = self._suppressed, 0
+        if suppressed:
+            msg = f"{msg} (略過 {suppressed} 條)"
+        self.logger.log(self.level, msg, *args, **kwargs)
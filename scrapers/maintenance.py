@@ -0,0 +1,263 @@
+"""
+51.ca 爬蟲 - 資料庫維護
+定期運行 (可與爬蟲同時運行；每步只短暫持有寫鎖):
+
+    1. 清理 url_queue 中超過 N 天的已訪問 URL，只在 url_fingerprints 保留 64 位指紋，
+       frontier 入隊時按指紋跳過，清理後不會重新入隊 (sitemap / feed 的 lastmod 晚於訪問時間時除外)
+    2. scrape_logs 中超過 N 天的記錄追加到 data/log_archive/<資料庫>/scrape_logs-YYYYMMDD.jsonl.gz 後刪除
+    3. 增量 VACUUM 歸還空閒頁 (auto_vacuum=INCREMENTAL 的資料庫；舊資料庫需 --full-vacuum 轉換一次)
+    4. ANALYZE (有採樣上限) + PRAGMA optimize 更新查詢計劃統計
+    5. 報告各表 / 索引佔用空間
+
+開啟分庫時主庫和每個分庫各自維護。
+
+用法:
+    python -m scrapers.maintenance
+    python -m scrapers.maintenance --queue-days 14 --log-days 60
+    python -m scrapers.maintenance --full-vacuum     # 需獨佔資料庫，請在爬蟲停止時運行
+    python testing/run.py --maintain
+"""
+
+import os
+import gzip
+import json
+import time
+import sqlite3
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+try:
+    from .models import DB_PATH, url_fingerprint
+    from . import shards
+except ImportError:
+    from models import DB_PATH, url_fingerprint
+    import shards
+
+logger = logging.getLogger(__name__)
+
+# 已訪問 URL 保留天數
+QUEUE_RETENTION_DAYS = 30
+
+# scrape_logs 保留天數
+LOG_RETENTION_DAYS = 90
+
+LOG_ARCHIVE_DIR = os.path.join(os.path.dirname(__file__), "data", "log_archive")
+
+# 每批刪除的行數 (每批單獨提交，爬蟲的寫入可以穿插進行)
+BATCH_SIZE = 5000
+
+# 每次增量 VACUUM 歸還的頁數
+VACUUM_STEP_PAGES = 2000
+
+# ANALYZE 每個索引的採樣行數上限
+ANALYSIS_LIMIT = 1000
+
+# 等待爬蟲釋放寫鎖的秒數
+BUSY_TIMEOUT = 30
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _has_table(conn, table: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+
+# ============== 清理 ==============
+
+def prune_queue(conn, days: int = QUEUE_RETENTION_DAYS, batch_size: int = BATCH_SIZE) -> int:
+    """已訪問超過 days 天的 URL 轉為指紋，返回清理行數"""
+    if not _has_table(conn, 'url_queue') or not _has_table(conn, 'url_fingerprints'):
+        return 0
+    # visited_at 由 Python 寫入 (本地時間)
+    cutoff = str(datetime.now() - timedelta(days=days))
+    total = 0
+    while True:
+        rows = conn.execute("""
+            SELECT id, url, visited_at FROM url_queue
+            WHERE visited = 1 AND visited_at < ?
+            LIMIT ?
+        """, (cutoff, batch_size)).fetchall()
+        if not rows:
+            return total
+        # 保留訪問時間: 之後 sitemap / feed 的 lastmod 更新時仍可重新入隊
+        conn.executemany("INSERT OR REPLACE INTO url_fingerprints (fp, visited_at) VALUES (?, ?)",
+                         [(url_fingerprint(row['url']), row['visited_at']) for row in rows])
+        conn.executemany("DELETE FROM url_queue WHERE id = ?", [(row['id'],) for row in rows])
+        conn.commit()
+        total += len(rows)
+
+
+def archive_logs(conn, days: int = LOG_RETENTION_DAYS, archive_dir: str = LOG_ARCHIVE_DIR,
+                 batch_size: int = BATCH_SIZE) -> int:
+    """超過 days 天的 scrape_logs 寫入壓縮歸檔後刪除，返回歸檔行數"""
+    if not _has_table(conn, 'scrape_logs'):
+        return 0
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"scrape_logs-{datetime.now().strftime('%Y%m%d')}.jsonl.gz")
+    total = 0
+    while True:
+        # scraped_at 為 SQLite CURRENT_TIMESTAMP (UTC)
+        rows = conn.execute("""
+            SELECT * FROM scrape_logs
+            WHERE scraped_at < datetime('now', ?)
+            ORDER BY id LIMIT ?
+        """, (f'-{days} days', batch_size)).fetchall()
+        if not rows:
+            return total
+        # 先寫歸檔再刪除，中途失敗最多重複歸檔一批
+        with gzip.open(path, 'at', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(dict(row), ensure_ascii=False, default=str) + '\n')
+        conn.executemany("DELETE FROM scrape_logs WHERE id = ?", [(row['id'],) for row in rows])
+        conn.commit()
+        total += len(rows)
+
+
+# ============== 空間與統計 ==============
+
+def vacuum(conn, full: bool = False) -> int:
+    """
+    歸還空閒頁，返回歸還的頁數
+
+    full=True 時把資料庫轉為 auto_vacuum=INCREMENTAL 並整庫重建 (需獨佔)；
+    否則只在已是增量模式時分步執行 incremental_vacuum
+    """
+    conn.commit()
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if full:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return before
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        if before:
+            logger.info(f"資料庫不是增量 VACUUM 模式，{before} 個空閒頁需 --full-vacuum 歸還")
+        return 0
+    freed = 0
+    while True:
+        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if remaining == 0:
+            return freed
+        # 每步是一個短事務
+        conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+        conn.commit()
+        after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if after >= remaining:
+            return freed
+        freed += remaining - after
+
+
+def analyze(conn):
+    """更新查詢計劃統計 (ANALYZE 有採樣上限，不掃描整表)"""
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+
+
+def object_sizes(conn) -> List[Dict]:
+    """各表 / 索引的佔用字節數和行數 (按大小倒序)；SQLite 未編譯 dbstat 時只返回行數"""
+    objects = conn.execute("""
+        SELECT name, type, tbl_name FROM sqlite_master
+        WHERE type IN ('table', 'index') AND name NOT LIKE 'sqlite_%'
+    """).fetchall()
+    try:
+        sizes = {row['name']: row['size'] for row in conn.execute(
+            "SELECT name, SUM(pgsize) AS size FROM dbstat GROUP BY name"
+        )}
+    except sqlite3.OperationalError:
+        sizes = {}
+
+    result = []
+    for obj in objects:
+        entry = {'name': obj['name'], 'type': obj['type'], 'table': obj['tbl_name'],
+                 'bytes': sizes.get(obj['name'])}
+        if obj['type'] == 'table':
+            try:
+                entry['rows'] = conn.execute(f'SELECT COUNT(*) FROM "{obj["name"]}"').fetchone()[0]
+            except sqlite3.OperationalError:
+                entry['rows'] = None
+        result.append(entry)
+    result.sort(key=lambda e: e['bytes'] or 0, reverse=True)
+    return result
+
+
+# ============== 入口 ==============
+
+def maintain(db_path: str = None, queue_days: int = QUEUE_RETENTION_DAYS,
+             log_days: int = LOG_RETENTION_DAYS, full_vacuum: bool = False,
+             archive_dir: str = None) -> Dict:
+    """維護單個資料庫文件，返回報告"""
+    db_path = db_path or DB_PATH
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    archive_dir = archive_dir or os.path.join(LOG_ARCHIVE_DIR, name)
+    start = time.perf_counter()
+    conn = _connect(db_path)
+    try:
+        report = {
+            'database': db_path,
+            'queue_pruned': prune_queue(conn, queue_days),
+            'logs_archived': archive_logs(conn, log_days, archive_dir),
+        }
+        report['pages_freed'] = vacuum(conn, full=full_vacuum)
+        analyze(conn)
+        report['objects'] = object_sizes(conn)
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        report['file_bytes'] = conn.execute("PRAGMA page_count").fetchone()[0] * page_size
+    finally:
+        conn.close()
+    report['elapsed'] = round(time.perf_counter() - start, 2)
+    return report
+
+
+def maintain_all(**kwargs) -> List[Dict]:
+    """維護主庫和全部分庫"""
+    paths = [DB_PATH] if os.path.exists(DB_PATH) else []
+    paths += list(shards.shard_files().values())
+    return [maintain(path, **kwargs) for path in paths]
+
+
+def _format_bytes(size: Optional[int]) -> str:
+    if size is None:
+        return '-'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def print_report(report: Dict, top: int = 15):
+    print(f"\n{report['database']} ({_format_bytes(report['file_bytes'])}, {report['elapsed']}s)")
+    print(f"  清理已訪問 URL: {report['queue_pruned']}，歸檔日誌: {report['logs_archived']}，"
+          f"歸還空閒頁: {report['pages_freed']}")
+    for obj in report['objects'][:top]:
+        rows = f"{obj['rows']} 行" if obj.get('rows') is not None else ''
+        label = obj['name'] if obj['type'] == 'table' else f"  {obj['name']} (索引)"
+        print(f"  {label:<40} {_format_bytes(obj['bytes']):>10}  {rows}")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='資料庫維護: 清理 / 歸檔 / VACUUM / ANALYZE / 空間報告')
+    parser.add_argument('--queue-days', type=int, default=QUEUE_RETENTION_DAYS,
+                        help=f'已訪問 URL 保留天數 (默認: {QUEUE_RETENTION_DAYS})')
+    parser.add_argument('--log-days', type=int, default=LOG_RETENTION_DAYS,
+                        help=f'scrape_logs 保留天數 (默認: {LOG_RETENTION_DAYS})')
+    parser.add_argument('--full-vacuum', action='store_true',
+                        help='轉為增量 VACUUM 模式並整庫重建 (需停止爬蟲)')
+    parser.add_argument('--top', type=int, default=15, help='報告列出的最大表 / 索引數')
+    args = parser.parse_args()
+
+    for report in maintain_all(queue_days=args.queue_days, log_days=args.log_days,
+                               full_vacuum=args.full_vacuum):
+        print_report(report, top=args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,11 +15,11 @@ import time
 from typing import List, Dict, Optional
 from datetime import datetime
 
-import requests
-from bs4 import BeautifulSoup
-
 from .base import BaseScraper
-from .models import get_connection
+from .models import init_database
+from .schema import MARKET_POSTS
+from . import checkpoints
+from .detail_planner import DetailPlanner
 
 
 class MarketScraper(BaseScraper):
@@ -28,6 +28,14 @@ class MarketScraper(BaseScraper):
     SCRAPER_NAME = "market"
     BASE_URL = "https://www.51.ca/market"
     URL_TYPE = "market"
+    SCHEMA = MARKET_POSTS
+    
+    # 列表可見的欄位 (變化時重抓詳情) 和只由詳情接口提供的欄位
+    LIST_FIELDS = ('title', 'format_price', 'price', 'original_price', 'negotiable', 'condition',
+                   'published_at')
+    DETAIL_FIELDS = ('description', 'contact_phone', 'email', 'wechat_no', 'wechat_qrcode', 'photos',
+                     'location_id', 'location_zh', 'location_en', 'category_id', 'category_name',
+                     'pickup_methods', 'user_uid', 'user_name', 'user_avatar')
     
     # 集市分類
     CATEGORIES = [
@@ -53,11 +61,8 @@ class MarketScraper(BaseScraper):
     def __init__(self):
         super().__init__()
         self._build_id = None
-        self._session = requests.Session()
-        self._session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'application/json, text/html',
-        })
+        # 使用共享 HTTP 客戶端 (連接池 keep-alive)
+        self._session = self.session
     
     def _get_build_id(self) -> Optional[str]:
         """獲取 Next.js buildId"""
@@ -66,7 +71,8 @@ class MarketScraper(BaseScraper):
         
         try:
             r = self._session.get(f"{self.BASE_URL}/", timeout=15)
-            soup = BeautifulSoup(r.text, 'lxml')
+            self.archive_response(r)
+            soup = self.make_soup(r.text)
             next_data = soup.find('script', id='__NEXT_DATA__')
             if next_data:
                 data = json.loads(next_data.string)
@@ -81,18 +87,24 @@ class MarketScraper(BaseScraper):
         """通過 HTML 頁面獲取數據（用於分頁）"""
         try:
             r = self._session.get(url, timeout=15)
+            self.archive_response(r)
             if r.status_code != 200:
                 return None
             
-            soup = BeautifulSoup(r.text, 'lxml')
-            next_data = soup.find('script', id='__NEXT_DATA__')
-            if next_data:
-                data = json.loads(next_data.string)
-                return data.get('props', {}).get('pageProps', {})
+            return self._extract_page_props(r.text)
         except Exception as e:
             self.logger.error(f"獲取頁面失敗: {url} - {e}")
         return None
     
+    def _extract_page_props(self, html: str) -> Optional[Dict]:
+        """從 __NEXT_DATA__ 提取 pageProps"""
+        soup = self.make_soup(html)
+        next_data = soup.find('script', id='__NEXT_DATA__')
+        if next_data:
+            data = json.loads(next_data.string)
+            return data.get('props', {}).get('pageProps', {})
+        return None
+    
     def _fetch_detail_api(self, category: str, item_id: int) -> Optional[Dict]:
         """通過 API 獲取商品詳情"""
         build_id = self._get_build_id()
@@ -102,6 +114,7 @@ class MarketScraper(BaseScraper):
         url = f"{self.BASE_URL}/_next/data/{build_id}/{category}/{item_id}.json"
         try:
             r = self._session.get(url, timeout=10)
+            self.archive_response(r)
             if r.status_code == 200 and 'json' in r.headers.get('Content-Type', ''):
                 data = r.json()
                 return data.get('pageProps', {}).get('data', {})
@@ -110,23 +123,38 @@ class MarketScraper(BaseScraper):
         return None
 
     
-    def run(self, categories: List[str] = None, max_pages: int = 5, fetch_details: bool = False):
+    def _detail_planner(self) -> DetailPlanner:
+        return DetailPlanner(self.SCHEMA, self.LIST_FIELDS, self.DETAIL_FIELDS,
+                             required_fields=('description',), to_traditional=self.to_traditional)
+    
+    def run(self, categories: List[str] = None, max_pages: int = 5, fetch_details: bool = False,
+            resume: bool = False):
         """
         運行爬蟲
         
         Args:
             categories: 要爬取的分類列表，None 則爬取全部
-            max_pages: 每個分類最大頁數
+            max_pages: 每個分類最大頁數 (續爬時仍以此為最後一頁)
             fetch_details: 是否獲取詳情頁（包含聯繫方式）
+            resume: 從上次中斷的斷點繼續，已完成的分類跳過 (見 checkpoints.py)
         """
         categories = categories or ['all']  # 默認只爬 all
         total_saved = 0
         total_errors = 0
         
+        init_database()
+        if not resume:
+            checkpoints.reset(self.SCRAPER_NAME)
+        
         for category in categories:
-            self.logger.info(f"開始爬取分類: {category}")
+            start_page = checkpoints.resume_page(self.SCRAPER_NAME, resume, category=category)
+            if start_page is None:
+                self.logger.info(f"分類 {category} 上次已完成，跳過")
+                continue
+            self.logger.info(f"開始爬取分類: {category}" + (f" (從第 {start_page} 頁繼續)" if start_page > 1 else ""))
             
-            for page in range(1, max_pages + 1):
+            finished = True
+            for page in range(start_page, max_pages + 1):
                 if category == 'all':
                     url = f"{self.BASE_URL}/all?page={page}"
                 else:
@@ -137,6 +165,7 @@ class MarketScraper(BaseScraper):
                 page_data = self._fetch_page_html(url)
                 if not page_data:
                     self.logger.warning(f"無法獲取頁面數據: {url}")
+                    finished = False
                     break
                 
                 init_data = page_data.get('initData', {})
@@ -151,25 +180,44 @@ class MarketScraper(BaseScraper):
                 if not market_products:
                     break
                 
+                # 列表已有的商品只在列表欄位變化或缺詳情時請求詳情 (見 detail_planner.py)
+                page_items = []
                 for product in market_products:
                     try:
-                        # 如果需要詳情，獲取完整信息
-                        if fetch_details:
-                            cat_slug = product.get('categorySlug', category)
-                            detail = self._fetch_detail_api(cat_slug, product['id'])
-                            if detail:
-                                product = detail
-                            time.sleep(0.3)  # 避免請求過快
-                        
                         item_data = self._parse_product_json(product)
-                        if item_data and self.save_item(item_data):
-                            total_saved += 1
+                        if item_data:
+                            page_items.append((product, item_data))
                         else:
                             total_errors += 1
                     except Exception as e:
                         self.logger.error(f"處理商品失敗: {e}")
                         total_errors += 1
                 
+                if fetch_details:
+                    planner = self._detail_planner()
+                    reasons = planner.plan([item for _, item in page_items])
+                    for index, ((product, item_data), reason) in enumerate(zip(page_items, reasons)):
+                        if not reason:
+                            continue
+                        try:
+                            cat_slug = product.get('categorySlug', category)
+                            detail = self._parse_product_json(self._fetch_detail_api(cat_slug, product['id']))
+                            if detail:
+                                planner.mark_fetched(detail)
+                                page_items[index] = (product, detail)
+                        except Exception as e:
+                            self.logger.error(f"處理商品失敗: {e}")
+                        time.sleep(0.3)  # 避免請求過快
+                    self.logger.info(f"頁 {page}: {planner.summary()}")
+                page_items = [item for _, item in page_items]
+                
+                # 整頁一次寫入 (斷點游標記為本頁最後一個商品)
+                page_saved = self.save_items(page_items, checkpoint={
+                    'category': category, 'page': page, 'cursor': market_products[-1].get('id'),
+                })
+                total_saved += page_saved
+                total_errors += len(page_items) - page_saved
+                
                 # 檢查是否還有更多頁面
                 current_page = pagination.get('page', page)
                 last_page = pagination.get('lastPage', 1)
@@ -179,7 +227,12 @@ class MarketScraper(BaseScraper):
                     break
                 
                 time.sleep(0.5)  # 頁面間延遲
+            
+            if finished:
+                checkpoints.finish(self.SCRAPER_NAME, category=category)
         
+        if not checkpoints.clear_if_finished(self.SCRAPER_NAME):
+            self.logger.info("有未完成的分類，斷點已保留，可用 --resume 繼續")
         self.logger.info(f"爬取完成: 保存 {total_saved}, 錯誤 {total_errors}")
         return total_saved, total_errors
     
@@ -199,7 +252,7 @@ class MarketScraper(BaseScraper):
     
     def parse_detail_page(self, html: str, url: str) -> Optional[Dict]:
         """兼容舊接口 - 解析詳情頁"""
-        soup = BeautifulSoup(html, "lxml")
+        soup = self.make_soup(html)
         next_data = soup.find('script', id='__NEXT_DATA__')
         if not next_data:
             return None
@@ -212,6 +265,33 @@ class MarketScraper(BaseScraper):
             self.logger.error(f"解析詳情頁失敗: {e}")
         return None
     
+    def parse_archived(self, record) -> List[Dict]:
+        """
+        從存檔響應重新解析
+        列表頁取 __NEXT_DATA__ 中的商品，/_next/data/ 詳情 JSON 直接解析
+        """
+        if record.status != 200:
+            return []
+        if '/_next/data/' in record.url:
+            product = record.json().get('pageProps', {}).get('data', {})
+            item = self._parse_product_json(product)
+            return [item] if item else []
+        
+        page_props = self._extract_page_props(record.text)
+        if not page_props:
+            return []
+        if not self.is_list_page(record.url):
+            item = self._parse_product_json(page_props.get('data', {}))
+            return [item] if item else []
+        items = []
+        for product in page_props.get('initData', {}).get('data', []):
+            if product.get('source') != 'market':
+                continue
+            item = self._parse_product_json(product)
+            if item:
+                items.append(item)
+        return items
+    
     def _parse_product_json(self, product: Dict) -> Optional[Dict]:
         """
         從 JSON 解析商品
@@ -314,65 +394,6 @@ class MarketScraper(BaseScraper):
             5: '較舊',
         }
         return conditions.get(condition, '')
-    
-    def save_item(self, data: Dict) -> bool:
-        """保存商品到資料庫"""
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            # 轉換為繁體中文
-            title = self.to_traditional(data.get('title', ''))
-            description = self.to_traditional(data.get('description', ''))
-            category_name = self.to_traditional(data.get('category_name', ''))
-            user_name = self.to_traditional(data.get('user_name', ''))
-            location_zh = self.to_traditional(data.get('location_zh', ''))
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO market_posts (
-                    post_id, url, title, description, format_price, price,
-                    original_price, negotiable, condition, category_id, category_slug, category_name,
-                    location_id, location_zh, location_en, pickup_methods,
-                    contact_phone, email, wechat_no, wechat_qrcode, photos,
-                    user_uid, user_name, user_avatar, favorite_count, published_at, source
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                data['post_id'],
-                data['url'],
-                title,
-                description,
-                data.get('format_price', ''),
-                data.get('price', 0),
-                data.get('original_price'),
-                1 if data.get('negotiable') else 0,
-                data.get('condition', 0),
-                data.get('category_id'),
-                data.get('category_slug', ''),
-                category_name,
-                data.get('location_id'),
-                location_zh,
-                data.get('location_en', ''),
-                data.get('pickup_methods'),
-                data.get('contact_phone', ''),
-                data.get('email', ''),
-                data.get('wechat_no', ''),
-                data.get('wechat_qrcode', ''),
-                data.get('photos'),
-                data.get('user_uid'),
-                user_name,
-                data.get('user_avatar', ''),
-                data.get('favorite_count', 0),
-                data.get('published_at', ''),
-                data.get('source', 'market'),
-            ))
-            
-            conn.commit()
-            conn.close()
-            self.logger.debug(f"保存商品: {title[:30]}...")
-            return True
-        except Exception as e:
-            self.logger.error(f"保存商品失敗: {e}")
-            return False
 
 
 if __name__ == "__main__":
@@ -386,6 +407,8 @@ if __name__ == "__main__":
                         help='獲取詳情頁（包含聯繫方式）')
     parser.add_argument('--all-categories', '-a', action='store_true',
                         help='爬取所有分類（而非只爬 all）')
+    parser.add_argument('--resume', action='store_true',
+                        help='從上次中斷的頁繼續，已完成的分類跳過')
     args = parser.parse_args()
     
     scraper = MarketScraper()
@@ -398,4 +421,5 @@ if __name__ == "__main__":
     else:
         categories = ['all']
     
-    scraper.run(categories=categories, max_pages=args.pages, fetch_details=args.details)
+    scraper.run(categories=categories, max_pages=args.pages, fetch_details=args.details,
+                resume=args.resume)
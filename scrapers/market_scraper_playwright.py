@@ -2,19 +2,35 @@
 51.ca 集市爬蟲 (Playwright 無限滾動版)
 使用 Playwright 模擬瀏覽器滾動，攔截網絡請求獲取更多數據
 
+攔截到的商品進入有界隊列，由寫入線程解析並分批保存: 內存不隨抓取量增長，中途崩潰時已寫入的不會丟失。
+--skip-known 從 market_posts 預熱去重集合，跳過已保存的商品 (中斷後續跑)。
+
+重放模式 (--replay): 瀏覽器只用來捕獲一次 /web/api/products 請求和 Cookie，
+之後直接用 HTTP 翻頁 (見 api_replay)，不再滾動等待。
+
 用法:
     python -m scrapers.market_scraper_playwright --category all --max-items 500
+    python -m scrapers.market_scraper_playwright --category all --max-items 5000 --replay
+    python -m scrapers.market_scraper_playwright --category all --max-items 5000 --skip-known
 """
 
 import json
 import time
 import re
-from typing import List, Dict, Optional
+import queue
+import logging
+import sqlite3
+import threading
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 from playwright.sync_api import sync_playwright, Page, Browser, Route
 
 from .base import BaseScraper
+from .schema import MARKET_POSTS
 from .models import get_connection
+from . import archive
+from . import log_pipeline
+from .api_replay import CapturedRequest, PagedApi, api_items, cookie_header
 
 
 class MarketScraperPlaywright(BaseScraper):
@@ -22,6 +38,19 @@ class MarketScraperPlaywright(BaseScraper):
     
     SCRAPER_NAME = "market_playwright"
     BASE_URL = "https://www.51.ca/market"
+    SCHEMA = MARKET_POSTS
+    
+    # 無限滾動 API
+    PRODUCTS_API = '/web/api/products'
+    
+    # 流式寫入: 隊列上限 (滿時攔截回調阻塞，形成背壓) / 每批寫入條數 /
+    # 隊列空閒超過此秒數時寫出不足一批的項目
+    WRITE_QUEUE_SIZE = 1000
+    WRITE_BATCH_SIZE = 200
+    WRITE_FLUSH_INTERVAL = 2.0
+    
+    # 重放模式: 連續多少頁沒有新商品時停止
+    REPLAY_MAX_STALE_PAGES = 3
     
     # 集市分類
     CATEGORIES = [
@@ -37,9 +66,16 @@ class MarketScraperPlaywright(BaseScraper):
         self._browser: Optional[Browser] = None
         self._page: Optional[Page] = None
         self._playwright = None
-        self._collected_ids = set()
-        self._all_items = []
+        self._collected_ids = set()     # 本次運行見到的商品 ID
+        self._known_ids = set()         # 資料庫中已有的商品 ID (skip_known 時預熱)
+        self._max_items = None
+        self._detail_targets = None     # 需要獲取詳情的 (分類, ID)，不獲取詳情時為 None
         self._build_id = None
+        
+        self._write_queue = None
+        self._write_thread = None
+        self._write_stats = {'saved': 0, 'errors': 0}
+        self._intercept_log = log_pipeline.Throttle(self.logger, level=logging.DEBUG)
     
     # 實現抽象方法（Playwright 版不使用這些）
     def get_start_urls(self) -> List[str]:
@@ -69,24 +105,19 @@ class MarketScraperPlaywright(BaseScraper):
         url = response.url
         
         # 捕獲 web/api/products POST 響應（無限滾動 API）
-        if '/web/api/products' in url:
+        if self.PRODUCTS_API in url:
             try:
+                if archive.is_enabled():
+                    archive.record(self.SCRAPER_NAME, None, body=response.body(), url=url,
+                                   status=response.status, headers=response.headers)
                 if response.status == 200:
                     data = response.json()
                     items = data.get('data', [])
                     
                     if items:
-                        new_count = 0
-                        for item in items:
-                            if item.get('source') == 'market':
-                                item_id = item.get('id')
-                                if item_id and item_id not in self._collected_ids:
-                                    self._collected_ids.add(item_id)
-                                    self._all_items.append(item)
-                                    new_count += 1
-                        
+                        new_count = sum(self._enqueue(item) for item in items)
                         if new_count > 0:
-                            self.logger.debug(f"攔截到 {new_count} 個新商品 (總計: {len(self._all_items)})")
+                            self._intercept_log("攔截到 %d 個新商品 (總計: %d)", new_count, len(self._collected_ids))
             except Exception as e:
                 self.logger.error(f"解析 API 響應失敗: {e}")
     
@@ -103,6 +134,10 @@ class MarketScraperPlaywright(BaseScraper):
                 self._playwright.stop()
         except Exception as e:
             self.logger.debug(f"停止 Playwright 時發生錯誤 (可忽略): {e}")
+        
+        self._browser = None
+        self._page = None
+        self._playwright = None
     
     def _extract_items_from_page(self) -> List[Dict]:
         """從當前頁面提取 __NEXT_DATA__ 中的商品數據"""
@@ -127,23 +162,19 @@ class MarketScraperPlaywright(BaseScraper):
             self.logger.error(f"提取數據失敗: {e}")
             return []
     
-    def _scroll_and_collect(self, max_items: int = 500, scroll_pause: float = 2.0) -> List[Dict]:
-        """滾動頁面並收集數據"""
+    def _scroll_and_collect(self, max_items: int = 500, scroll_pause: float = 2.0) -> int:
+        """滾動頁面收集數據 (攔截到的商品直接進入寫入隊列)，返回收集數量"""
         # 先從初始頁面提取數據
-        initial_items = self._extract_items_from_page()
-        for item in initial_items:
-            item_id = item.get('id')
-            if item_id and item_id not in self._collected_ids:
-                self._collected_ids.add(item_id)
-                self._all_items.append(item)
+        for item in self._extract_items_from_page():
+            self._enqueue(item)
         
-        self.logger.info(f"初始頁面: {len(self._all_items)} 個商品")
+        self.logger.info(f"初始頁面: {len(self._collected_ids)} 個商品")
         
-        last_count = len(self._all_items)
+        last_count = len(self._collected_ids)
         no_new_items_count = 0
         scroll_count = 0
         
-        while len(self._all_items) < max_items:
+        while len(self._collected_ids) < max_items:
             scroll_count += 1
             
             # 滾動到底部
@@ -156,24 +187,24 @@ class MarketScraperPlaywright(BaseScraper):
             except:
                 pass
             
-            self.logger.info(f"滾動 #{scroll_count}: 已收集 {len(self._all_items)} 項")
+            self.logger.info(f"滾動 #{scroll_count}: 已收集 {len(self._collected_ids)} 項")
             
             # 檢查是否有新數據
-            if len(self._all_items) == last_count:
+            if len(self._collected_ids) == last_count:
                 no_new_items_count += 1
                 if no_new_items_count >= 5:
                     self.logger.info("連續5次沒有新數據，停止滾動")
                     break
             else:
                 no_new_items_count = 0
-                last_count = len(self._all_items)
+                last_count = len(self._collected_ids)
             
             # 額外安全檢查 - 最多滾動200次 (約 200*24 = 4800 個商品)
             if scroll_count >= 200:
                 self.logger.info("達到最大滾動次數")
                 break
         
-        return self._all_items
+        return len(self._collected_ids)
     
     def _fetch_detail(self, category_slug: str, item_id: int) -> Optional[Dict]:
         """獲取商品詳情（包含解密電話）"""
@@ -247,8 +278,161 @@ class MarketScraperPlaywright(BaseScraper):
             self.logger.debug(f"獲取解密電話失敗 {item_id}: {e}")
         return None
     
+    # ============== 重放模式 ==============
+    
+    def _capture_products_request(self, timeout: float = 30) -> Optional[CapturedRequest]:
+        """滾動直到頁面發出第一個 products API 請求，返回其請求形狀"""
+        captured = []
+        
+        def on_request(request):
+            if not captured and self.PRODUCTS_API in request.url:
+                captured.append(CapturedRequest.from_playwright(request))
+        
+        self._page.on("request", on_request)
+        deadline = time.monotonic() + timeout
+        while not captured and time.monotonic() < deadline:
+            self._page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
+            self._page.wait_for_timeout(500)
+        self._page.remove_listener("request", on_request)
+        return captured[0] if captured else None
+    
+    def _bootstrap_replay(self, category: str, headless: bool):
+        """用瀏覽器打開列表頁: 返回 (首屏商品, 捕獲的請求, Cookie 請求頭)"""
+        try:
+            self._init_browser(headless=headless)
+            url = f"{self.BASE_URL}/{category}"
+            self.logger.info(f"引導瀏覽器: {url}")
+            self._page.goto(url, wait_until='domcontentloaded')
+            initial_items = self._extract_items_from_page()
+            captured = self._capture_products_request()
+            cookies = cookie_header(self._page.context.cookies())
+            return initial_items, captured, cookies
+        finally:
+            self._close_browser()
+    
+    def _run_replay(self, category: str, headless: bool):
+        """重放模式: 直接翻頁 products API，商品進入寫入隊列"""
+        initial_items, captured, cookies = self._bootstrap_replay(category, headless)
+        if captured is None:
+            self.logger.error(f"未捕獲到 {self.PRODUCTS_API} 請求，無法重放")
+            return
+        
+        api = PagedApi(captured, self.session, cookies=cookies, on_response=self.archive_response)
+        self.logger.info(f"捕獲 API: {captured.method} {captured.url} "
+                         f"(分頁參數 {api.where}.{api.key}, {api.kind})")
+        
+        for item in initial_items:
+            self._enqueue(item)
+        stale_pages = 0
+        for page_count, payload in enumerate(api.pages(), 1):
+            new_count = sum(self._enqueue(item) for item in api_items(payload))
+            self.logger.info(f"API 第 {page_count} 頁: 新商品 {new_count}, 已收集 {len(self._collected_ids)}")
+            if len(self._collected_ids) >= self._max_items:
+                break
+            stale_pages = stale_pages + 1 if new_count == 0 else 0
+            if stale_pages >= self.REPLAY_MAX_STALE_PAGES:
+                self.logger.info(f"連續 {stale_pages} 頁沒有新商品，停止")
+                break
+    
+    # ============== 流式寫入 ==============
+    
+    def _warm_known_ids(self):
+        """從 market_posts 預熱去重集合 (只保存 ID)"""
+        conn = get_connection()
+        try:
+            self._known_ids = {row[0] for row in conn.execute("SELECT post_id FROM market_posts")}
+        except sqlite3.OperationalError as e:
+            self.logger.warning(f"讀取已有商品失敗: {e}")
+            self._known_ids = set()
+        finally:
+            conn.close()
+        self.logger.info(f"資料庫已有 {len(self._known_ids)} 個商品，將跳過")
+    
+    def _enqueue(self, product: Dict, force: bool = False) -> bool:
+        """
+        商品放入寫入隊列，返回是否為本次運行新見到的商品
+        force=True 時跳過去重 (詳情覆蓋列表數據)
+        """
+        if not force:
+            if product.get('source') != 'market':
+                return False
+            item_id = product.get('id')
+            if not item_id or item_id in self._collected_ids:
+                return False
+            if self._max_items is not None and len(self._collected_ids) >= self._max_items:
+                return False
+            self._collected_ids.add(item_id)
+            if str(item_id) in self._known_ids:
+                return True
+            if self._detail_targets is not None:
+                self._detail_targets.append((product.get('categorySlug'), item_id))
+        self._write_queue.put(product)
+        return True
+    
+    def _start_writer(self):
+        self._write_queue = queue.Queue(maxsize=self.WRITE_QUEUE_SIZE)
+        self._write_stats = {'saved': 0, 'errors': 0}
+        self._write_thread = threading.Thread(
+            target=self._writer_loop, name=f"{self.SCRAPER_NAME}-writer", daemon=True
+        )
+        self._write_thread.start()
+    
+    def _stop_writer(self) -> Tuple[int, int]:
+        """寫出隊列中剩餘的項目並結束寫入線程，返回 (保存數, 錯誤數)"""
+        if self._write_thread is not None:
+            self._write_queue.put(None)
+            self._write_thread.join()
+            self._write_thread = None
+        return self._write_stats['saved'], self._write_stats['errors']
+    
+    def _writer_loop(self):
+        """寫入線程: 解析隊列中的商品，滿一批或空閒時保存"""
+        batch = []
+        while True:
+            try:
+                product = self._write_queue.get(timeout=self.WRITE_FLUSH_INTERVAL)
+            except queue.Empty:
+                self._flush_batch(batch)
+                continue
+            if product is None:
+                break
+            try:
+                item_data = self._parse_product_json(product)
+            except Exception as e:
+                self.logger.error(f"處理商品失敗: {e}")
+                item_data = None
+            if item_data:
+                batch.append(item_data)
+            else:
+                self._write_stats['errors'] += 1
+            if len(batch) >= self.WRITE_BATCH_SIZE:
+                self._flush_batch(batch)
+        self._flush_batch(batch)
+    
+    def _flush_batch(self, batch: List[Dict]):
+        if not batch:
+            return
+        try:
+            saved = self.save_items(batch)
+        except Exception as e:
+            self.logger.error(f"批量保存失敗: {e}")
+            saved = 0
+        self._write_stats['saved'] += saved
+        self._write_stats['errors'] += len(batch) - saved
+        self.logger.info(f"寫入 {saved}/{len(batch)} 個商品 (累計 {self._write_stats['saved']})")
+        batch.clear()
+    
+    def _fetch_details(self, category: str):
+        """滾動結束後逐個獲取詳情 (需要瀏覽器，在主線程執行)，詳情覆蓋已寫入的列表數據"""
+        for cat_slug, item_id in self._detail_targets:
+            detail = self._fetch_detail(cat_slug or category, item_id)
+            if detail:
+                self._enqueue(detail, force=True)
+            time.sleep(0.3)
+    
     def run(self, category: str = 'all', max_items: int = 500, 
-            fetch_details: bool = False, headless: bool = True):
+            fetch_details: bool = False, headless: bool = True, replay: bool = False,
+            skip_known: bool = False):
         """
         運行爬蟲
         
@@ -257,53 +441,47 @@ class MarketScraperPlaywright(BaseScraper):
             max_items: 最大抓取數量
             fetch_details: 是否獲取詳情
             headless: 是否無頭模式
+            replay: 重放模式 (直接翻頁 API，不滾動；不支持 fetch_details)
+            skip_known: 跳過資料庫中已有的商品 (中斷後續跑)
         """
         self.logger.info(f"開始爬取分類: {category}, 最大數量: {max_items}")
         
+        if replay and fetch_details:
+            self.logger.warning("重放模式不獲取詳情，忽略 --details")
+            fetch_details = False
+        
+        self._max_items = max_items
+        self._detail_targets = [] if fetch_details else None
+        if skip_known:
+            self._warm_known_ids()
+        
+        self._start_writer()
         try:
-            self._init_browser(headless=headless)
-            
-            # 訪問列表頁
-            url = f"{self.BASE_URL}/{category}"
-            self.logger.info(f"訪問頁面: {url}")
-            self._page.goto(url, wait_until='networkidle')
-            
-            # 等待頁面加載
-            time.sleep(2)
-            
-            # 滾動並收集數據
-            items = self._scroll_and_collect(max_items=max_items)
-            
-            self.logger.info(f"共收集 {len(items)} 個商品")
-            
-            # 保存數據
-            saved = 0
-            errors = 0
-            
-            for item in items:
-                try:
-                    # 如果需要詳情
-                    if fetch_details:
-                        cat_slug = item.get('categorySlug', category)
-                        detail = self._fetch_detail(cat_slug, item['id'])
-                        if detail:
-                            item = detail
-                        time.sleep(0.3)
-                    
-                    item_data = self._parse_product_json(item)
-                    if item_data and self.save_item(item_data):
-                        saved += 1
-                    else:
-                        errors += 1
-                except Exception as e:
-                    self.logger.error(f"處理商品失敗: {e}")
-                    errors += 1
-            
-            self.logger.info(f"爬取完成: 保存 {saved}, 錯誤 {errors}")
-            return saved, errors
-            
+            if replay:
+                self._run_replay(category, headless)
+            else:
+                self._init_browser(headless=headless)
+                
+                # 訪問列表頁
+                url = f"{self.BASE_URL}/{category}"
+                self.logger.info(f"訪問頁面: {url}")
+                self._page.goto(url, wait_until='networkidle')
+                
+                # 等待頁面加載
+                time.sleep(2)
+                
+                # 滾動並收集數據 (邊收集邊寫入)
+                collected = self._scroll_and_collect(max_items=max_items)
+                self.logger.info(f"共收集 {collected} 個商品")
+                
+                if fetch_details:
+                    self._fetch_details(category)
         finally:
             self._close_browser()
+            saved, errors = self._stop_writer()
+            self.logger.info(f"爬取完成: 保存 {saved}, 錯誤 {errors}")
+        
+        return saved, errors
     
     def _parse_product_json(self, product: Dict) -> Optional[Dict]:
         """從 JSON 解析商品"""
@@ -391,65 +569,6 @@ class MarketScraperPlaywright(BaseScraper):
             'published_at': product.get('publishedAt', ''),
             'source': product.get('source', 'market'),
         }
-    
-    def save_item(self, data: Dict) -> bool:
-        """保存商品到資料庫"""
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            # 轉換為繁體中文
-            title = self.to_traditional(data.get('title', ''))
-            description = self.to_traditional(data.get('description', ''))
-            category_name = self.to_traditional(data.get('category_name', ''))
-            user_name = self.to_traditional(data.get('user_name', ''))
-            location_zh = self.to_traditional(data.get('location_zh', ''))
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO market_posts (
-                    post_id, url, title, description, format_price, price, 
-                    original_price, negotiable, condition, category_id, 
-                    category_slug, category_name, location_id, location_zh, 
-                    location_en, pickup_methods, contact_phone, email, 
-                    wechat_no, wechat_qrcode, photos, user_uid, user_name, 
-                    user_avatar, favorite_count, published_at, source
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                data.get('post_id'),
-                data.get('url', ''),
-                title,
-                description,
-                data.get('format_price', ''),
-                data.get('price', 0),
-                data.get('original_price'),
-                data.get('negotiable', False),
-                data.get('condition', 0),
-                data.get('category_id'),
-                data.get('category_slug', ''),
-                category_name,
-                data.get('location_id'),
-                location_zh,
-                data.get('location_en', ''),
-                data.get('pickup_methods'),
-                data.get('contact_phone', ''),
-                data.get('email', ''),
-                data.get('wechat_no', ''),
-                data.get('wechat_qrcode', ''),
-                data.get('photos'),
-                data.get('user_uid'),
-                user_name,
-                data.get('user_avatar', ''),
-                data.get('favorite_count', 0),
-                data.get('published_at', ''),
-                data.get('source', 'market'),
-            ))
-            
-            conn.commit()
-            conn.close()
-            return True
-        except Exception as e:
-            self.logger.error(f"保存商品失敗: {e}")
-            return False
 
 
 if __name__ == "__main__":
@@ -463,6 +582,10 @@ if __name__ == "__main__":
                         help='獲取詳情頁（包含聯繫方式）')
     parser.add_argument('--show-browser', action='store_true',
                         help='顯示瀏覽器窗口（調試用）')
+    parser.add_argument('--replay', action='store_true',
+                        help='重放模式: 瀏覽器只捕獲一次 API 請求，之後直接 HTTP 翻頁')
+    parser.add_argument('--skip-known', action='store_true',
+                        help='跳過資料庫中已有的商品（中斷後續跑）')
     args = parser.parse_args()
     
     scraper = MarketScraperPlaywright()
@@ -470,5 +593,7 @@ if __name__ == "__main__":
         category=args.category, 
         max_items=args.max_items, 
         fetch_details=args.details,
-        headless=not args.show_browser
+        headless=not args.show_browser,
+        replay=args.replay,
+        skip_known=args.skip_known,
     )
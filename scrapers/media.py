@@ -0,0 +1,318 @@
+"""
+51.ca 爬蟲 - 圖片下載 (內容尋址存儲)
+從各資料表的圖片 URL 欄位收集圖片並並發下載:
+- 按 SHA-256 內容哈希存儲，相同圖片只存一份 (重新上架 / API 與 HTML 模式重複的圖片)
+- media_files 表記錄 URL -> 哈希，已下載的 URL 不再請求，中斷後可續跑
+- 全局線程數 + 每個 host 並發上限，避免壓垮圖片 CDN
+
+用法:
+    python -m scrapers.media                          # 下載所有表引用的圖片
+    python -m scrapers.media --tables house auto --workers 16 --per-host 4
+    python -m scrapers.media --retry-failed           # 重試之前失敗的 URL
+
+    path = media.get_local_path(url)                  # 已下載時返回本地路徑
+"""
+
+import os
+import hashlib
+import logging
+import mimetypes
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlparse
+
+try:
+    from .models import get_connection, init_database, from_json
+    from .http_client import get_session
+except ImportError:
+    from models import get_connection, init_database, from_json
+    from http_client import get_session
+
+MEDIA_DIR = os.path.join(os.path.dirname(__file__), "data", "media")
+
+# 圖片來源: 簡稱 -> (資料表, 欄位, 是否為 JSON 列表)
+IMAGE_SOURCES = {
+    'news': [('news_articles', 'image_urls', True)],
+    'house': [('house_listings', 'image_urls', True)],
+    'auto': [('auto_listings', 'images', True)],
+    'market': [('market_posts', 'photos', True)],
+    'event': [('events', 'content_images', True), ('events', 'image_url', False)],
+}
+
+DEFAULT_WORKERS = 8
+DEFAULT_PER_HOST = 4
+
+# 失敗多少次後不再重試 (--retry-failed 除外)
+MAX_ATTEMPTS = 3
+
+# 每多少條結果寫入一次 media_files
+COMMIT_EVERY = 100
+
+CHUNK_BYTES = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def media_path(sha256: str, ext: str = '', media_dir: str = MEDIA_DIR) -> str:
+    """內容哈希對應的存儲路徑 (兩級目錄分散文件)"""
+    return os.path.join(media_dir, sha256[:2], sha256[2:4], f"{sha256}{ext}")
+
+
+def get_local_path(url: str) -> Optional[str]:
+    """已下載圖片的本地路徑，未下載時返回 None"""
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            "SELECT path FROM media_files WHERE url = ? AND status = 'done'", (url,)
+        ).fetchone()
+    finally:
+        conn.close()
+    if row and os.path.exists(os.path.join(MEDIA_DIR, row['path'])):
+        return os.path.join(MEDIA_DIR, row['path'])
+    return None
+
+
+def _guess_ext(url: str, content_type: str) -> str:
+    ext = mimetypes.guess_extension((content_type or '').split(';')[0].strip()) or ''
+    if not ext:
+        ext = os.path.splitext(urlparse(url).path)[1].lower()
+        if len(ext) > 6:
+            ext = ''
+    return '.jpg' if ext in ('.jpe', '.jpeg') else ext
+
+
+class MediaDownloader:
+    """
+    圖片下載器
+
+    Args:
+        workers: 下載線程數
+        per_host: 每個 host 的並發上限
+        media_dir: 存儲目錄
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, per_host: int = DEFAULT_PER_HOST,
+                 media_dir: str = MEDIA_DIR):
+        self.workers = workers
+        self.per_host = per_host
+        self.media_dir = media_dir
+        self.session = get_session(pool_size=max(workers, 10))
+
+        self._host_limits = {}
+        self._host_lock = threading.Lock()
+        self.stats = {'downloaded': 0, 'deduplicated': 0, 'failed': 0, 'skipped': 0}
+
+    # ============== URL 收集 ==============
+
+    def iter_referenced_urls(self, sources: List[str] = None) -> Iterator[str]:
+        """從資料表收集圖片 URL (已去重)"""
+        seen = set()
+        conn = get_connection()
+        try:
+            for name in sources or IMAGE_SOURCES:
+                for table, column, is_list in IMAGE_SOURCES[name]:
+                    try:
+                        rows = conn.execute(
+                            f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL AND {column} != ''"
+                        ).fetchall()
+                    except Exception as e:
+                        logger.warning(f"讀取 {table}.{column} 失敗: {e}")
+                        continue
+                    for (value,) in rows:
+                        for url in self._parse_urls(value, is_list):
+                            if url not in seen:
+                                seen.add(url)
+                                yield url
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _parse_urls(value: str, is_list: bool) -> List[str]:
+        if not is_list:
+            return [value] if value.startswith('http') else []
+        urls = []
+        for item in from_json(value) or []:
+            if isinstance(item, dict):
+                item = item.get('url') or item.get('src')
+            if isinstance(item, str) and item.startswith('http'):
+                urls.append(item)
+        return urls
+
+    def filter_pending(self, urls: Iterable[str], retry_failed: bool = False) -> Iterator[str]:
+        """過濾掉已下載 (及多次失敗) 的 URL"""
+        conn = get_connection()
+        try:
+            batch = []
+            for url in urls:
+                batch.append(url)
+                if len(batch) >= 500:
+                    yield from self._pending_in(conn, batch, retry_failed)
+                    batch = []
+            if batch:
+                yield from self._pending_in(conn, batch, retry_failed)
+        finally:
+            conn.close()
+
+    def _pending_in(self, conn, urls: List[str], retry_failed: bool) -> List[str]:
+        placeholders = ','.join('?' * len(urls))
+        rows = conn.execute(
+            f"SELECT url, status, attempts FROM media_files WHERE url IN ({placeholders})", urls
+        ).fetchall()
+        known = {row['url']: row for row in rows}
+        pending = []
+        for url in urls:
+            row = known.get(url)
+            if row is None:
+                pending.append(url)
+            elif row['status'] == 'failed' and (retry_failed or row['attempts'] < MAX_ATTEMPTS):
+                pending.append(url)
+            else:
+                self.stats['skipped'] += 1
+        return pending
+
+    # ============== 下載 ==============
+
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._host_lock:
+            sem = self._host_limits.get(host)
+            if sem is None:
+                sem = self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return sem
+
+    def download(self, url: str) -> Dict:
+        """下載單個 URL，返回 media_files 記錄"""
+        result = {'url': url, 'sha256': None, 'path': None, 'size': None,
+                  'content_type': None, 'status': 'failed', 'error': None}
+        tmp_path = None
+        try:
+            with self._host_limit(url):
+                response = self.session.get(url, stream=True, headers={'Accept': 'image/*,*/*;q=0.8'})
+                try:
+                    response.raise_for_status()
+                    content_type = response.headers.get('Content-Type', '')
+                    digest = hashlib.sha256()
+                    size = 0
+                    os.makedirs(self.media_dir, exist_ok=True)
+                    fd, tmp_path = tempfile.mkstemp(dir=self.media_dir, suffix='.part')
+                    with os.fdopen(fd, 'wb') as f:
+                        for chunk in response.iter_content(CHUNK_BYTES):
+                            digest.update(chunk)
+                            f.write(chunk)
+                            size += len(chunk)
+                finally:
+                    response.close()
+
+            sha256 = digest.hexdigest()
+            path = media_path(sha256, _guess_ext(url, content_type), self.media_dir)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                result['deduplicated'] = True
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            tmp_path = None
+
+            result.update({
+                'sha256': sha256,
+                'path': os.path.relpath(path, self.media_dir),
+                'size': size,
+                'content_type': content_type,
+                'status': 'done',
+            })
+        except Exception as e:
+            result['error'] = str(e)[:500]
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return result
+
+    def _save_results(self, results: List[Dict]):
+        if not results:
+            return
+        now = datetime.now()
+        conn = get_connection()
+        try:
+            conn.executemany("""
+                INSERT INTO media_files (url, sha256, path, size, content_type, status, error, attempts, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    sha256 = excluded.sha256,
+                    path = excluded.path,
+                    size = excluded.size,
+                    content_type = excluded.content_type,
+                    status = excluded.status,
+                    error = excluded.error,
+                    attempts = media_files.attempts + 1,
+                    fetched_at = excluded.fetched_at
+            """, [
+                (r['url'], r['sha256'], r['path'], r['size'], r['content_type'], r['status'], r['error'], now)
+                for r in results
+            ])
+            conn.commit()
+        finally:
+            conn.close()
+        results.clear()
+
+    def run(self, sources: List[str] = None, limit: int = None, retry_failed: bool = False) -> Dict[str, int]:
+        """下載所有引用但尚未下載的圖片，返回統計"""
+        init_database()
+        urls = self.filter_pending(self.iter_referenced_urls(sources), retry_failed)
+
+        results = []
+        submitted = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='media') as pool:
+            in_flight = deque()
+            for url in urls:
+                if limit and submitted >= limit:
+                    break
+                in_flight.append(pool.submit(self.download, url))
+                submitted += 1
+                if len(in_flight) >= self.workers * 4:
+                    self._collect(in_flight.popleft().result(), results)
+            while in_flight:
+                self._collect(in_flight.popleft().result(), results)
+        self._save_results(results)
+
+        logger.info(
+            f"圖片下載完成: 新下載 {self.stats['downloaded']}, 內容重複 {self.stats['deduplicated']}, "
+            f"失敗 {self.stats['failed']}, 已存在跳過 {self.stats['skipped']}"
+        )
+        return self.stats
+
+    def _collect(self, result: Dict, results: List[Dict]):
+        if result['status'] != 'done':
+            self.stats['failed'] += 1
+            logger.debug(f"下載失敗 {result['url']}: {result['error']}")
+        elif result.get('deduplicated'):
+            self.stats['deduplicated'] += 1
+        else:
+            self.stats['downloaded'] += 1
+        results.append(result)
+        if len(results) >= COMMIT_EVERY:
+            self._save_results(results)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='下載資料表引用的圖片 (內容尋址去重)')
+    parser.add_argument('--tables', nargs='+', choices=sorted(IMAGE_SOURCES), help='只處理指定來源')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help=f'下載線程數 (默認: {DEFAULT_WORKERS})')
+    parser.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST,
+                        help=f'每個 host 並發上限 (默認: {DEFAULT_PER_HOST})')
+    parser.add_argument('--limit', type=int, default=None, help='最多下載數量')
+    parser.add_argument('--retry-failed', action='store_true', help='重試所有失敗過的 URL')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    downloader = MediaDownloader(workers=args.workers, per_host=args.per_host)
+    stats = downloader.run(sources=args.tables, limit=args.limit, retry_failed=args.retry_failed)
+    print(stats)
+
+
+if __name__ == '__main__':
+    main()
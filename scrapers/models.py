@@ -5,6 +5,10 @@
 
 import sqlite3
 import json
+import threading
+import zlib
+import hashlib
+from contextlib import contextmanager
 from datetime import datetime
 import os
 
@@ -12,70 +16,313 @@ import os
 DB_PATH = os.path.join(os.path.dirname(__file__), "data", "51ca.db")
 
 
+# 記錄價格歷史的表: 表名 -> 業務主鍵
+PRICE_TRACKED_TABLES = {
+    'house_listings': 'listing_id',
+    'auto_listings': 'listing_id',
+    'market_posts': 'post_id',
+}
+
+# 記錄修改計數的表 (查看器 API 以計數生成 ETag): 表名 -> 計數的 UPDATE 欄位 (None 為任意欄位)
+# 隊列只在入隊 / 完成 / 刪除時計數，租約更新不影響統計；service_merchants 為舊版黃頁表，存在時也計數
+VERSIONED_TABLES = {
+    'news_articles': None,
+    'house_listings': None,
+    'market_posts': None,
+    'auto_listings': None,
+    'events': None,
+    'jobs': None,
+    'job_listings': None,
+    'service_posts': None,
+    'merchants': None,
+    'service_merchants': None,
+    'url_queue': ('visited',),
+}
+
+# 分庫目錄: 開啟分庫時每個爬蟲寫入 shards/<爬蟲>.db (讀取端見 shards.py)
+SHARD_DIR = os.path.join(os.path.dirname(__file__), "data", "shards")
+
+# 分庫序號: 分庫內自增 id 從 序號 * SHARD_ID_STRIDE 開始，合併讀取時不衝突
+# (已有分庫的序號不可修改；未列出的爬蟲按名稱哈希分配 100 以上的序號)
+SHARD_IDS = {
+    'news': 1,
+    'house': 2,
+    'market': 3,
+    'auto': 4,
+    'event': 5,
+    'jobs': 6,
+    'market_playwright': 7,
+}
+SHARD_ID_STRIDE = 10 ** 9
+
+# 批量事務中共享的連接 (按線程)
+_batch = threading.local()
+
+# 分庫設置: 進程默認分庫 + 按線程覆蓋 (use_shard)
+_sharding = {
+    'enabled': os.environ.get('SCRAPER_DB_SHARDS', '').strip().lower() in ('1', 'true', 'yes'),
+    'shard': None,
+}
+_shard_local = threading.local()
+
+
+def enable_sharding(enabled: bool = True):
+    """開啟 / 關閉按爬蟲分庫 (也可設環境變量 SCRAPER_DB_SHARDS=1)"""
+    _sharding['enabled'] = enabled
+
+
+def set_shard(name: str):
+    """設置本進程的當前分庫 (BaseScraper 初始化時以 SCRAPER_NAME 調用)"""
+    _sharding['shard'] = name
+
+
+@contextmanager
+def use_shard(name: str):
+    """當前線程內臨時切換分庫 (同一進程並行運行多個爬蟲時使用；name='' 為主庫)"""
+    previous = getattr(_shard_local, 'name', None)
+    _shard_local.name = name
+    try:
+        yield
+    finally:
+        _shard_local.name = previous
+
+
+def current_shard():
+    """當前寫入的分庫名稱，未開啟分庫時返回 None"""
+    if not _sharding['enabled']:
+        return None
+    name = getattr(_shard_local, 'name', None)
+    if name is not None:
+        return name or None
+    return _sharding['shard']
+
+
+def sharding_enabled() -> bool:
+    return _sharding['enabled']
+
+
+def shard_path(name: str) -> str:
+    return os.path.join(SHARD_DIR, f"{name}.db")
+
+
+def shard_id_base(name: str) -> int:
+    """分庫的 id 起點 (主庫為 0)"""
+    if name in SHARD_IDS:
+        return SHARD_IDS[name] * SHARD_ID_STRIDE
+    return (100 + zlib.crc32(name.encode('utf-8')) % 900) * SHARD_ID_STRIDE
+
+
 def get_connection():
-    """獲取資料庫連接"""
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    """獲取資料庫連接 (處於 batch_transaction() 內時返回共享連接；開啟分庫時連接當前爬蟲的分庫)"""
+    shared = getattr(_batch, 'conn', None)
+    if shared is not None:
+        return shared
+    shard = current_shard()
+    path = shard_path(shard) if shard else DB_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+def get_read_connection(main_path: str = None):
+    """
+    只讀查詢用的連接 (查看器 / 統計 / 導出)
+    存在分庫文件時 ATTACH 全部分庫並以同名臨時視圖合併各表，見 shards.open_read_view
+    """
+    try:
+        from .shards import open_read_view
+    except ImportError:
+        from shards import open_read_view
+    return open_read_view(main_path or DB_PATH)
+
+
+class _SharedConnection:
+    """批量事務中共享的連接：commit / close 延遲到事務結束"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def batch_transaction():
+    """
+    批量寫入事務
+    期間同一線程的 get_connection() 返回同一連接，
+    各 save_item 內的 commit / close 延遲到結束時一次提交
+    """
+    if getattr(_batch, 'conn', None) is not None:
+        yield _batch.conn  # 嵌套時沿用外層事務
+        return
+    conn = get_connection()
+    _batch.conn = _SharedConnection(conn)
+    try:
+        yield _batch.conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        _batch.conn = None
+        conn.close()
+
+
+def ensure_columns(cursor, table: str, columns: dict):
+    """為已存在的舊表補上缺失欄位 (CREATE TABLE IF NOT EXISTS 不會修改舊表)"""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    for name, col_type in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}")
+
+
+def _create_price_triggers(cursor, table: str, key: str):
+    """為表建立價格歷史觸發器，並為尚無歷史的項目寫入當前價格"""
+    now = "CAST(strftime('%s', 'now') AS INTEGER)"
+    price_cents = "CAST(ROUND(new.price * 100) AS INTEGER)"
+    item_key = f"(SELECT id FROM price_items WHERE item_type = '{table}' AND item_id = new.{key})"
+    # 外層語句 (INSERT OR REPLACE / upsert) 的衝突策略會覆蓋觸發器內的 OR IGNORE / OR REPLACE，
+    # 觸發器內只用不會衝突的寫法: NOT EXISTS 判重、先刪除同一秒的記錄再插入；
+    # 刪除後最近一條記錄與新值相同時不寫入
+    append_sql = f"""
+        INSERT INTO price_items (item_type, item_id)
+        SELECT '{table}', new.{key}
+        WHERE NOT EXISTS (SELECT 1 FROM price_items WHERE item_type = '{table}' AND item_id = new.{key});
+        DELETE FROM price_history WHERE item_key = {item_key} AND ts = {now};
+        INSERT INTO price_history (item_key, ts, price_cents, status)
+        SELECT p.id, {now}, {price_cents}, 1
+        FROM price_items p
+        WHERE p.item_type = '{table}' AND p.item_id = new.{key}
+          AND NOT EXISTS (
+              SELECT 1 FROM (
+                  SELECT price_cents, status FROM price_history
+                  WHERE item_key = p.id ORDER BY ts DESC LIMIT 1
+              ) last
+              WHERE last.price_cents IS {price_cents} AND last.status = 1
+          );
+    """
+    # 觸發器定義隨代碼更新，每次重建
+    for event in ('insert', 'update', 'delete'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {table}_price_after_{event}")
+    cursor.execute(f"""
+        CREATE TRIGGER {table}_price_after_insert AFTER INSERT ON {table}
+        WHEN new.{key} IS NOT NULL
+        BEGIN {append_sql} END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER {table}_price_after_update AFTER UPDATE OF price ON {table}
+        WHEN new.{key} IS NOT NULL
+        BEGIN {append_sql} END
+    """)
+    old_key = item_key.replace('new.', 'old.')
+    cursor.execute(f"""
+        CREATE TRIGGER {table}_price_after_delete AFTER DELETE ON {table}
+        WHEN old.{key} IS NOT NULL
+        BEGIN
+            DELETE FROM price_history WHERE item_key = {old_key} AND ts = {now};
+            INSERT INTO price_history (item_key, ts, price_cents, status)
+            SELECT p.id, {now}, CAST(ROUND(old.price * 100) AS INTEGER), 0
+            FROM price_items p
+            WHERE p.item_type = '{table}' AND p.item_id = old.{key};
+        END
+    """)
+    
+    # 回填: 觸發器建立前已存在的項目
+    cursor.execute(f"""
+        INSERT OR IGNORE INTO price_items (item_type, item_id)
+        SELECT '{table}', {key} FROM {table} WHERE {key} IS NOT NULL
+    """)
+    cursor.execute(f"""
+        INSERT OR IGNORE INTO price_history (item_key, ts, price_cents, status)
+        SELECT p.id, CAST(COALESCE(strftime('%s', t.updated_at), strftime('%s', 'now')) AS INTEGER),
+               CAST(ROUND(t.price * 100) AS INTEGER), 1
+        FROM {table} t
+        JOIN price_items p ON p.item_type = '{table}' AND p.item_id = t.{key}
+        WHERE NOT EXISTS (SELECT 1 FROM price_history h WHERE h.item_key = p.id)
+    """)
+
+
+def _create_version_triggers(cursor, table: str, update_columns=None):
+    """表的每次寫入把 table_versions 中的計數加一 (計數只增不減)"""
+    cursor.execute("INSERT OR IGNORE INTO table_versions (table_name, version) VALUES (?, 0)", (table,))
+    bump = f"UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';"
+    update_of = f" OF {', '.join(update_columns)}" if update_columns else ""
+    for event, clause in (('insert', 'INSERT'), ('update', f'UPDATE{update_of}'), ('delete', 'DELETE')):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {table}_version_after_{event}")
+        cursor.execute(f"""
+            CREATE TRIGGER {table}_version_after_{event} AFTER {clause} ON {table}
+            BEGIN {bump} END
+        """)
+
+
 def init_database():
     """初始化資料庫，創建所有資料表"""
+    # schema 依賴本模組，在函數內導入避免循環導入
+    try:
+        from .schema import TABLES
+    except ImportError:
+        from schema import TABLES
+    
     conn = get_connection()
     cursor = conn.cursor()
     
-    # ============== 新聞文章表 ==============
+    # 新建的資料庫使用增量 VACUUM (已有表時此設置無效，需 maintenance --full-vacuum 轉換)
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    
+    # ============== 爬蟲資料表 (由 schema.py 聲明生成) ==============
+    for table_schema in TABLES:
+        cursor.execute(table_schema.ddl())
+        ensure_columns(cursor, table_schema.table, table_schema.column_types())
+    
+    # ============== 房屋座標 R-tree 索引 (由觸發器與 house_listings 同步) ==============
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS news_articles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            article_id TEXT UNIQUE,
-            url TEXT NOT NULL,
-            title TEXT,
-            summary TEXT,
-            content TEXT,
-            category TEXT,
-            author TEXT,
-            source TEXT,
-            publish_date TIMESTAMP,
-            comment_count INTEGER DEFAULT 0,
-            view_count INTEGER DEFAULT 0,
-            image_urls TEXT,
-            tags TEXT,
-            scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        CREATE VIRTUAL TABLE IF NOT EXISTS house_geo USING rtree(
+            id, min_lat, max_lat, min_lon, max_lon
         )
     """)
-    
-    # ============== 房屋列表表 ==============
+    # INSERT OR REPLACE 會刪除舊行並以新 id 插入，舊 id 的索引項需先清除
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS house_listings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            listing_id TEXT UNIQUE,
-            url TEXT NOT NULL,
-            title TEXT,
-            listing_type TEXT,
-            property_type TEXT,
-            price REAL,
-            price_unit TEXT,
-            address TEXT,
-            city TEXT,
-            province TEXT,
-            community TEXT,
-            bedrooms TEXT,
-            bathrooms TEXT,
-            parking TEXT,
-            sqft TEXT,
-            description TEXT,
-            features TEXT,
-            agent_name TEXT,
-            agent_phone TEXT,
-            agent_company TEXT,
-            image_urls TEXT,
-            amenities TEXT,
-            scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
+        CREATE TRIGGER IF NOT EXISTS house_geo_before_insert BEFORE INSERT ON house_listings
+        BEGIN
+            DELETE FROM house_geo WHERE id = (SELECT id FROM house_listings WHERE listing_id = new.listing_id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS house_geo_after_insert AFTER INSERT ON house_listings
+        WHEN new.lat IS NOT NULL AND new.lon IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO house_geo VALUES (new.id, new.lat, new.lat, new.lon, new.lon);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS house_geo_after_update AFTER UPDATE OF lat, lon ON house_listings
+        BEGIN
+            DELETE FROM house_geo WHERE id = old.id;
+            INSERT INTO house_geo
+            SELECT new.id, new.lat, new.lat, new.lon, new.lon
+            WHERE new.lat IS NOT NULL AND new.lon IS NOT NULL;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS house_geo_after_delete AFTER DELETE ON house_listings
+        BEGIN
+            DELETE FROM house_geo WHERE id = old.id;
+        END
+    """)
+    # 回填觸發器建立前已有座標的房源
+    cursor.execute("""
+        INSERT OR REPLACE INTO house_geo
+        SELECT id, lat, lat, lon, lon FROM house_listings
+        WHERE lat IS NOT NULL AND lon IS NOT NULL
+          AND id NOT IN (SELECT id FROM house_geo)
     """)
     
     # ============== 工作職位表 ==============
@@ -150,110 +397,6 @@ def init_database():
         )
     """)
     
-    # ============== 二手市場表 (基於schema) ==============
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS market_posts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            post_id TEXT UNIQUE,
-            url TEXT NOT NULL,
-            title TEXT,
-            description TEXT,
-            format_price TEXT,
-            price REAL,
-            original_price REAL,
-            negotiable INTEGER DEFAULT 0,
-            condition INTEGER,
-            category_id INTEGER,
-            category_name TEXT,
-            category_slug TEXT,
-            location_id INTEGER,
-            location_zh TEXT,
-            location_en TEXT,
-            pickup_methods TEXT,
-            contact_phone TEXT,
-            email TEXT,
-            wechat_no TEXT,
-            wechat_qrcode TEXT,
-            photos TEXT,
-            user_uid INTEGER,
-            user_name TEXT,
-            user_avatar TEXT,
-            favorite_count INTEGER DEFAULT 0,
-            published_at TIMESTAMP,
-            source TEXT,
-            scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # ============== 汽車列表表 (基於schema) ==============
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS auto_listings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            listing_id TEXT UNIQUE,
-            url TEXT NOT NULL,
-            title TEXT,
-            listing_type TEXT,
-            make TEXT,
-            model TEXT,
-            year INTEGER,
-            trim TEXT,
-            body_type TEXT,
-            color TEXT,
-            transmission TEXT,
-            drivetrain TEXT,
-            fuel_type TEXT,
-            kilometers INTEGER,
-            price REAL,
-            currency TEXT DEFAULT 'CAD',
-            city TEXT,
-            province TEXT,
-            dealer_name TEXT,
-            dealer_address TEXT,
-            dealer_phone TEXT,
-            vin TEXT,
-            carfax_available INTEGER DEFAULT 0,
-            features TEXT,
-            description TEXT,
-            images TEXT,
-            promo_same_day_approval INTEGER DEFAULT 0,
-            promo_no_credit_ok INTEGER DEFAULT 0,
-            promo_no_job_ok INTEGER DEFAULT 0,
-            promo_delivery_available INTEGER DEFAULT 0,
-            promo_warranty_available INTEGER DEFAULT 0,
-            post_date TIMESTAMP,
-            scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # ============== 活動表 ==============
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            event_id TEXT UNIQUE,
-            url TEXT NOT NULL,
-            title TEXT,
-            event_type TEXT,
-            image_url TEXT,
-            time_text TEXT,
-            location TEXT,
-            start_time TIMESTAMP,
-            end_time TIMESTAMP,
-            region TEXT,
-            contact_person TEXT,
-            contact_phone TEXT,
-            contact_email TEXT,
-            address TEXT,
-            content TEXT,
-            content_images TEXT,
-            published_at TIMESTAMP,
-            source TEXT,
-            scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
     # ============== URL隊列表 ==============
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS url_queue (
@@ -266,9 +409,58 @@ def init_database():
             retry_count INTEGER DEFAULT 0,
             last_error TEXT,
             added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            visited_at TIMESTAMP,
+            leased_until REAL,
+            lastmod TEXT
+        )
+    """)
+    # leased_until: 租約到期時間 (Unix 秒)，見 frontier.py
+    # lastmod: sitemap / feed 聲明的最後修改時間 (本地時間)，見 discovery.py
+    ensure_columns(cursor, 'url_queue', {'leased_until': 'REAL', 'lastmod': 'TEXT'})
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_url_queue_pending
+        ON url_queue(url_type, visited, priority DESC, added_at)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_url_queue_visited
+        ON url_queue(visited_at) WHERE visited = 1
+    """)
+    # 按 URL 模式 / 來源頁累計的抓取產出，用於計算入隊優先級 (見 scheduler.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS crawl_yield (
+            url_type TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            fetches REAL DEFAULT 0,
+            yield REAL DEFAULT 0,
+            depth INTEGER,
+            updated_at REAL,
+            PRIMARY KEY (url_type, kind, key)
+        ) WITHOUT ROWID
+    """)
+    # 已清理的已訪問 URL 只保留指紋和訪問時間 (見 maintenance.py)，不會再次入隊；
+    # sitemap / feed 聲明的 lastmod 晚於訪問時間時例外 (見 frontier.add_discovered)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS url_fingerprints (
+            fp INTEGER PRIMARY KEY,
             visited_at TIMESTAMP
         )
     """)
+    ensure_columns(cursor, 'url_fingerprints', {'visited_at': 'TIMESTAMP'})
+    
+    # ============== 實體 (見 entity_resolution.py) ==============
+    # 房源 / 商品 / 車源的 canonical_id 指向此表；primary_table / primary_id 為代表行
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS entities (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            primary_table TEXT NOT NULL,
+            primary_id INTEGER NOT NULL,
+            members INTEGER DEFAULT 1,
+            updated_at TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_entities_kind ON entities(kind)")
     
     # ============== 爬蟲日誌表 ==============
     cursor.execute("""
@@ -283,21 +475,177 @@ def init_database():
             scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_scrape_logs_time ON scrape_logs(scraped_at)")
+    
+    # ============== sitemap / feed 來源狀態 (見 discovery.py) ==============
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS discovery_sources (
+            url_type TEXT NOT NULL,
+            source TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            lastmod TEXT,
+            urls INTEGER DEFAULT 0,
+            children TEXT,
+            checked_at TIMESTAMP,
+            PRIMARY KEY (url_type, source)
+        ) WITHOUT ROWID
+    """)
+    
+    # ============== 分頁斷點 (見 checkpoints.py) ==============
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scrape_checkpoints (
+            scraper TEXT NOT NULL,
+            category TEXT NOT NULL DEFAULT '',
+            transaction_type TEXT NOT NULL DEFAULT '',
+            page INTEGER NOT NULL DEFAULT 0,
+            cursor TEXT,
+            finished INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (scraper, category, transaction_type)
+        ) WITHOUT ROWID
+    """)
+    
+    # ============== 價格歷史 (只在價格 / 上下架狀態變化時追加) ==============
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS price_items (
+            id INTEGER PRIMARY KEY,
+            item_type TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            UNIQUE (item_type, item_id)
+        )
+    """)
+    # (item_key, ts) 主鍵即覆蓋索引；ts 為 Unix 秒，price_cents 為分，status 1=在售 0=下架
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS price_history (
+            item_key INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            price_cents INTEGER,
+            status INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (item_key, ts)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_price_history_ts ON price_history(ts)")
+    
+    for table, key in PRICE_TRACKED_TABLES.items():
+        _create_price_triggers(cursor, table, key)
+    
+    # ============== 列表欄位子表 (規範化存儲，見 normalized.py) ==============
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS item_images (
+            item_type TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            PRIMARY KEY (item_type, item_id, position)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_item_images_url ON item_images(url)")
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS item_features (
+            item_type TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            feature TEXT NOT NULL,
+            PRIMARY KEY (item_type, item_id, feature)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_item_features_feature ON item_features(item_type, feature)")
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS item_tags (
+            item_type TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            tag TEXT NOT NULL,
+            PRIMARY KEY (item_type, item_id, tag)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_item_tags_tag ON item_tags(item_type, tag)")
+    
+    # ============== 圖片文件表 (URL -> 內容哈希) ==============
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS media_files (
+            url TEXT PRIMARY KEY,
+            sha256 TEXT,
+            path TEXT,
+            size INTEGER,
+            content_type TEXT,
+            status TEXT NOT NULL,
+            error TEXT,
+            attempts INTEGER DEFAULT 0,
+            fetched_at TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_media_sha256 ON media_files(sha256)")
+    
+    # ============== 原始響應存檔索引 ==============
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archive_index (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scraper TEXT NOT NULL,
+            url TEXT NOT NULL,
+            status INTEGER,
+            fetched_at TIMESTAMP NOT NULL,
+            segment TEXT NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archive_url ON archive_index(url, fetched_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archive_scraper ON archive_index(scraper, fetched_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archive_segment ON archive_index(segment)")
+    
+    # ============== 表修改計數 (由觸發器維護，見 VERSIONED_TABLES) ==============
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table, update_columns in VERSIONED_TABLES.items():
+        if table in existing:
+            _create_version_triggers(cursor, table, update_columns)
+    
+    # ============== 分庫 id 起點 ==============
+    shard = current_shard()
+    if shard:
+        _seed_shard_ids(cursor, shard_id_base(shard))
     
     conn.commit()
     conn.close()
     print("資料庫初始化完成")
 
 
+def _seed_shard_ids(cursor, base: int):
+    """新分庫的自增表從 base 開始編號 (已有序列的表不變)"""
+    tables = cursor.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type = 'table' AND sql LIKE '%AUTOINCREMENT%'
+    """).fetchall()
+    for (table,) in tables:
+        cursor.execute("""
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+        """, (table, base, table))
+
+
+def url_fingerprint(url: str) -> int:
+    """URL 的 64 位指紋 (有符號，可直接作為 SQLite INTEGER 主鍵)"""
+    digest = hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
 def add_url_to_queue(url: str, url_type: str, source_url: str = None, priority: int = 0):
-    """添加URL到爬蟲隊列"""
+    """添加URL到爬蟲隊列 (已清理為指紋的 URL 不再入隊)"""
     conn = get_connection()
     cursor = conn.cursor()
     try:
         cursor.execute("""
             INSERT OR IGNORE INTO url_queue (url, url_type, source_url, priority)
-            VALUES (?, ?, ?, ?)
-        """, (url, url_type, source_url, priority))
+            SELECT ?, ?, ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM url_fingerprints WHERE fp = ?)
+        """, (url, url_type, source_url, priority, url_fingerprint(url)))
         conn.commit()
     finally:
         conn.close()
@@ -8,10 +8,10 @@ import re
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 
-from bs4 import BeautifulSoup
-
 from .base import BaseScraper
-from .models import get_connection
+from .html_parser import Document
+from . import content_extractor
+from .schema import NEWS_ARTICLES
 
 
 class NewsScraper(BaseScraper):
@@ -20,6 +20,8 @@ class NewsScraper(BaseScraper):
     SCRAPER_NAME = "news"
     BASE_URL = "https://info.51.ca"
     URL_TYPE = "news"
+    DETAIL_URL_PATTERN = r'/articles/\d+'
+    SCHEMA = NEWS_ARTICLES
     
     # 新聞分類
     CATEGORIES = {
@@ -46,6 +48,19 @@ class NewsScraper(BaseScraper):
         '51.CA 立场', '51首页', '点击查看繁體版', '加国无忧APP下载',
     ]
     
+    # 排除關鍵詞合併為一個正則，每段只掃描一次
+    EXCLUDE_PATTERN = re.compile('|'.join(re.escape(k) for k in EXCLUDE_KEYWORDS))
+    
+    # 評論格式: 用戶名 + N小时前
+    COMMENT_LINE_PATTERN = re.compile(r'^\w+\d+[小时分钟天]前')
+    
+    # 正文提取前刪除的區塊 (導航 / 評論 / 推薦等)，合併為一個選擇器一次遍歷
+    BOILERPLATE_SELECTOR = (
+        'nav, footer, header, aside, iframe, noscript, '
+        '[class*="comment"], [class*="footer"], [class*="sidebar"], '
+        '[class*="recommend"], [class*="related"]'
+    )
+    
     def __init__(self, use_browser: bool = True, headless: bool = True):
         """初始化爬蟲，預設使用瀏覽器"""
         super().__init__(use_browser=use_browser, headless=headless)
@@ -65,16 +80,16 @@ class NewsScraper(BaseScraper):
     
     def parse_list_page(self, html: str, url: str) -> List[Dict]:
         """解析新聞列表頁面"""
-        soup = BeautifulSoup(html, "lxml")
+        doc = self.make_doc(html)
         items = []
         
         # 文章URL格式: /articles/1500533
-        article_links = soup.find_all('a', href=re.compile(r'/articles/\d+'))
+        article_links = doc.css('a[href*="/articles/"]')
         
         seen_urls = set()
         for link in article_links:
-            href = link.get('href', '')
-            if not href:
+            href = link.attr('href', '')
+            if not re.search(r'/articles/\d+', href):
                 continue
             
             # 跳過評論頁面
@@ -101,38 +116,39 @@ class NewsScraper(BaseScraper):
     
     def parse_detail_page(self, html: str, url: str) -> Optional[Dict]:
         """解析新聞詳情頁面"""
-        soup = BeautifulSoup(html, "lxml")
+        doc = self.make_doc(html)
         
         article_id = self.extract_id_from_url(url, r'/articles/(\d+)')
         if not article_id:
             return None
         
         # 標題
-        title = self._extract_title(soup)
+        title = self._extract_title(doc)
         
         # 分類
-        category = self._extract_category(soup, url)
+        category = self._extract_category(doc, url)
         
         # 發布時間
-        publish_date = self._extract_publish_date(soup)
+        publish_date = self._extract_publish_date(doc)
         
         # 作者/來源
-        author, source = self._extract_author_source(soup)
+        author, source = self._extract_author_source(doc)
         
-        # 正文 (改進版)
-        content = self._extract_content(soup)
+        # 正文 (文本密度提取)
+        body = self._extract_content(doc)
+        content = self.clean_text('\n\n'.join(body.paragraphs))
         
         # 摘要
         summary = content[:200] + "..." if len(content) > 200 else content
         
-        # 圖片
-        image_urls = self._extract_images(soup)
+        # 圖片 (正文內的圖片)
+        image_urls = self._extract_images(body.images)
         
         # 評論數
-        comment_count = self._extract_comment_count(soup)
+        comment_count = self._extract_comment_count(doc)
         
         # 標籤
-        tags = self._extract_tags(soup)
+        tags = self._extract_tags(doc)
         
         return {
             'article_id': article_id,
@@ -150,26 +166,26 @@ class NewsScraper(BaseScraper):
             'tags': self.to_json(tags) if tags else None
         }
     
-    def _extract_title(self, soup: BeautifulSoup) -> str:
+    def _extract_title(self, doc: Document) -> str:
         """提取標題"""
         # 首先找 h1
-        h1 = soup.find('h1')
+        h1 = doc.css_first('h1')
         if h1:
-            title = self.clean_text(h1.get_text())
+            title = self.clean_text(h1.text())
             if title and len(title) > 5:
                 return title
         
         # 找 title 標籤
-        title_tag = soup.find('title')
+        title_tag = doc.css_first('title')
         if title_tag:
-            title = self.clean_text(title_tag.get_text())
+            title = self.clean_text(title_tag.text())
             # 移除網站名稱後綴
             title = re.sub(r'\s*[-|]\s*(51\.CA|加国无忧).*$', '', title)
             return title
         
         return ""
     
-    def _extract_category(self, soup: BeautifulSoup, url: str) -> str:
+    def _extract_category(self, doc: Document, url: str) -> str:
         """提取分類"""
         # 從URL提取
         for key, value in self.CATEGORIES.items():
@@ -177,16 +193,16 @@ class NewsScraper(BaseScraper):
                 return value
         
         # 從頁面元素提取
-        text = soup.get_text()
+        text = doc.page_text()
         for key, value in self.CATEGORIES.items():
             if value in text[:500]:  # 只在頁面前部查找
                 return value
         
         return '綜合'
     
-    def _extract_publish_date(self, soup: BeautifulSoup) -> Optional[str]:
+    def _extract_publish_date(self, doc: Document) -> Optional[str]:
         """提取發布時間"""
-        text = soup.get_text()
+        text = doc.page_text()
         
         # 格式: 發布：2026年01月10日 18:29
         match = re.search(r'發布[：:]\s*(\d{4})年(\d{1,2})月(\d{1,2})日\s*(\d{1,2}):(\d{2})', text)
@@ -198,18 +214,18 @@ class NewsScraper(BaseScraper):
         if match:
             return f"{match.group(1)}-{match.group(2).zfill(2)}-{match.group(3).zfill(2)} {match.group(4).zfill(2)}:{match.group(5)}:00"
         
-        # 相對時間
-        match = re.search(r'(\d+)小時前', text)
+        # 相對時間 (先用子串判斷，避免對整頁的數字逐個嘗試正則)
+        match = re.search(r'(\d+)小時前', text) if '小時前' in text else None
         if match:
             hours = int(match.group(1))
             return (datetime.now() - timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
         
-        match = re.search(r'(\d+)分鐘前', text)
+        match = re.search(r'(\d+)分鐘前', text) if '分鐘前' in text else None
         if match:
             minutes = int(match.group(1))
             return (datetime.now() - timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M:%S')
         
-        match = re.search(r'(\d+)天前', text)
+        match = re.search(r'(\d+)天前', text) if '天前' in text else None
         if match:
             days = int(match.group(1))
             return (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
@@ -221,112 +237,40 @@ class NewsScraper(BaseScraper):
         
         return None
     
-    def _extract_content(self, soup: BeautifulSoup) -> str:
-        """提取正文內容 (改進版)"""
-        # 移除不需要的元素
-        for tag in soup(['script', 'style', 'nav', 'footer', 'header', 'aside', 'iframe', 'noscript']):
-            tag.decompose()
-        
-        # 移除評論區域
-        for elem in soup.find_all(class_=re.compile(r'comment|footer|sidebar|recommend|related')):
-            elem.decompose()
-        
-        content_parts = []
-        
-        # 方法1: 查找文章主體區域
-        article_selectors = [
-            'article',
-            '.article-content',
-            '.article-body',
-            '.post-content',
-            '.news-content',
-            '.arc-body',
-            '.arcbody',
-            '[class*="article"]',
-        ]
-        
-        article_elem = None
-        for selector in article_selectors:
-            article_elem = soup.select_one(selector)
-            if article_elem:
-                break
-        
-        if article_elem:
-            # 從文章區域提取段落
-            paragraphs = article_elem.find_all('p')
-            for p in paragraphs:
-                text = p.get_text(strip=True)
-                if self._is_valid_paragraph(text):
-                    content_parts.append(text)
-        
-        # 方法2: 如果沒有找到足夠內容，從整個頁面提取
-        if len('\n\n'.join(content_parts)) < 100:
-            content_parts = []
-            all_paragraphs = soup.find_all('p')
-            for p in all_paragraphs:
-                text = p.get_text(strip=True)
-                if self._is_valid_paragraph(text):
-                    content_parts.append(text)
-        
-        # 方法3: 如果還是沒有內容，嘗試提取純文本
-        if not content_parts:
-            # 找到 h1 標題後的內容
-            h1 = soup.find('h1')
-            if h1:
-                # 獲取 h1 後面的兄弟元素
-                for sibling in h1.find_next_siblings():
-                    if sibling.name in ['p', 'div']:
-                        text = sibling.get_text(strip=True)
-                        if self._is_valid_paragraph(text):
-                            content_parts.append(text)
-                    # 遇到評論區或推薦區停止
-                    if sibling.get('class') and any('comment' in c or 'recommend' in c for c in sibling.get('class', [])):
-                        break
-        
-        content = '\n\n'.join(content_parts)
-        return self.clean_text(content)
+    def _extract_content(self, doc: Document) -> content_extractor.Content:
+        """提取正文段落和正文圖片 (見 content_extractor)"""
+        # 移除導航 / 評論等區塊 (script / style 解析時已移除)，避免干擾評分
+        doc.remove_all(self.BOILERPLATE_SELECTOR)
+        return content_extractor.extract(doc, site=self.SCRAPER_NAME, is_valid=self._is_valid_paragraph)
     
     def _is_valid_paragraph(self, text: str) -> bool:
         """檢查段落是否有效"""
         if not text or len(text) < 15:
             return False
         
-        # 排除包含無關關鍵詞的段落
-        for keyword in self.EXCLUDE_KEYWORDS:
-            if keyword in text:
-                return False
+        # 排除包含無關關鍵詞的段落 (合併正則，一次掃描)
+        if self.EXCLUDE_PATTERN.search(text):
+            return False
         
         # 排除只有連結的段落
-        if text.startswith('http') or text.startswith('www.'):
+        if text.startswith(('http', 'www.')):
             return False
         
         # 排除評論格式的內容
-        if re.match(r'^\w+\d+[小时分钟天]前', text):
+        if self.COMMENT_LINE_PATTERN.match(text):
             return False
         
         return True
     
-    def _extract_images(self, soup: BeautifulSoup) -> List[str]:
-        """提取圖片"""
+    def _extract_images(self, srcs: List[str]) -> List[str]:
+        """過濾圖片 (排除 logo / icon 等，補全 URL)"""
         images = []
         
-        # 查找文章中的圖片
-        article = soup.find('article') or soup.find(class_=re.compile(r'article|content'))
-        search_area = article if article else soup
-        
-        for img in search_area.find_all('img'):
-            src = img.get('data-src') or img.get('src')
-            if not src:
-                continue
-            
+        for src in srcs:
             # 排除logo、icon等
             if any(x in src.lower() for x in ['logo', 'icon', 'avatar', 'button', 'banner']):
                 continue
             
-            # 排除 data URI
-            if src.startswith('data:'):
-                continue
-            
             # 補全 URL
             if src.startswith('//'):
                 src = 'https:' + src
@@ -337,11 +281,11 @@ class NewsScraper(BaseScraper):
         
         return images[:10]
     
-    def _extract_author_source(self, soup: BeautifulSoup) -> tuple:
+    def _extract_author_source(self, doc: Document) -> tuple:
         """提取作者和來源"""
         author = None
         source = None
-        text = soup.get_text()
+        text = doc.page_text()
         
         # 查找來源: 來源：加国无忧 51.CA
         match = re.search(r'[來来]源[：:]\s*([^\n]+)', text)
@@ -355,69 +299,26 @@ class NewsScraper(BaseScraper):
         
         return author, source
     
-    def _extract_comment_count(self, soup: BeautifulSoup) -> int:
+    def _extract_comment_count(self, doc: Document) -> int:
         """提取評論數"""
-        text = soup.get_text()
+        text = doc.page_text()
         match = re.search(r'(\d+)\s*(?:條評論|条评论|評論|评论|comments)', text, re.I)
         if match:
             return int(match.group(1))
         return 0
     
-    def _extract_tags(self, soup: BeautifulSoup) -> List[str]:
+    def _extract_tags(self, doc: Document) -> List[str]:
         """提取標籤"""
         tags = []
         
         # 查找標籤連結
-        tag_links = soup.find_all('a', href=re.compile(r'/keywords/'))
+        tag_links = doc.css('a[href*="/keywords/"]')
         for link in tag_links:
-            tag = link.get_text(strip=True)
+            tag = link.text(strip=True)
             if tag and tag not in tags:
                 tags.append(tag)
         
         return tags
-    
-    def save_item(self, data: Dict) -> bool:
-        """保存新聞到資料庫"""
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            # 轉換為繁體中文
-            title = self.to_traditional(data.get('title', ''))
-            summary = self.to_traditional(data.get('summary', ''))
-            content = self.to_traditional(data.get('content', ''))
-            author = self.to_traditional(data.get('author', '')) if data.get('author') else None
-            source = self.to_traditional(data.get('source', '')) if data.get('source') else None
-            
-            cursor.execute("""
-                INSERT OR REPLACE INTO news_articles (
-                    article_id, url, title, summary, content, category,
-                    author, source, publish_date, comment_count, view_count,
-                    image_urls, tags
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                data['article_id'],
-                data['url'],
-                title,
-                summary,
-                content,
-                data['category'],
-                author,
-                source,
-                data['publish_date'],
-                data['comment_count'],
-                data['view_count'],
-                data['image_urls'],
-                data['tags']
-            ))
-            
-            conn.commit()
-            conn.close()
-            self.logger.info(f"保存新聞: {title[:30]}... (內容長度: {len(content)})")
-            return True
-        except Exception as e:
-            self.logger.error(f"保存新聞失敗: {e}")
-            return False
 
 
 if __name__ == "__main__":
@@ -0,0 +1,217 @@
+"""
+51.ca 爬蟲 - 列表欄位規範化存儲
+features / image_urls / tags / photos / pickup_methods 等列表欄位原本以 JSON 文本存放，
+查詢「有某設施的房源」「帶某標籤的文章」只能逐行解碼。
+本模組把這些欄位同步寫入帶索引的子表 (與父表 upsert 同一事務)：
+
+    item_images   (item_type, item_id, position, url)
+    item_features (item_type, item_id, feature)
+    item_tags     (item_type, item_id, tag)
+
+item_type 為父表名，item_id 為父表業務主鍵。原 JSON 欄位保留，作為查看器使用的反規範化緩存。
+
+用法:
+    normalized.sync_children(conn, 'house_listings', listing_id, {'image_urls': ..., 'features': ...})
+    normalized.find_items('house_listings', feature='Pool: Inground')
+    python -m scrapers.normalized --rebuild          # 從現有 JSON 欄位回填子表
+"""
+
+import os
+import json
+from typing import Dict, List, Optional
+
+try:
+    from .models import get_connection, batch_transaction, init_database
+except ImportError:
+    from models import get_connection, batch_transaction, init_database
+
+# 是否寫入子表 (SCRAPER_NORMALIZED=0 關閉)
+ENABLED = os.environ.get('SCRAPER_NORMALIZED', '1').lower() not in ('0', 'false', 'no')
+
+# 父表業務主鍵
+ITEM_KEYS = {
+    'news_articles': 'article_id',
+    'house_listings': 'listing_id',
+    'auto_listings': 'listing_id',
+    'market_posts': 'post_id',
+    'events': 'event_id',
+}
+
+# 父表列表欄位 -> 子表
+CHILD_FIELDS = {
+    'news_articles': {'image_urls': 'item_images', 'tags': 'item_tags'},
+    'house_listings': {'image_urls': 'item_images', 'features': 'item_features'},
+    'auto_listings': {'images': 'item_images', 'features': 'item_features'},
+    'market_posts': {'photos': 'item_images', 'pickup_methods': 'item_tags'},
+    'events': {'content_images': 'item_images'},
+}
+
+# 子表 -> 值欄位
+CHILD_COLUMNS = {
+    'item_images': 'url',
+    'item_features': 'feature',
+    'item_tags': 'tag',
+}
+
+
+def parse_values(value) -> List[str]:
+    """將 JSON 列表 / 逗號分隔文本解碼為字符串列表"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return [v.strip() for v in value.split(',') if v.strip()]
+    if isinstance(value, dict):
+        return [f"{k}: {v}" for k, v in value.items()]
+    if not isinstance(value, list):
+        return [str(value)]
+
+    values = []
+    for item in value:
+        if isinstance(item, dict):
+            item = item.get('url') or item.get('src') or item.get('name')
+        if item is not None and str(item).strip():
+            values.append(str(item).strip())
+    return values
+
+
+def sync_children(conn, table: str, item_id, row: Dict) -> None:
+    """
+    重寫一個項目的子表記錄 (在調用方事務內執行，不提交)
+
+    Args:
+        conn: 父表 upsert 使用的連接
+        table: 父表名
+        item_id: 父表業務主鍵
+        row: 列表欄位 -> 值 (JSON 文本或列表)；未提供的欄位對應子表保持不變
+    """
+    if ENABLED:
+        _write_children(conn, table, item_id, row)
+
+
+def _write_children(conn, table: str, item_id, row: Dict) -> None:
+    fields = CHILD_FIELDS.get(table)
+    if not fields or not item_id:
+        return
+
+    grouped = {}
+    for column, child in fields.items():
+        if column in row:
+            grouped.setdefault(child, []).extend(parse_values(row[column]))
+
+    item_id = str(item_id)
+    for child, values in grouped.items():
+        conn.execute(f"DELETE FROM {child} WHERE item_type = ? AND item_id = ?", (table, item_id))
+        if not values:
+            continue
+        if child == 'item_images':
+            conn.executemany(
+                "INSERT OR IGNORE INTO item_images (item_type, item_id, position, url) VALUES (?, ?, ?, ?)",
+                [(table, item_id, i, url) for i, url in enumerate(values)]
+            )
+        else:
+            column = CHILD_COLUMNS[child]
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {child} (item_type, item_id, {column}) VALUES (?, ?, ?)",
+                [(table, item_id, v) for v in values]
+            )
+
+
+# ============== 查詢 ==============
+
+def find_items(table: str, feature: str = None, tag: str = None, image_url: str = None,
+               limit: int = 100, offset: int = 0) -> List[str]:
+    """按設施 / 標籤 / 圖片 URL 查找項目 ID (多個條件取交集)"""
+    conditions = []
+    params = []
+    for child, value in (('item_features', feature), ('item_tags', tag), ('item_images', image_url)):
+        if value is None:
+            continue
+        conditions.append(
+            f"SELECT item_id FROM {child} WHERE item_type = ? AND {CHILD_COLUMNS[child]} = ?"
+        )
+        params.extend([table, value])
+    if not conditions:
+        return []
+
+    sql = " INTERSECT ".join(conditions) + " ORDER BY item_id LIMIT ? OFFSET ?"
+    conn = get_connection()
+    try:
+        return [row[0] for row in conn.execute(sql, params + [limit, offset]).fetchall()]
+    finally:
+        conn.close()
+
+
+def get_children(table: str, item_id) -> Dict[str, List[str]]:
+    """獲取一個項目的圖片 / 設施 / 標籤"""
+    item_id = str(item_id)
+    conn = get_connection()
+    try:
+        images = [r[0] for r in conn.execute(
+            "SELECT url FROM item_images WHERE item_type = ? AND item_id = ? ORDER BY position",
+            (table, item_id)
+        )]
+        features = [r[0] for r in conn.execute(
+            "SELECT feature FROM item_features WHERE item_type = ? AND item_id = ?", (table, item_id)
+        )]
+        tags = [r[0] for r in conn.execute(
+            "SELECT tag FROM item_tags WHERE item_type = ? AND item_id = ?", (table, item_id)
+        )]
+    finally:
+        conn.close()
+    return {'images': images, 'features': features, 'tags': tags}
+
+
+def top_values(table: str, child: str = 'item_features', limit: int = 50) -> List[tuple]:
+    """統計最常見的設施 / 標籤: [(值, 項目數), ...]"""
+    column = CHILD_COLUMNS[child]
+    conn = get_connection()
+    try:
+        return [tuple(row) for row in conn.execute(f"""
+            SELECT {column}, COUNT(*) AS n FROM {child}
+            WHERE item_type = ?
+            GROUP BY {column} ORDER BY n DESC LIMIT ?
+        """, (table, limit))]
+    finally:
+        conn.close()
+
+
+# ============== 回填 ==============
+
+def rebuild(tables: Optional[List[str]] = None, batch_size: int = 1000) -> Dict[str, int]:
+    """從父表的 JSON 欄位重建子表，返回各表處理的項目數"""
+    init_database()
+    counts = {}
+    for table in tables or CHILD_FIELDS:
+        key = ITEM_KEYS[table]
+        columns = list(CHILD_FIELDS[table])
+        conn = get_connection()
+        try:
+            rows = conn.execute(
+                f"SELECT {key}, {', '.join(columns)} FROM {table} WHERE {key} IS NOT NULL"
+            ).fetchall()
+        finally:
+            conn.close()
+
+        for start in range(0, len(rows), batch_size):
+            with batch_transaction() as conn:
+                for row in rows[start:start + batch_size]:
+                    _write_children(conn, table, row[0], dict(zip(columns, row[1:])))
+        counts[table] = len(rows)
+    return counts
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='列表欄位規範化子表')
+    parser.add_argument('--rebuild', action='store_true', help='從 JSON 欄位回填子表')
+    parser.add_argument('--tables', nargs='+', choices=sorted(CHILD_FIELDS), help='只處理指定父表')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        for table, count in rebuild(args.tables).items():
+            print(f"{table}: {count} 個項目")
+    else:
+        parser.print_help()
@@ -0,0 +1,126 @@
+"""
+51.ca 爬蟲 - 價格歷史查詢
+price_history 由 house_listings / auto_listings / market_posts 上的觸發器維護
+(見 models.init_database)，只在價格或上下架狀態變化時追加一行 (item_key, ts, price_cents, status)。
+以下查詢全部在 SQL 中完成 (窗口函數)，不把整表載入 Python。
+
+用法:
+    price_history.price_series('house_listings', 'C12654548')
+    price_history.recent_drops('auto_listings', days=7, min_drop_pct=5)
+"""
+
+import time
+from typing import Dict, List
+
+try:
+    from .models import get_read_connection, PRICE_TRACKED_TABLES
+except ImportError:
+    from models import get_read_connection, PRICE_TRACKED_TABLES
+
+
+def _with_connection(conn, func):
+    if conn is not None:
+        return func(conn)
+    conn = get_read_connection()
+    try:
+        return func(conn)
+    finally:
+        conn.close()
+
+
+def _check_table(table: str):
+    if table not in PRICE_TRACKED_TABLES:
+        raise ValueError(f"未記錄價格歷史的表: {table}")
+
+
+def price_series(table: str, item_id: str, conn=None) -> List[Dict]:
+    """單個項目的價格 / 狀態變化序列 (按時間升序，帶相對上一條的變化)"""
+    _check_table(table)
+    sql = """
+        SELECT datetime(h.ts, 'unixepoch') AS changed_at,
+               h.price_cents / 100.0 AS price,
+               h.status,
+               (h.price_cents - LAG(h.price_cents) OVER w) / 100.0 AS change
+        FROM price_items p
+        JOIN price_history h ON h.item_key = p.id
+        WHERE p.item_type = ? AND p.item_id = ?
+        WINDOW w AS (ORDER BY h.ts)
+        ORDER BY h.ts
+    """
+    return _with_connection(
+        conn, lambda c: [dict(row) for row in c.execute(sql, (table, str(item_id))).fetchall()]
+    )
+
+
+def recent_drops(table: str, days: float = 7, min_drop_pct: float = 0,
+                 limit: int = 100, conn=None) -> List[Dict]:
+    """
+    最近降價的項目 (按降幅排序)
+
+    Args:
+        days: 統計最近多少天內發生的降價
+        min_drop_pct: 最小降幅百分比
+    """
+    _check_table(table)
+    key = PRICE_TRACKED_TABLES[table]
+    since = int(time.time() - days * 86400)
+    # 只對窗口期內有變化的項目計算 LAG (走 ts 索引)，避免掃描全表歷史
+    sql = f"""
+        WITH changed AS (
+            SELECT DISTINCT h.item_key
+            FROM price_history h
+            JOIN price_items p ON p.id = h.item_key AND p.item_type = ?
+            WHERE h.ts >= ?
+        ),
+        steps AS (
+            SELECT h.item_key, h.ts, h.price_cents, h.status,
+                   LAG(h.price_cents) OVER (PARTITION BY h.item_key ORDER BY h.ts) AS prev_cents
+            FROM price_history h
+            JOIN changed c ON c.item_key = h.item_key
+        )
+        SELECT p.item_id,
+               t.title,
+               t.url,
+               datetime(s.ts, 'unixepoch') AS changed_at,
+               s.prev_cents / 100.0 AS old_price,
+               s.price_cents / 100.0 AS new_price,
+               ROUND((s.prev_cents - s.price_cents) * 100.0 / s.prev_cents, 1) AS drop_pct
+        FROM steps s
+        JOIN price_items p ON p.id = s.item_key
+        LEFT JOIN {table} t ON t.{key} = p.item_id
+        WHERE s.ts >= ?
+          AND s.status = 1
+          AND s.prev_cents > 0
+          AND s.price_cents < s.prev_cents
+          AND (s.prev_cents - s.price_cents) * 100.0 / s.prev_cents >= ?
+        ORDER BY drop_pct DESC, s.ts DESC
+        LIMIT ?
+    """
+    params = (table, since, since, min_drop_pct, limit)
+    return _with_connection(conn, lambda c: [dict(row) for row in c.execute(sql, params).fetchall()])
+
+
+def change_counts(table: str, days: float = 30, conn=None) -> Dict[str, int]:
+    """最近 N 天的價格變化統計 (漲價 / 降價 / 下架 / 重新上架)"""
+    _check_table(table)
+    since = int(time.time() - days * 86400)
+    sql = """
+        WITH steps AS (
+            SELECT h.ts, h.price_cents, h.status,
+                   LAG(h.price_cents) OVER w AS prev_cents,
+                   LAG(h.status) OVER w AS prev_status
+            FROM price_history h
+            JOIN price_items p ON p.id = h.item_key
+            WHERE p.item_type = ?
+              AND h.item_key IN (SELECT item_key FROM price_history WHERE ts >= ?)
+            WINDOW w AS (PARTITION BY h.item_key ORDER BY h.ts)
+        )
+        SELECT
+            COALESCE(SUM(status = 1 AND prev_status = 1 AND price_cents > prev_cents), 0) AS increases,
+            COALESCE(SUM(status = 1 AND prev_status = 1 AND price_cents < prev_cents), 0) AS drops,
+            COALESCE(SUM(status = 0 AND prev_status = 1), 0) AS removed,
+            COALESCE(SUM(status = 1 AND prev_status = 0), 0) AS relisted
+        FROM steps
+        WHERE ts >= ?
+    """
+    return _with_connection(conn, lambda c: dict(c.execute(sql, (table, since, since)).fetchone()))
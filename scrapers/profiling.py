@@ -0,0 +1,260 @@
+"""
+51.ca 爬蟲 - 性能分析 (--profile 模式)
+採樣分析器輸出 flamegraph 折疊格式 (folded stacks)，
+並按 URL 記錄各階段耗時 (fetch / soup / parse / regex / opencc / save)
+
+用法:
+    with ProfileSession('news'):
+        scraper.run(max_pages=30)
+
+    # 爬蟲代碼內標記階段 (未啟用分析時為空操作)
+    with profiling.track_url(url):
+        with profiling.stage('fetch'):
+            ...
+
+輸出 (logs/ 目錄):
+    profile_<name>_<時間>.folded     - flamegraph.pl / speedscope 可直接讀取
+    profile_<name>_<時間>_urls.txt   - 最慢 URL 及階段明細
+"""
+
+import os
+import sys
+import time
+import heapq
+import threading
+from collections import defaultdict, Counter
+from datetime import datetime
+from typing import Dict
+
+LOG_DIR = os.path.join(os.path.dirname(__file__), "..", "logs")
+
+# 當前啟用的分析會話 (None = 未啟用)
+_session = None
+
+
+class _NullContext:
+    """未啟用分析時使用的空上下文"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullContext()
+
+
+def is_enabled() -> bool:
+    """是否正在進行性能分析"""
+    return _session is not None
+
+
+def stage(name: str):
+    """標記一個處理階段；未啟用分析時幾乎沒有開銷"""
+    session = _session
+    if session is None:
+        return _NULL
+    return _Stage(session, name)
+
+
+def track_url(url: str):
+    """將其中發生的階段耗時歸屬到指定 URL"""
+    session = _session
+    if session is None:
+        return _NULL
+    return _UrlTracker(session, url)
+
+
+class _Stage:
+    """階段計時 (記錄獨佔時間，嵌套階段的時間不重複計算)"""
+    __slots__ = ('session', 'name', 'start', 'child')
+
+    def __init__(self, session, name):
+        self.session = session
+        self.name = name
+
+    def __enter__(self):
+        self.child = 0.0
+        self.session._local_stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = self.session._local_stack()
+        stack.pop()
+        if stack:
+            stack[-1].child += elapsed
+        self.session._add_stage_time(self.name, elapsed - self.child)
+        return False
+
+
+class _UrlTracker:
+    """URL 級別計時"""
+    __slots__ = ('session', 'url', 'start', 'stages', 'previous')
+
+    def __init__(self, session, url):
+        self.session = session
+        self.url = url
+
+    def __enter__(self):
+        local = self.session._local
+        self.previous = getattr(local, 'url_record', None)
+        self.stages = defaultdict(float)
+        local.url_record = self
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        total = time.perf_counter() - self.start
+        self.session._local.url_record = self.previous
+        self.session._add_url(self.url, total, self.stages)
+        return False
+
+
+class ProfileSession:
+    """
+    性能分析會話
+
+    Args:
+        name: 爬蟲名稱 (用於輸出文件名)
+        interval: 採樣間隔 (秒)
+        top_n: 報告中列出最慢的 URL 數量
+        log_dir: 輸出目錄
+    """
+
+    def __init__(self, name: str, interval: float = 0.005, top_n: int = 20,
+                 log_dir: str = LOG_DIR):
+        self.name = name
+        self.interval = interval
+        self.top_n = top_n
+        self.log_dir = log_dir
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._samples = Counter()
+        self._stage_totals = defaultdict(float)
+        self._slowest = []  # 最小堆: (耗時, 序號, url, 階段)
+        self._url_count = 0
+        self._target_thread = None
+        self._sampler = None
+        self._stop_event = threading.Event()
+        self._start_time = None
+        self.output_files = []
+
+    # ============== 生命週期 ==============
+
+    def start(self):
+        """開始分析"""
+        global _session
+        if _session is not None:
+            raise RuntimeError("已有正在進行的性能分析")
+        _session = self
+        self._start_time = time.perf_counter()
+        self._target_thread = threading.get_ident()
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> list:
+        """停止分析並寫出報告，返回輸出文件列表"""
+        global _session
+        self._stop_event.set()
+        if self._sampler:
+            self._sampler.join()
+        _session = None
+        return self._write_reports()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    # ============== 數據收集 ==============
+
+    def _local_stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _add_stage_time(self, name: str, seconds: float):
+        record = getattr(self._local, 'url_record', None)
+        if record is not None:
+            record.stages[name] += seconds
+        with self._lock:
+            self._stage_totals[name] += seconds
+
+    def _add_url(self, url: str, total: float, stages: Dict[str, float]):
+        with self._lock:
+            self._url_count += 1
+            entry = (total, self._url_count, url, dict(stages))
+            if len(self._slowest) < self.top_n:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+
+    def _sample_loop(self):
+        """採樣線程：定期記錄主線程的調用棧"""
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self._target_thread)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.reverse()
+            self._samples[';'.join(stack)] += 1
+
+    # ============== 報告輸出 ==============
+
+    def _write_reports(self) -> list:
+        os.makedirs(self.log_dir, exist_ok=True)
+        prefix = os.path.join(
+            self.log_dir, f"profile_{self.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        )
+
+        folded_path = f"{prefix}.folded"
+        with open(folded_path, 'w', encoding='utf-8') as f:
+            for stack, count in self._samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        report_path = f"{prefix}_urls.txt"
+        elapsed = time.perf_counter() - self._start_time
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(f"爬蟲: {self.name}\n")
+            f.write(f"總耗時: {elapsed:.2f} 秒, URL 數量: {self._url_count}, 採樣數: {sum(self._samples.values())}\n")
+            f.write("\n各階段總耗時 (獨佔時間):\n")
+            for name, seconds in sorted(self._stage_totals.items(), key=lambda x: -x[1]):
+                share = seconds / elapsed * 100 if elapsed else 0
+                f.write(f"  {name:<10} {seconds:>10.3f} 秒  {share:5.1f}%\n")
+
+            f.write(f"\n最慢的 {len(self._slowest)} 個 URL:\n")
+            for total, _, url, stages in sorted(self._slowest, reverse=True):
+                breakdown = ', '.join(
+                    f"{name}={seconds:.3f}" for name, seconds in sorted(stages.items(), key=lambda x: -x[1])
+                )
+                f.write(f"  {total:8.3f}s  {url}\n")
+                if breakdown:
+                    f.write(f"            {breakdown}\n")
+
+        self.output_files = [folded_path, report_path]
+        return self.output_files
+
+
+def run_profiled(name: str, func, *args, top_n: int = 20, **kwargs):
+    """在性能分析下運行函數，報告寫入 logs/"""
+    session = ProfileSession(name, top_n=top_n)
+    session.start()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        files = session.stop()
+        for path in files:
+            print(f"性能分析報告: {os.path.abspath(path)}")
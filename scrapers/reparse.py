@@ -0,0 +1,172 @@
+"""
+51.ca 爬蟲 - 離線重新解析 / 回填
+從原始響應存檔 (scrapers/archive.py) 流式讀取指定爬蟲和時間範圍內的響應，
+在進程池中並行調用 parse_archived，主進程按批次寫入資料庫，全程不訪問網絡。
+
+用法:
+    python -m scrapers.reparse auto --since 2026-01-01
+    python -m scrapers.reparse house --since 2026-01-01 --until 2026-02-01 --workers 8
+    python -m scrapers.reparse news --all-versions     # 默認每個 URL 只取最新一次響應
+    python -m scrapers.reparse market --dry-run        # 只解析不寫入
+"""
+
+import os
+import sys
+import time
+import importlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapers import archive
+from scrapers.base import setup_logger
+from scrapers.models import init_database
+
+# 可重新解析的爬蟲 (名稱 -> 模組, 類名)
+SCRAPERS = {
+    'news': ('scrapers.news_scraper', 'NewsScraper'),
+    'house': ('scrapers.house_scraper', 'HouseScraper'),
+    'market': ('scrapers.market_scraper', 'MarketScraper'),
+    'auto': ('scrapers.auto_scraper', 'AutoScraper'),
+    'event': ('scrapers.event_scraper', 'EventScraper'),
+}
+
+# 每個進程任務包含的響應數
+CHUNK_SIZE = 32
+
+# 每批寫入資料庫的項目數
+DEFAULT_BATCH_SIZE = 500
+
+# 工作進程內的爬蟲實例
+_worker_scraper = None
+
+
+def load_scraper(name: str):
+    """按名稱創建爬蟲實例"""
+    if name not in SCRAPERS:
+        raise ValueError(f"未知爬蟲: {name}")
+    module_name, class_name = SCRAPERS[name]
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)()
+
+
+def _init_worker(name: str):
+    global _worker_scraper
+    _worker_scraper = load_scraper(name)
+
+
+def _parse_chunk(records: List[archive.ArchivedResponse]) -> tuple:
+    """工作進程: 解析一組存檔響應，返回 (項目列表, 錯誤數)"""
+    items = []
+    errors = 0
+    for record in records:
+        try:
+            items.extend(_worker_scraper.parse_archived(record))
+        except Exception as e:
+            _worker_scraper.logger.debug(f"重新解析失敗 {record.url}: {e}")
+            errors += 1
+    return items, errors
+
+
+def _chunks(records: Iterable, size: int):
+    iterator = iter(records)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def reparse(name: str, since: str = None, until: str = None, workers: Optional[int] = None,
+            batch_size: int = DEFAULT_BATCH_SIZE, latest_only: bool = True,
+            dry_run: bool = False) -> Dict[str, int]:
+    """
+    重新解析存檔響應並回填資料庫
+
+    Args:
+        name: 爬蟲名稱 (見 SCRAPERS)
+        since / until: 抓取時間範圍 (如 2026-01-01，含 since 不含 until)
+        workers: 解析進程數 (默認 CPU 核數)
+        batch_size: 每批寫入的項目數
+        latest_only: 每個 URL 只解析最新一次響應
+        dry_run: 只解析不寫入
+
+    Returns:
+        統計 {'records', 'items', 'saved', 'errors'}
+    """
+    logger = setup_logger('reparse')
+    scraper = load_scraper(name)
+    init_database()
+    workers = workers or os.cpu_count() or 1
+
+    records = archive.get_archive().iter_records(
+        scraper=scraper.SCRAPER_NAME, since=since, until=until, latest_only=latest_only
+    )
+    stats = {'records': 0, 'items': 0, 'saved': 0, 'errors': 0}
+    batch = []
+    start = time.perf_counter()
+
+    def flush():
+        if batch and not dry_run:
+            stats['saved'] += scraper.save_items(batch)
+        batch.clear()
+
+    def collect(future):
+        items, errors = future.result()
+        stats['items'] += len(items)
+        stats['errors'] += errors
+        batch.extend(items)
+        if len(batch) >= batch_size:
+            flush()
+
+    logger.info(f"開始重新解析 {name} (範圍: {since or '-'} ~ {until or '-'}, 進程數: {workers})")
+
+    # 按提交順序收集結果，確保同一項目較新的響應後寫入；在途任務數有上限，內存佔用穩定
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(name,)) as pool:
+        in_flight = deque()
+        for chunk in _chunks(records, CHUNK_SIZE):
+            stats['records'] += len(chunk)
+            in_flight.append(pool.submit(_parse_chunk, chunk))
+            if len(in_flight) >= workers * 4:
+                collect(in_flight.popleft())
+        while in_flight:
+            collect(in_flight.popleft())
+    flush()
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"重新解析完成: 響應 {stats['records']}, 項目 {stats['items']}, "
+        f"保存 {stats['saved']}, 錯誤 {stats['errors']}, 耗時 {elapsed:.1f} 秒"
+    )
+    return stats
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='從原始響應存檔重新解析並回填資料庫')
+    parser.add_argument('scraper', choices=sorted(SCRAPERS), help='爬蟲名稱')
+    parser.add_argument('--since', help='起始抓取時間 (如 2026-01-01)')
+    parser.add_argument('--until', help='結束抓取時間 (不含)')
+    parser.add_argument('--workers', type=int, default=None, help='解析進程數 (默認: CPU 核數)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'每批寫入的項目數 (默認: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--all-versions', action='store_true', help='解析每個 URL 的所有歷史響應')
+    parser.add_argument('--dry-run', action='store_true', help='只解析不寫入')
+    args = parser.parse_args()
+
+    reparse(
+        args.scraper,
+        since=args.since,
+        until=args.until,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        latest_only=not args.all_versions,
+        dry_run=args.dry_run,
+    )
+
+
+if __name__ == '__main__':
+    main()
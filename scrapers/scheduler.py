@@ -0,0 +1,281 @@
+"""
+51.ca 爬蟲 - 按產出調度 URL 優先級
+入隊的優先級由觀察到的產出計算，取代固定的 1 (起始頁) / 5 (詳情頁) 和手工改 priority 的腳本:
+
+    產出       每次抓取的新項目數 + LINK_WEIGHT * 新發現的 URL 數，按 URL 模式和來源頁分別累計
+               (每次更新先乘 DECAY，近期的抓取為主)
+    預期產出   URL 模式的產出率 (以 PRIOR_YIELD 為先驗)，再以它為先驗平滑來源頁 (子頁面) 的產出率
+    分數       YIELD_WEIGHT * 預期產出 - DEPTH_WEIGHT * 深度
+    排隊時長   寫入的 priority = 分數 - AGE_WEIGHT * 入隊時刻 (小時)，相當於每排隊一小時加 AGE_WEIGHT 分；
+               已入隊的優先級不需隨時間更新，frontier 照舊按 priority 索引 / 堆 / 有序集合取出，不重新排序
+
+URL 模式: 主機 + 路徑 (數字段為 #，前 PATTERN_SEGMENTS 段之後的其他段為 *) + 查詢參數名，
+例如 www.51.ca/autos/used-cars/# 、 www.51.ca/autos/used-cars?page
+
+產出統計存於 crawl_yield 表。已入隊 URL 的優先級只在入隊時計算，產出變化較大後可重新計分:
+
+    python -m scrapers.scheduler auto --stats
+    python -m scrapers.scheduler auto --rescore
+"""
+
+import re
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl
+
+try:
+    from .models import get_connection
+except ImportError:
+    from models import get_connection
+
+# 新發現的 URL 折算為新項目的比例 (列表頁的產出)
+LINK_WEIGHT = 0.1
+
+# 每次更新時舊統計的保留比例
+DECAY = 0.98
+
+# 沒有統計時的預期產出，及先驗相當於的抓取次數
+PRIOR_YIELD = 0.5
+PRIOR_FETCHES = 5
+
+# 分數權重
+YIELD_WEIGHT = 10
+DEPTH_WEIGHT = 1
+AGE_WEIGHT = 0.5
+
+# 排隊時長的起點 (priority 中的時間項相對此時刻)
+AGE_EPOCH = datetime(2026, 1, 1).timestamp()
+
+# URL 模式保留的路徑段數
+PATTERN_SEGMENTS = 2
+
+
+def url_pattern(url: str) -> str:
+    """URL 歸類為模式 (同一模式的頁面產出相近)"""
+    parts = urlsplit(url)
+    segments = []
+    for index, segment in enumerate(s for s in parts.path.split('/') if s):
+        if re.fullmatch(r'\d+', segment):
+            segments.append('#')
+        elif index < PATTERN_SEGMENTS:
+            segments.append(re.sub(r'\d+', '#', segment))
+        else:
+            segments.append('*')
+    pattern = f"{parts.netloc}/{'/'.join(segments)}"
+    keys = sorted({key for key, _ in parse_qsl(parts.query, keep_blank_values=True)})
+    return f"{pattern}?{'&'.join(keys)}" if keys else pattern
+
+
+def age_offset(now: Optional[float] = None) -> float:
+    """入隊時刻對應的排隊時長扣分"""
+    return AGE_WEIGHT * ((now or time.time()) - AGE_EPOCH) / 3600
+
+
+class Scheduler:
+    """
+    單個爬蟲 (url_type) 的調度器；計算優先級後交給 frontier 入隊
+
+    用法:
+        added = scheduler.enqueue(urls, source_url=list_url)
+        scheduler.record(url, new_items=1)              # 詳情頁
+        scheduler.record(list_url, new_links=added)     # 列表頁
+    """
+
+    def __init__(self, queue, url_type: str):
+        self.queue = queue
+        self.url_type = url_type
+        self._lock = threading.Lock()
+        self._stats = None      # (kind, key) -> [fetches, yield]，首次使用時載入
+        self._depths = {}       # url -> 深度 (本進程已知的)
+        self._saved_depths = set()
+
+    # ============== 入隊 ==============
+
+    def enqueue(self, urls: Iterable[str], source_url: Optional[str] = None) -> int:
+        """按預期產出入隊 (source_url 為空表示起始頁)，返回新加入的數量"""
+        groups = self._group(((url, None) for url in urls), source_url)
+        added = 0
+        for priority, entries in groups.items():
+            added += self.queue.add_many([url for url, _ in entries], self.url_type,
+                                         source_url=source_url, priority=priority)
+        return added
+
+    def enqueue_discovered(self, entries: Iterable[Tuple[str, Optional[str]]],
+                           source_url: Optional[str] = None) -> int:
+        """sitemap / feed 發現的 (URL, lastmod) 入隊，返回新加入或重新入隊的數量"""
+        added = 0
+        for priority, group in self._group(entries, source_url).items():
+            added += self.queue.add_discovered(group, self.url_type, source_url=source_url,
+                                               priority=priority)
+        return added
+
+    def priority(self, url: str, source_url: Optional[str] = None, depth: int = 0,
+                 now: Optional[float] = None) -> float:
+        return round(self.score(url, source_url, depth) - age_offset(now), 2)
+
+    def score(self, url: str, source_url: Optional[str] = None, depth: int = 0) -> float:
+        return YIELD_WEIGHT * self.expected_yield(url, source_url) - DEPTH_WEIGHT * depth
+
+    def expected_yield(self, url: str, source_url: Optional[str] = None) -> float:
+        with self._lock:
+            stats = self._load()
+            fetches, total = stats.get(('pattern', url_pattern(url)), (0, 0))
+            estimate = (total + PRIOR_YIELD * PRIOR_FETCHES) / (fetches + PRIOR_FETCHES)
+            if source_url:
+                fetches, total = stats.get(('source', source_url), (0, 0))
+                estimate = (total + estimate * PRIOR_FETCHES) / (fetches + PRIOR_FETCHES)
+        return estimate
+
+    def _group(self, entries, source_url) -> Dict[float, List]:
+        """同一優先級的 URL 一起入隊 (同一頁的 URL 多數屬於少數幾個模式)"""
+        depth = self.depth(source_url) + 1 if source_url else 0
+        now = time.time()
+        groups = {}
+        for url, lastmod in dict(entries).items():
+            priority = self.priority(url, source_url, depth, now)
+            groups.setdefault(priority, []).append((url, lastmod))
+        if source_url and groups:
+            self._remember_depth(source_url, depth - 1)
+        return groups
+
+    # ============== 產出統計 ==============
+
+    def record(self, url: str, new_items: int = 0, new_links: int = 0):
+        """記錄一次抓取的產出 (計入 URL 模式和其來源頁)"""
+        value = new_items + LINK_WEIGHT * new_links
+        source_url = self.queue.source_of(url)
+        keys = [('pattern', url_pattern(url))]
+        if source_url:
+            keys.append(('source', source_url))
+        conn = get_connection()
+        try:
+            conn.executemany(f"""
+                INSERT INTO crawl_yield (url_type, kind, key, fetches, yield, updated_at)
+                VALUES (?, ?, ?, 1, ?, ?)
+                ON CONFLICT (url_type, kind, key) DO UPDATE SET
+                    fetches = fetches * {DECAY} + 1,
+                    yield = yield * {DECAY} + excluded.yield,
+                    updated_at = excluded.updated_at
+            """, [(self.url_type, kind, key, value, time.time()) for kind, key in keys])
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            stats = self._load()
+            for key in keys:
+                fetches, total = stats.get(key, (0, 0))
+                stats[key] = (fetches * DECAY + 1, total * DECAY + value)
+
+    def depth(self, url: str) -> int:
+        """URL 距起始頁的層數 (來源頁的深度 + 1)"""
+        if url in self._depths:
+            return self._depths[url]
+        source_url = self.queue.source_of(url)
+        if not source_url:
+            depth = 0
+        else:
+            conn = get_connection()
+            try:
+                row = conn.execute("""
+                    SELECT depth FROM crawl_yield WHERE url_type = ? AND kind = 'source' AND key = ?
+                """, (self.url_type, source_url)).fetchone()
+            finally:
+                conn.close()
+            depth = row['depth'] + 1 if row and row['depth'] is not None else 1
+        self._depths[url] = depth
+        return depth
+
+    def _remember_depth(self, source_url: str, depth: int):
+        """記下來源頁的深度，之後從其子頁面推算深度"""
+        if source_url in self._saved_depths:
+            return
+        self._depths[source_url] = depth
+        self._saved_depths.add(source_url)
+        conn = get_connection()
+        try:
+            conn.execute("""
+                INSERT INTO crawl_yield (url_type, kind, key, depth, updated_at)
+                VALUES (?, 'source', ?, ?, ?)
+                ON CONFLICT (url_type, kind, key) DO UPDATE SET depth = excluded.depth
+            """, (self.url_type, source_url, depth, time.time()))
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self._load().setdefault(('source', source_url), (0, 0))
+
+    def _load(self) -> Dict:
+        if self._stats is None:
+            conn = get_connection()
+            try:
+                rows = conn.execute("""
+                    SELECT kind, key, fetches, yield FROM crawl_yield WHERE url_type = ?
+                """, (self.url_type,)).fetchall()
+            finally:
+                conn.close()
+            self._stats = {(row['kind'], row['key']): (row['fetches'], row['yield']) for row in rows}
+        return self._stats
+
+    # ============== 重新計分 / 報告 ==============
+
+    def rescore(self) -> int:
+        """
+        按當前產出統計重新計算待爬 URL 的優先級，返回更新數量
+        (舊版固定優先級的隊列需運行一次；重新計分後排隊時長從此刻起算)
+        """
+        now = time.time()
+        priorities = {}
+        for url, source_url in self.queue.pending(self.url_type):
+            depth = self.depth(source_url) + 1 if source_url else 0
+            priorities[url] = self.priority(url, source_url, depth, now)
+        self.queue.reprioritize(priorities)
+        return len(priorities)
+
+    def report(self, limit: int = 20) -> List[Dict]:
+        """各 URL 模式的產出率 (按預期產出倒序)"""
+        with self._lock:
+            stats = dict(self._load())
+        rows = []
+        for (kind, key), (fetches, total) in stats.items():
+            if kind != 'pattern':
+                continue
+            rows.append({
+                'pattern': key,
+                'fetches': round(fetches, 1),
+                'yield': round(total / fetches, 3) if fetches else None,
+                'expected': round((total + PRIOR_YIELD * PRIOR_FETCHES) / (fetches + PRIOR_FETCHES), 3),
+            })
+        rows.sort(key=lambda r: r['expected'], reverse=True)
+        return rows[:limit]
+
+
+def main():
+    import argparse
+    try:
+        from .models import init_database
+        from . import frontier
+    except ImportError:
+        from models import init_database
+        import frontier
+
+    parser = argparse.ArgumentParser(description='按產出調度 URL 優先級')
+    parser.add_argument('url_type', help='URL 類型 (news / house / auto / event ...)')
+    parser.add_argument('--stats', action='store_true', help='列出各 URL 模式的產出率')
+    parser.add_argument('--rescore', action='store_true', help='按當前產出重新計算待爬 URL 的優先級')
+    args = parser.parse_args()
+
+    init_database()
+    scheduler = Scheduler(frontier.get_frontier(), args.url_type)
+    if args.rescore:
+        print(f"已重新計分 {scheduler.rescore()} 個待爬 URL")
+    if args.stats or not args.rescore:
+        print(f"{'URL 模式':<50} {'抓取':>8} {'產出率':>8} {'預期':>8}")
+        for row in scheduler.report():
+            rate = '-' if row['yield'] is None else row['yield']
+            print(f"{row['pattern']:<50} {row['fetches']:>8} {rate:>8} {row['expected']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,399 @@
+"""
+51.ca 爬蟲 - 資料表聲明式定義
+每個資料表只在這裡定義一次 (欄位、類型、取值來源、轉換、是否做繁體轉換)，由此生成:
+- init_database 使用的 CREATE TABLE (見 models.init_database)
+- 批量 upsert 語句 (INSERT ... ON CONFLICT DO UPDATE，保留原 id / scraped_at，刷新 updated_at)
+
+各爬蟲只需聲明 SCHEMA，保存統一經 BatchWriter：一批項目一次 executemany、一次提交。
+
+用法:
+    writer = BatchWriter(schema.AUTO_LISTINGS, to_traditional=scraper.to_traditional)
+    writer.write(items)
+"""
+
+import json
+import logging
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Union
+
+try:
+    from .models import get_connection
+    from .normalized import sync_children, CHILD_FIELDS
+except ImportError:
+    from models import get_connection
+    from normalized import sync_children, CHILD_FIELDS
+
+
+logger = logging.getLogger(__name__)
+
+
+class Field(NamedTuple):
+    """
+    資料表欄位
+
+    Args:
+        name: 欄位名
+        type: SQL 類型聲明 (可帶 UNIQUE / DEFAULT)
+        source: 項目字典中的鍵 (默認同欄位名)，或 callable(項目) -> 值
+        default: 取值為 None 時的默認值
+        convert: 寫入前的轉換
+        traditional: 是否做簡繁轉換
+        write: False 表示只建欄位，爬蟲不寫入
+    """
+    name: str
+    type: str = 'TEXT'
+    source: Union[str, Callable, None] = None
+    default: Any = None
+    convert: Optional[Callable] = None
+    traditional: bool = False
+    write: bool = True
+
+    def value(self, data: Dict, to_traditional: Optional[Callable] = None):
+        source = self.source or self.name
+        value = source(data) if callable(source) else data.get(source)
+        if value is None:
+            value = self.default
+        if self.convert is not None and value is not None:
+            value = self.convert(value)
+        if self.traditional and value and to_traditional is not None:
+            value = to_traditional(value)
+        return value
+
+
+class TableSchema:
+    """
+    資料表定義
+
+    Args:
+        table: 表名
+        key: 業務主鍵 (upsert 衝突判斷欄位)
+        fields: 欄位列表 (按建表順序)
+        auto_id: 是否帶自增 id 主鍵
+        timestamps: 是否帶 scraped_at / updated_at (更新時自動刷新 updated_at)
+    """
+
+    def __init__(self, table: str, key: str, fields: List[Field],
+                 auto_id: bool = True, timestamps: bool = True):
+        self.table = table
+        self.key = key
+        self.fields = fields
+        self.auto_id = auto_id
+        self.timestamps = timestamps
+        self.write_fields = [f for f in fields if f.write]
+        self.columns = [f.name for f in self.write_fields]
+        self.key_index = self.columns.index(key)
+        self.upsert_sql = self._build_upsert()
+
+    def ddl(self) -> str:
+        """CREATE TABLE 語句"""
+        columns = ['id INTEGER PRIMARY KEY AUTOINCREMENT'] if self.auto_id else []
+        columns += [f"{f.name} {f.type}" for f in self.fields]
+        if self.timestamps:
+            columns += ['scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP',
+                        'updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP']
+        body = ',\n            '.join(columns)
+        return f"CREATE TABLE IF NOT EXISTS {self.table} (\n            {body}\n        )"
+
+    def column_types(self) -> Dict[str, str]:
+        """可用 ALTER TABLE 補上的欄位 (舊資料庫遷移用，不含主鍵 / 唯一鍵)"""
+        return {f.name: f.type for f in self.fields
+                if f.name != self.key and 'PRIMARY KEY' not in f.type and 'UNIQUE' not in f.type}
+
+    def _build_upsert(self) -> str:
+        # 生成一次後按相同文本執行，sqlite3 連接內的語句緩存會複用已編譯的語句
+        updates = [f"{c} = excluded.{c}" for c in self.columns if c != self.key]
+        if self.timestamps:
+            updates.append("updated_at = CURRENT_TIMESTAMP")
+        return (
+            f"INSERT INTO {self.table} ({', '.join(self.columns)}) "
+            f"VALUES ({', '.join('?' * len(self.columns))}) "
+            f"ON CONFLICT({self.key}) DO UPDATE SET {', '.join(updates)}"
+        )
+
+    def row(self, data: Dict, to_traditional: Optional[Callable] = None) -> tuple:
+        """項目字典 -> upsert 參數"""
+        return tuple(f.value(data, to_traditional) for f in self.write_fields)
+
+
+# ============== 取值 / 轉換輔助 ==============
+
+def _flag(value) -> int:
+    return 1 if value else 0
+
+
+def _json(value):
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def _promotion(name: str) -> Callable:
+    """auto promotions (dict 或 JSON 文本) 中的單個標籤"""
+    def get(data: Dict):
+        promotions = data.get('promotions') or {}
+        if isinstance(promotions, str):
+            try:
+                promotions = json.loads(promotions)
+            except ValueError:
+                promotions = {}
+        return promotions.get(name, 0)
+    return get
+
+
+# ============== 資料表 ==============
+
+NEWS_ARTICLES = TableSchema('news_articles', 'article_id', [
+    Field('article_id', 'TEXT UNIQUE'),
+    Field('url', 'TEXT NOT NULL'),
+    Field('title', default='', traditional=True),
+    Field('summary', default='', traditional=True),
+    Field('content', default='', traditional=True),
+    Field('category'),
+    Field('author', traditional=True),
+    Field('source', traditional=True),
+    Field('publish_date', 'TIMESTAMP'),
+    Field('comment_count', 'INTEGER DEFAULT 0'),
+    Field('view_count', 'INTEGER DEFAULT 0'),
+    Field('image_urls'),
+    Field('tags'),
+])
+
+HOUSE_LISTINGS = TableSchema('house_listings', 'listing_id', [
+    Field('listing_id', 'TEXT UNIQUE'),
+    Field('url', 'TEXT NOT NULL'),
+    Field('title', traditional=True),
+    Field('listing_type'),
+    Field('property_type'),
+    Field('price', 'REAL'),
+    Field('price_unit'),
+    Field('address', traditional=True),
+    Field('city'),
+    Field('province'),
+    Field('community', traditional=True),
+    Field('postal_code'),
+    Field('bedrooms'),
+    Field('dens'),
+    Field('bathrooms'),
+    Field('parking'),
+    Field('sqft'),
+    Field('description', traditional=True),
+    Field('features'),
+    Field('agent_name'),
+    Field('agent_phone'),
+    Field('agent_company'),
+    Field('image_urls'),
+    Field('amenities', write=False),
+    Field('listing_date', 'TIMESTAMP'),
+    Field('lat', 'REAL'),
+    Field('lon', 'REAL'),
+    Field('detail_fetched_at', 'TIMESTAMP'),
+    Field('canonical_id', 'INTEGER', write=False),   # 實體 id (entity_resolution.py 寫入)
+])
+
+MARKET_POSTS = TableSchema('market_posts', 'post_id', [
+    Field('post_id', 'TEXT UNIQUE'),
+    Field('url', 'TEXT NOT NULL', default=''),
+    Field('title', default='', traditional=True),
+    Field('description', default='', traditional=True),
+    Field('format_price', default=''),
+    Field('price', 'REAL', default=0),
+    Field('original_price', 'REAL'),
+    Field('negotiable', 'INTEGER DEFAULT 0', default=0, convert=_flag),
+    Field('condition', 'INTEGER', default=0),
+    Field('category_id', 'INTEGER'),
+    Field('category_name', default='', traditional=True),
+    Field('category_slug', default=''),
+    Field('location_id', 'INTEGER'),
+    Field('location_zh', default='', traditional=True),
+    Field('location_en', default=''),
+    Field('pickup_methods'),
+    Field('contact_phone', default=''),
+    Field('email', default=''),
+    Field('wechat_no', default=''),
+    Field('wechat_qrcode', default=''),
+    Field('photos'),
+    Field('user_uid', 'INTEGER'),
+    Field('user_name', default='', traditional=True),
+    Field('user_avatar', default=''),
+    Field('favorite_count', 'INTEGER DEFAULT 0', default=0),
+    Field('published_at', 'TIMESTAMP', default=''),
+    Field('source', default='market'),
+    Field('detail_fetched_at', 'TIMESTAMP'),
+    Field('canonical_id', 'INTEGER', write=False),
+])
+
+AUTO_LISTINGS = TableSchema('auto_listings', 'listing_id', [
+    Field('listing_id', 'TEXT UNIQUE'),
+    Field('url', 'TEXT NOT NULL'),
+    Field('title', traditional=True),
+    Field('listing_type'),
+    Field('make'),
+    Field('model'),
+    Field('year', 'INTEGER'),
+    Field('trim', write=False),
+    Field('body_type', traditional=True),
+    Field('color', traditional=True),
+    Field('transmission'),
+    Field('drivetrain'),
+    Field('fuel_type'),
+    Field('kilometers', 'INTEGER', source='mileage'),
+    Field('price', 'REAL'),
+    Field('currency', "TEXT DEFAULT 'CAD'", write=False),
+    Field('city', source='location', traditional=True),
+    Field('province', write=False),
+    Field('dealer_name', source='seller_name', traditional=True),
+    Field('dealer_address', write=False),
+    Field('dealer_phone', source='contact_phone'),
+    Field('vin'),
+    Field('carfax_available', 'INTEGER DEFAULT 0', write=False),
+    Field('features', traditional=True),
+    Field('description', traditional=True),
+    Field('images', source='image_urls'),
+    Field('promo_same_day_approval', 'INTEGER DEFAULT 0', source=_promotion('same_day_approval')),
+    Field('promo_no_credit_ok', 'INTEGER DEFAULT 0', source=_promotion('no_credit_ok')),
+    Field('promo_no_job_ok', 'INTEGER DEFAULT 0', source=_promotion('no_job_ok')),
+    Field('promo_delivery_available', 'INTEGER DEFAULT 0', source=_promotion('delivery_available')),
+    Field('promo_warranty_available', 'INTEGER DEFAULT 0', source=_promotion('warranty_available')),
+    Field('post_date', 'TIMESTAMP'),
+    Field('canonical_id', 'INTEGER', write=False),
+])
+
+EVENTS = TableSchema('events', 'event_id', [
+    Field('event_id', 'TEXT UNIQUE'),
+    Field('url', 'TEXT NOT NULL'),
+    Field('title', traditional=True),
+    Field('event_type'),
+    Field('image_url', write=False),
+    Field('time_text', write=False),
+    Field('location', traditional=True),
+    Field('start_time', 'TIMESTAMP'),
+    Field('end_time', 'TIMESTAMP'),
+    Field('region', source='location', traditional=True),
+    Field('contact_person', traditional=True),
+    Field('contact_phone'),
+    Field('contact_email'),
+    Field('address', traditional=True),
+    Field('content', source='description', traditional=True),
+    Field('content_images', source='image_urls'),
+    Field('published_at', 'TIMESTAMP'),
+    Field('source', traditional=True),
+])
+
+# 工作 API 自帶 id / created_at / updated_at，不使用自增 id 與自動時間戳
+JOBS = TableSchema('jobs', 'id', [
+    Field('id', 'INTEGER PRIMARY KEY'),
+    Field('title', default=''),
+    Field('content', default=''),
+    Field('salary', default=''),
+    Field('location', default=''),
+    Field('address', default=''),
+    Field('category', default=''),
+    Field('publisher', default=''),
+    Field('phone', default=''),
+    Field('url', default=''),
+    Field('tags', default=[], convert=_json),
+    Field('view_count', 'INTEGER DEFAULT 0', default=0),
+    Field('is_recommended', 'BOOLEAN DEFAULT 0', default=0, convert=_flag),
+    Field('created_at', default=''),
+    Field('updated_at', default=''),
+    Field('scraped_at', source=lambda data: datetime.now().isoformat()),
+    Field('raw_data', source=lambda data: _json(data['raw_data']) if data.get('raw_data') else ''),
+], auto_id=False, timestamps=False)
+
+# init_database 按此順序建表
+TABLES = [NEWS_ARTICLES, HOUSE_LISTINGS, MARKET_POSTS, AUTO_LISTINGS, EVENTS, JOBS]
+
+
+# ============== 批量寫入 ==============
+
+@contextmanager
+def _savepoint(conn, name: str = 'batch_writer'):
+    conn.execute(f"SAVEPOINT {name}")
+    try:
+        yield
+    except Exception:
+        conn.execute(f"ROLLBACK TO {name}")
+        conn.execute(f"RELEASE {name}")
+        raise
+    conn.execute(f"RELEASE {name}")
+
+
+class BatchWriter:
+    """
+    按 TableSchema 批量 upsert
+    一批項目: 一次 executemany + 子表同步 + 一次提交；
+    批內有壞行時回滾該批並逐行重試，只跳過出錯的項目
+
+    Args:
+        schema: 資料表定義
+        to_traditional: 簡繁轉換函數 (爬蟲的 to_traditional)
+    """
+
+    def __init__(self, schema: TableSchema, to_traditional: Optional[Callable] = None,
+                 log: logging.Logger = None):
+        self.schema = schema
+        self.to_traditional = to_traditional
+        self.logger = log or logger
+        # 需要同步到子表的列表欄位 -> 參數位置
+        self._child_columns = {
+            column: schema.columns.index(column)
+            for column in CHILD_FIELDS.get(schema.table, {})
+            if column in schema.columns
+        }
+
+    def write(self, items: List[Dict], before_commit: Optional[Callable] = None) -> int:
+        """
+        寫入一批項目，返回成功數量
+
+        Args:
+            before_commit: callable(conn)，在同一事務中提交前執行 (如記錄分頁斷點)；
+                           沒有可寫的項目時仍會執行
+        """
+        rows = []
+        for data in items:
+            try:
+                rows.append(self.schema.row(data, self.to_traditional))
+            except Exception as e:
+                self.logger.error(f"轉換 {self.schema.table} 項目失敗: {e}")
+        if not rows and before_commit is None:
+            return 0
+
+        conn = get_connection()
+        try:
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            saved = self._write_rows(conn, rows) if rows else 0
+            if before_commit is not None:
+                before_commit(conn)
+            conn.commit()
+        finally:
+            conn.close()
+        return saved
+
+    def _execute(self, conn, rows: List[tuple]):
+        conn.executemany(self.schema.upsert_sql, rows)
+        if self._child_columns:
+            for row in rows:
+                sync_children(conn, self.schema.table, row[self.schema.key_index], {
+                    column: row[index] for column, index in self._child_columns.items()
+                })
+
+    def _write_rows(self, conn, rows: List[tuple]) -> int:
+        try:
+            with _savepoint(conn):
+                self._execute(conn, rows)
+            return len(rows)
+        except sqlite3.Error as e:
+            if len(rows) == 1:
+                self.logger.error(f"保存 {self.schema.table} 失敗: {e}")
+                return 0
+
+        saved = 0
+        for row in rows:
+            try:
+                with _savepoint(conn):
+                    self._execute(conn, [row])
+                saved += 1
+            except sqlite3.Error as e:
+                self.logger.error(f"保存 {self.schema.table} 失敗 ({row[self.schema.key_index]}): {e}")
+        return saved
@@ -0,0 +1,205 @@
+"""
+51.ca 爬蟲 - 分庫與統一讀視圖
+開啟分庫後 (環境變量 SCRAPER_DB_SHARDS=1 或 run.py --shards)，每個爬蟲寫入自己的資料庫文件
+scrapers/data/shards/<爬蟲>.db: 爬蟲資料表 + 自己的 url_queue / 斷點 / 價格歷史 ...
+並行運行的爬蟲不再爭用同一個寫鎖，單個爬蟲的數據也可以單獨刪除或重建。
+
+讀取端 (查看器 / 統計 / 導出) 用 open_read_view(): 在主庫上 ATTACH 全部分庫，
+為每個出現在分庫中的表建立同名 TEMP VIEW (主庫 + 各分庫 UNION ALL，缺少的欄位補 NULL)，
+原有查詢語句不需要修改:
+
+    conn = models.get_read_connection()
+    conn.execute("SELECT COUNT(*) FROM house_listings")   # 主庫 + house 分庫
+
+各分庫的自增 id 從 分庫序號 * SHARD_ID_STRIDE 開始 (見 models.init_database)，合併後不衝突；
+非自增的 price_items.id / price_history.item_key 在視圖中加上同樣的偏移。
+
+導出:
+    python -m scrapers.shards --list
+    python -m scrapers.shards --export house_listings --format csv --output houses.csv
+    python -m scrapers.shards --export house_listings --distinct    # 同一實體只導出一行
+"""
+
+import os
+import csv
+import sys
+import json
+import glob
+import sqlite3
+import argparse
+from typing import Dict, List, Optional
+
+try:
+    from . import models
+except ImportError:
+    import models
+
+# SQLite 默認最多 ATTACH 10 個資料庫
+MAX_ATTACHED = 10
+
+# 非自增的 id 欄位: 合併時加上分庫的 id 起點
+OFFSET_COLUMNS = {
+    'price_items': ('id',),
+    'price_history': ('item_key',),
+}
+
+
+def shard_files(shard_dir: Optional[str] = None) -> Dict[str, str]:
+    """已存在的分庫文件: 分庫名 -> 路徑"""
+    shard_dir = shard_dir or models.SHARD_DIR
+    paths = sorted(glob.glob(os.path.join(shard_dir, '*.db')))
+    return {os.path.splitext(os.path.basename(path))[0]: path for path in paths}
+
+
+def open_read_view(main_path: Optional[str] = None, shard_dir: Optional[str] = None) -> sqlite3.Connection:
+    """
+    打開主庫並合併全部分庫 (沒有分庫文件時即普通連接)
+
+    Returns:
+        sqlite3.Connection (row_factory = sqlite3.Row)，只用於查詢
+    """
+    main_path = main_path or models.DB_PATH
+    shards = shard_files(shard_dir)
+    if len(shards) > MAX_ATTACHED:
+        raise ValueError(f"分庫數量 {len(shards)} 超過 SQLite ATTACH 上限 {MAX_ATTACHED}")
+
+    os.makedirs(os.path.dirname(main_path), exist_ok=True)
+    conn = sqlite3.connect(main_path)
+    conn.row_factory = sqlite3.Row
+    if not shards:
+        return conn
+
+    schemas = [('main', 0)]
+    for index, (name, path) in enumerate(shards.items()):
+        alias = f"shard_{index}"
+        conn.execute("ATTACH DATABASE ? AS " + alias, (path,))
+        schemas.append((alias, models.shard_id_base(name)))
+
+    for table, columns in _merged_tables(conn, schemas).items():
+        _create_view(conn, table, columns, schemas)
+    return conn
+
+
+def _tables(conn, schema: str) -> List[str]:
+    """schema 中的資料表 (不含 sqlite 內部表和 R-tree 影子表)"""
+    rows = conn.execute(f"SELECT name, sql FROM {schema}.sqlite_master WHERE type = 'table'").fetchall()
+    virtual = [row['name'] for row in rows
+               if (row['sql'] or '').upper().startswith('CREATE VIRTUAL TABLE')]
+    shadow = {f"{name}_{suffix}" for name in virtual for suffix in ('node', 'rowid', 'parent')}
+    return [row['name'] for row in rows
+            if not row['name'].startswith('sqlite_') and row['name'] not in shadow]
+
+
+def _merged_tables(conn, schemas) -> Dict[str, Dict[str, List[str]]]:
+    """表名 -> {schema: 欄位列表}，只保留出現在分庫中的表"""
+    tables = {}
+    for schema, _ in schemas:
+        for table in _tables(conn, schema):
+            columns = [row['name'] for row in conn.execute(f'PRAGMA {schema}.table_info("{table}")')]
+            tables.setdefault(table, {})[schema] = columns
+    return {table: columns for table, columns in tables.items()
+            if any(schema != 'main' for schema in columns)}
+
+
+def _create_view(conn, table: str, columns: Dict[str, List[str]], schemas):
+    # 欄位順序: 首次出現的順序 (主庫優先)，後加的欄位排在後面
+    ordered = []
+    for schema, _ in schemas:
+        for column in columns.get(schema, []):
+            if column not in ordered:
+                ordered.append(column)
+
+    selects = []
+    for schema, base in schemas:
+        if schema not in columns:
+            continue
+        present = set(columns[schema])
+        fields = []
+        for column in ordered:
+            if column not in present:
+                fields.append(f'NULL AS "{column}"')
+            elif base and column in OFFSET_COLUMNS.get(table, ()):
+                fields.append(f'"{column}" + {base} AS "{column}"')
+            else:
+                fields.append(f'"{column}"')
+        selects.append(f'SELECT {", ".join(fields)} FROM {schema}."{table}"')
+
+    # TEMP 視圖優先於同名的主庫表，未限定 schema 的查詢都落在合併視圖上
+    conn.execute(f'CREATE TEMP VIEW "{table}" AS ' + ' UNION ALL '.join(selects))
+
+
+# ============== 導出 ==============
+
+def export(table: str, output, fmt: str = 'jsonl', conn=None, distinct: bool = False) -> int:
+    """
+    把合併後的表導出為 JSON Lines / CSV，返回行數
+    distinct=True 時同一實體只導出代表行 (見 entity_resolution.py)
+    """
+    own = conn is None
+    conn = conn or open_read_view()
+    try:
+        where = ''
+        if distinct:
+            columns = {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+            if 'canonical_id' in columns:
+                try:
+                    from .entity_resolution import primary_rows_sql
+                except ImportError:
+                    from entity_resolution import primary_rows_sql
+                where = f" WHERE {primary_rows_sql(table)}"
+        cursor = conn.execute(f'SELECT * FROM "{table}"{where}')
+        names = [d[0] for d in cursor.description]
+        count = 0
+        if fmt == 'csv':
+            writer = csv.writer(output)
+            writer.writerow(names)
+            for row in cursor:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in cursor:
+                output.write(json.dumps(dict(zip(names, row)), ensure_ascii=False, default=str) + '\n')
+                count += 1
+        return count
+    finally:
+        if own:
+            conn.close()
+
+
+def _main():
+    parser = argparse.ArgumentParser(description='分庫列表 / 合併導出')
+    parser.add_argument('--list', action='store_true', help='列出分庫文件及各表行數')
+    parser.add_argument('--export', metavar='TABLE', help='導出合併後的表')
+    parser.add_argument('--format', choices=('jsonl', 'csv'), default='jsonl', help='導出格式 (默認: jsonl)')
+    parser.add_argument('--output', help='輸出文件 (默認: 標準輸出)')
+    parser.add_argument('--distinct', action='store_true', help='同一實體只導出代表行')
+    args = parser.parse_args()
+
+    if args.export:
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8', newline='') as f:
+                count = export(args.export, f, args.format, distinct=args.distinct)
+            print(f"已導出 {count} 行到 {args.output}")
+        else:
+            export(args.export, sys.stdout, args.format, distinct=args.distinct)
+        return
+
+    shards = shard_files()
+    if not shards:
+        print(f"沒有分庫文件 ({models.SHARD_DIR})")
+        return
+    for name, path in shards.items():
+        print(f"{name}: {path} (id 起點 {models.shard_id_base(name)})")
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        try:
+            for table in sorted(_tables(conn, 'main')):
+                count = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+                if count:
+                    print(f"  {table}: {count}")
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    _main()
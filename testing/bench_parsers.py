@@ -0,0 +1,108 @@
+"""
+對比 HTML 解析後端 (selectolax / lxml / BeautifulSoup) 的速度
+對 downloaded_data/ 和 testing/ 下的 HTML 樣本，分別計時:
+  - parse: 只構建文檔
+  - news / auto / event: 構建文檔 + 列表頁和詳情頁解析
+
+用法:
+    python testing/bench_parsers.py
+    python testing/bench_parsers.py --rounds 10 --backend selectolax --backend bs4
+"""
+
+import sys
+import os
+import glob
+import time
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scrapers import html_parser
+from scrapers.news_scraper import NewsScraper
+from scrapers.auto_scraper import AutoScraper
+from scrapers.event_scraper import EventScraper
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (爬蟲, 列表頁 URL, 詳情頁 URL)
+SCRAPERS = [
+    ('news', NewsScraper, 'https://info.51.ca/', 'https://info.51.ca/articles/1500533'),
+    ('auto', AutoScraper, 'https://www.51.ca/autos/used-cars', 'https://www.51.ca/autos/used-cars/123456'),
+    ('event', EventScraper, 'https://info.51.ca/events', 'https://info.51.ca/events/posts/12345'),
+]
+
+
+def load_samples():
+    """讀取 HTML 樣本"""
+    paths = sorted(glob.glob(os.path.join(ROOT, 'downloaded_data', '*.html')) +
+                   glob.glob(os.path.join(ROOT, 'testing', '*.html')))
+    samples = []
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            samples.append((os.path.basename(path), f.read()))
+    return samples
+
+
+def make_scraper(cls, backend):
+    """構建爬蟲實例 (不啟動瀏覽器)"""
+    scraper = cls(use_browser=False)
+    scraper.HTML_BACKEND = backend
+    scraper.logger.setLevel(logging.WARNING)
+    return scraper
+
+
+def timed(func, rounds):
+    """執行 rounds 次，返回平均毫秒"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) * 1000 / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTML 解析後端性能對比')
+    parser.add_argument('--rounds', type=int, default=5, help='每項重複次數')
+    parser.add_argument('--backend', action='append', choices=html_parser.BACKENDS,
+                        help='只測試指定後端 (可重複)')
+    args = parser.parse_args()
+
+    backends = [b for b in (args.backend or html_parser.BACKENDS)
+                if b in html_parser.available_backends()]
+    samples = load_samples()
+    total_kb = sum(len(html.encode('utf-8')) for _, html in samples) / 1024
+    print(f"樣本: {len(samples)} 個 HTML, 共 {total_kb:.0f} KB, 每項 {args.rounds} 輪")
+    print(f"後端: {', '.join(backends)}\n")
+
+    columns = ['parse'] + [name for name, *_ in SCRAPERS]
+    results = {}
+    for backend in backends:
+        scrapers = {name: (make_scraper(cls, backend), list_url, detail_url)
+                    for name, cls, list_url, detail_url in SCRAPERS}
+        row = {'parse': 0.0}
+        for name in scrapers:
+            row[name] = 0.0
+        for _, html in samples:
+            row['parse'] += timed(lambda: html_parser.parse_html(html, backend), args.rounds)
+            for name, (scraper, list_url, detail_url) in scrapers.items():
+                def run():
+                    scraper.parse_list_page(html, list_url)
+                    scraper.parse_detail_page(html, detail_url)
+                row[name] += timed(run, args.rounds)
+        results[backend] = row
+
+    # ms / 全部樣本；括號內為相對 BeautifulSoup 的加速比
+    baseline = results.get('bs4')
+    print(f"{'後端':<12}" + ''.join(f"{c:>18}" for c in columns))
+    for backend, row in results.items():
+        cells = []
+        for c in columns:
+            cell = f"{row[c]:.1f}ms"
+            if baseline and backend != 'bs4':
+                cell += f" ({baseline[c] / row[c]:.1f}x)"
+            cells.append(f"{cell:>18}")
+        print(f"{backend:<12}" + ''.join(cells))
+
+
+if __name__ == "__main__":
+    main()
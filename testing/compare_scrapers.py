@@ -11,6 +11,9 @@ from datetime import datetime
 from bs4 import BeautifulSoup
 import requests
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scrapers import archive
+
 
 # ============== 資料庫路徑 ==============
 OLD_DB_PATH = os.path.join(os.path.dirname(__file__), "51ca-old.db")
@@ -131,7 +134,13 @@ class OldStyleScraper:
         })
     
     def fetch(self, url):
-        """獲取頁面"""
+        """獲取頁面 (優先使用本地原始響應存檔，避免重複下載)"""
+        try:
+            cached = archive.get_archive().latest(url)
+            if cached and cached.status == 200:
+                return cached.text
+        except Exception:
+            pass
         try:
             resp = self.session.get(url, timeout=30)
             resp.encoding = 'utf-8'
@@ -10,9 +10,18 @@
     python run.py --list             # 列出所有可用爬蟲
     python run.py --stats            # 顯示資料庫統計
     python run.py --init             # 初始化資料庫
+    python run.py --news --profile   # 性能分析模式 (報告寫入 logs/)
+    python run.py --news --archive   # 存檔原始響應 (scrapers/data/archive/)
+    python run.py --house --media    # 爬取後下載引用的圖片 (scrapers/data/media/)
+    python run.py --house --resume   # 從上次中斷的分頁繼續 (房屋 / 集市)
+    python run.py --news --log-json  # 日誌文件改為 JSON Lines (帶 url / stage / duration)
+    python run.py --all --shards     # 每個爬蟲寫入自己的分庫 (scrapers/data/shards/)
+    python run.py --maintain         # 資料庫維護: 清理舊 URL / 歸檔日誌 / VACUUM / ANALYZE
+    python run.py --resolve          # 合併不同爬取模式產生的重複房源 / 商品 / 車源
 """
 
 import argparse
+import sqlite3
 import sys
 import os
 from datetime import datetime
@@ -20,7 +29,13 @@ from datetime import datetime
 # 添加 scrapers 目錄到路徑
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from scrapers.models import init_database, get_connection
+from scrapers.models import (
+    init_database, get_read_connection, enable_sharding, sharding_enabled, use_shard
+)
+from scrapers import profiling
+from scrapers import archive
+from scrapers import log_pipeline
+from scrapers.entity_resolution import primary_rows_sql
 
 
 # 爬蟲映射
@@ -32,6 +47,12 @@ SCRAPERS = {
     'event': ('scrapers.event_scraper', 'EventScraper', '活動爬蟲 (社區活動)'),
 }
 
+# 支持斷點續爬 (--resume) 的 API 分頁爬蟲
+RESUMABLE = ('house', 'market')
+
+# 有 canonical_id 的表 (統計時同時顯示去重後的數量)
+DEDUPED_TABLES = ('house_listings', 'market_posts', 'auto_listings')
+
 
 def get_scraper(name: str):
     """動態載入爬蟲類"""
@@ -47,7 +68,8 @@ def get_scraper(name: str):
     return scraper_class()
 
 
-def run_scraper(name: str, max_pages: int = 50, use_browser: bool = False):
+def run_scraper(name: str, max_pages: int = 50, use_browser: bool = False,
+                profile: bool = False, profile_top: int = 20, resume: bool = False):
     """運行單個爬蟲"""
     print(f"\n{'='*60}")
     print(f"開始運行: {SCRAPERS[name][2]}")
@@ -57,14 +79,21 @@ def run_scraper(name: str, max_pages: int = 50, use_browser: bool = False):
         scraper = get_scraper(name)
         if use_browser:
             scraper.use_browser = True
-        scraper.run(max_pages=max_pages)
+        run_kwargs = {'max_pages': max_pages}
+        if resume and name in RESUMABLE:
+            run_kwargs['resume'] = True
+        if profile:
+            profiling.run_profiled(name, scraper.run, top_n=profile_top, **run_kwargs)
+        else:
+            scraper.run(**run_kwargs)
         return True
     except Exception as e:
         print(f"爬蟲 {name} 運行錯誤: {e}")
         return False
 
 
-def run_all_scrapers(max_pages: int = 30):
+def run_all_scrapers(max_pages: int = 30, profile: bool = False, profile_top: int = 20,
+                     resume: bool = False):
     """運行所有爬蟲"""
     print("\n" + "="*60)
     print("開始運行所有爬蟲")
@@ -73,7 +102,8 @@ def run_all_scrapers(max_pages: int = 30):
     
     results = {}
     for name in SCRAPERS:
-        success = run_scraper(name, max_pages=max_pages)
+        success = run_scraper(name, max_pages=max_pages, profile=profile, profile_top=profile_top,
+                              resume=resume)
         results[name] = '✓ 成功' if success else '✗ 失敗'
     
     print("\n" + "="*60)
@@ -84,8 +114,8 @@ def run_all_scrapers(max_pages: int = 30):
 
 
 def show_stats():
-    """顯示資料庫統計"""
-    conn = get_connection()
+    """顯示資料庫統計 (主庫 + 分庫)"""
+    conn = get_read_connection()
     cursor = conn.cursor()
     
     tables = [
@@ -105,7 +135,18 @@ def show_stats():
         try:
             cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
             count = cursor.fetchone()[0]
-            print(f"  {display_name}: {count} 筆")
+            distinct = count
+            if table_name in DEDUPED_TABLES:
+                # 合併重複實體後的數量 (見 scrapers/entity_resolution.py)；舊資料庫沒有 canonical_id 時不顯示
+                try:
+                    cursor.execute(f"SELECT COUNT(*) FROM {table_name} WHERE {primary_rows_sql(table_name)}")
+                    distinct = cursor.fetchone()[0]
+                except sqlite3.OperationalError:
+                    pass
+            if distinct != count:
+                print(f"  {display_name}: {count} 筆 (去重後 {distinct})")
+            else:
+                print(f"  {display_name}: {count} 筆")
         except:
             print(f"  {display_name}: (表不存在)")
     
@@ -130,6 +171,28 @@ def list_scrapers():
     print("="*60)
 
 
+def download_media(names: list = None):
+    """下載爬蟲引用的圖片 (已下載的跳過)"""
+    from scrapers.media import MediaDownloader, IMAGE_SOURCES
+    sources = [n for n in names if n in IMAGE_SOURCES] if names else None
+    if sources == []:
+        return
+    print(f"\n{'='*60}")
+    print("開始下載圖片")
+    print(f"{'='*60}")
+    if not sharding_enabled():
+        groups = [(None, sources)]
+    else:
+        # 分庫模式: 圖片記錄寫入各爬蟲自己的分庫
+        groups = [(name, [name]) for name in (sources or IMAGE_SOURCES)]
+    for shard, group in groups:
+        with use_shard(shard or ''):
+            stats = MediaDownloader().run(sources=group)
+        label = f"{shard}: " if shard else ""
+        print(f"  {label}新下載: {stats['downloaded']}, 內容重複: {stats['deduplicated']}, "
+              f"失敗: {stats['failed']}, 跳過: {stats['skipped']}")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='51.ca 爬蟲系統',
@@ -140,6 +203,8 @@ def main():
   python run.py --news --house     運行新聞和房屋爬蟲
   python run.py --auto --max 100   運行汽車爬蟲，最多100頁
   python run.py --stats            顯示資料庫統計
+  python run.py --news --profile   性能分析 (flamegraph + 最慢 URL 報告)
+  python run.py --all --archive    存檔原始響應，供離線重新解析
         """
     )
     
@@ -154,14 +219,32 @@ def main():
     # 配置選項
     parser.add_argument('--max', type=int, default=50, help='最大頁數 (默認: 50)')
     parser.add_argument('--browser', action='store_true', help='使用瀏覽器模式')
+    parser.add_argument('--profile', action='store_true', help='性能分析模式 (報告寫入 logs/)')
+    parser.add_argument('--profile-top', type=int, default=20, help='性能報告列出最慢的 URL 數量')
+    parser.add_argument('--archive', action='store_true', help='存檔原始響應 (zstd 分段文件 + 索引)')
+    parser.add_argument('--archive-retention', type=int, default=archive.RETENTION_DAYS,
+                        help=f'存檔保留天數 (默認: {archive.RETENTION_DAYS})')
+    parser.add_argument('--media', action='store_true', help='爬取後下載引用的圖片 (按內容哈希去重)')
+    parser.add_argument('--resume', action='store_true',
+                        help=f'從上次中斷的分頁繼續 (支持: {", ".join(RESUMABLE)})')
+    parser.add_argument('--log-json', action='store_true', help='日誌文件使用 JSON Lines 格式')
+    parser.add_argument('--shards', action='store_true', help='每個爬蟲寫入自己的分庫文件')
     
     # 工具選項
     parser.add_argument('--list', action='store_true', help='列出所有可用爬蟲')
     parser.add_argument('--stats', action='store_true', help='顯示資料庫統計')
     parser.add_argument('--init', action='store_true', help='初始化資料庫')
+    parser.add_argument('--maintain', action='store_true', help='資料庫維護 (可在爬蟲運行時執行)')
+    parser.add_argument('--resolve', action='store_true', help='合併重複實體 (寫入 canonical_id)')
     
     args = parser.parse_args()
     
+    if args.log_json:
+        log_pipeline.configure(json_format=True)
+    
+    if args.shards:
+        enable_sharding()
+    
     # 處理工具命令
     if args.list:
         list_scrapers()
@@ -171,6 +254,20 @@ def main():
         show_stats()
         return
     
+    if args.maintain:
+        from scrapers import maintenance
+        for report in maintenance.maintain_all():
+            maintenance.print_report(report)
+        return
+    
+    if args.resolve:
+        from scrapers import entity_resolution
+        init_database()
+        for stats in entity_resolution.resolve_all():
+            print(f"{stats['kind']}: {stats['rows']} 行 -> {stats['entities']} 個實體 (重複 {stats['duplicates']})")
+        show_stats()
+        return
+    
     if args.init:
         print("正在初始化資料庫...")
         init_database()
@@ -178,9 +275,15 @@ def main():
         show_stats()
         return
     
+    if args.archive:
+        archive.enable(retention_days=args.archive_retention)
+    
     # 處理爬蟲命令
     if args.all:
-        run_all_scrapers(max_pages=args.max)
+        run_all_scrapers(max_pages=args.max, profile=args.profile, profile_top=args.profile_top,
+                         resume=args.resume)
+        if args.media:
+            download_media()
         return
     
     # 運行指定爬蟲
@@ -198,7 +301,10 @@ def main():
     
     if scrapers_to_run:
         for name in scrapers_to_run:
-            run_scraper(name, max_pages=args.max, use_browser=args.browser)
+            run_scraper(name, max_pages=args.max, use_browser=args.browser,
+                        profile=args.profile, profile_top=args.profile_top, resume=args.resume)
+        if args.media:
+            download_media(scrapers_to_run)
         show_stats()
     else:
         parser.print_help()
@@ -3,10 +3,20 @@
 簡單的 Flask 網頁介面來查看爬取的資料
 """
 
-from flask import Flask, render_template_string, request, jsonify, abort
+from flask import Flask, Response, render_template_string, request, jsonify, abort, g
 import sqlite3
 import os
+import sys
 import json
+import time
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scrapers import geo, price_history
+from scrapers.models import get_read_connection
 
 app = Flask(__name__)
 
@@ -14,10 +24,22 @@ DB_PATH = os.path.join(os.path.dirname(__file__), "data", "51ca.db")
 
 
 def get_connection():
-    """獲取資料庫連接"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """獲取資料庫連接 (存在爬蟲分庫時合併讀取，見 scrapers/shards.py)"""
+    return get_read_connection(DB_PATH)
+
+
+def get_db():
+    """當前請求共用的資料庫連接 (請求結束時關閉)"""
+    if 'db' not in g:
+        g.db = get_connection()
+    return g.db
+
+
+@app.teardown_appcontext
+def close_db(exc):
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close()
 
 
 # 表格設定 (icon + label)
@@ -34,8 +56,7 @@ TABLES = {
 
 def get_stats():
     """獲取資料庫統計"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    cursor = get_db().cursor()
     
     table_stats = {}
     
@@ -60,7 +81,6 @@ def get_stats():
     cursor.execute("SELECT COUNT(*) FROM url_queue WHERE visited = 1")
     visited_urls = cursor.fetchone()[0]
     
-    conn.close()
     return {
         'tables': table_stats,
         'pending_urls': pending_urls,
@@ -68,45 +88,51 @@ def get_stats():
     }
 
 
-def get_table_data(table_name, page=1, per_page=20, search=None):
-    """獲取表格資料"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    offset = (page - 1) * per_page
+# 搜索的欄位 (其他表搜索 title)
+SEARCH_COLUMNS = {
+    'news_articles': 'title',
+    'house_listings': 'title',
+    'job_listings': 'title',
+    'service_merchants': 'name',
+    'service_posts': 'title',
+    'market_posts': 'title',
+    'auto_listings': 'title',
+}
+
+
+def table_columns(table_name):
+    """表的欄位列表"""
+    return [row[1] for row in get_db().execute(f'PRAGMA table_info("{table_name}")')]
+
+
+def build_table_query(table_name, search=None, fields=None):
+    """
+    列表查詢的 SELECT / WHERE (fields 為要返回的欄位，已由 parse_fields 校驗)
     
-    # 構建查詢
+    Returns:
+        (select_sql, count_sql, params)
+    """
+    columns = ', '.join(f'"{field}"' for field in fields) if fields else '*'
+    where, params = '', []
     if search:
         # 簡單搜索 (搜索 title 或 name 欄位)
-        search_cols = {
-            'news_articles': 'title',
-            'house_listings': 'title',
-            'job_listings': 'title',
-            'service_merchants': 'name',
-            'service_posts': 'title',
-            'market_posts': 'title',
-            'auto_listings': 'title',
-        }
-        col = search_cols.get(table_name, 'title')
-        cursor.execute(f"SELECT * FROM {table_name} WHERE {col} LIKE ? ORDER BY id DESC LIMIT ? OFFSET ?",
-                       (f"%{search}%", per_page, offset))
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name} WHERE {col} LIKE ?", (f"%{search}%",))
-    else:
-        cursor.execute(f"SELECT * FROM {table_name} ORDER BY id DESC LIMIT ? OFFSET ?", (per_page, offset))
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+        where = f" WHERE {SEARCH_COLUMNS.get(table_name, 'title')} LIKE ?"
+        params.append(f"%{search}%")
+    return (f"SELECT {columns} FROM {table_name}{where} ORDER BY id DESC",
+            f"SELECT COUNT(*) FROM {table_name}{where}", params)
+
+
+def get_table_data(table_name, page=1, per_page=20, search=None, fields=None):
+    """獲取表格資料"""
+    cursor = get_db().cursor()
     
-    total = cursor.fetchone()[0]
+    offset = (page - 1) * per_page
+    select_sql, count_sql, params = build_table_query(table_name, search, fields)
     
-    # 重新查詢資料
-    if search:
-        col = {'news_articles': 'title', 'house_listings': 'title', 'job_listings': 'title',
-               'service_merchants': 'name', 'service_posts': 'title', 'market_posts': 'title',
-               'auto_listings': 'title'}.get(table_name, 'title')
-        cursor.execute(f"SELECT * FROM {table_name} WHERE {col} LIKE ? ORDER BY id DESC LIMIT ? OFFSET ?",
-                       (f"%{search}%", per_page, offset))
-    else:
-        cursor.execute(f"SELECT * FROM {table_name} ORDER BY id DESC LIMIT ? OFFSET ?", (per_page, offset))
+    cursor.execute(count_sql, params)
+    total = cursor.fetchone()[0]
     
+    cursor.execute(f"{select_sql} LIMIT ? OFFSET ?", params + [per_page, offset])
     rows = cursor.fetchall()
     columns = [description[0] for description in cursor.description] if rows else []
     
@@ -114,11 +140,62 @@ def get_table_data(table_name, page=1, per_page=20, search=None):
     for row in rows:
         data.append(dict(zip(columns, row)))
     
-    conn.close()
+    # 本頁引用的商家一次查出 (列表中顯示為商家連結)
+    merchant_columns = [key for key in merchant_keys(table_name) if key in columns]
+    merchants = lookup_merchants(row[key] for row in data for key in merchant_columns)
     
     return {
         'data': data,
         'columns': columns,
+        'merchant_columns': merchant_columns,
+        'merchants': {str(merchant_id): link for merchant_id, link in merchants.items() if link},
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'total_pages': (total + per_page - 1) // per_page
+    }
+
+
+# 規範化子表查詢: 父表 -> 業務主鍵 (子表由 scrapers/normalized.py 寫入)
+ITEM_KEYS = {
+    'news_articles': 'article_id',
+    'house_listings': 'listing_id',
+    'auto_listings': 'listing_id',
+    'market_posts': 'post_id',
+    'events': 'event_id',
+}
+
+CHILD_FILTERS = {
+    'feature': ('item_features', 'feature'),
+    'tag': ('item_tags', 'tag'),
+    'image': ('item_images', 'url'),
+}
+
+
+def get_items_by_child(table_name, kind, value, page=1, per_page=20):
+    """按設施 / 標籤 / 圖片 URL 查詢項目 (走子表索引，不解碼 JSON 欄位)"""
+    child, column = CHILD_FILTERS[kind]
+    key = ITEM_KEYS[table_name]
+    offset = (page - 1) * per_page
+    
+    cursor = get_db().cursor()
+    try:
+        cursor.execute(f"SELECT COUNT(DISTINCT item_id) FROM {child} WHERE item_type = ? AND {column} = ?",
+                       (table_name, value))
+        total = cursor.fetchone()[0]
+        cursor.execute(f"""
+            SELECT t.* FROM {table_name} t
+            JOIN (SELECT DISTINCT item_id FROM {child} WHERE item_type = ? AND {column} = ?) c
+              ON c.item_id = t.{key}
+            ORDER BY t.id DESC LIMIT ? OFFSET ?
+        """, (table_name, value, per_page, offset))
+        data = [dict(row) for row in cursor.fetchall()]
+    except sqlite3.OperationalError:
+        # 子表尚未建立 (舊資料庫)
+        total, data = 0, []
+    
+    return {
+        'data': data,
         'total': total,
         'page': page,
         'per_page': per_page,
@@ -126,6 +203,20 @@ def get_table_data(table_name, page=1, per_page=20, search=None):
     }
 
 
+def get_child_facets(table_name, kind, limit=50):
+    """統計最常見的設施 / 標籤"""
+    child, column = CHILD_FILTERS[kind]
+    try:
+        rows = get_db().execute(f"""
+            SELECT {column} AS value, COUNT(*) AS count FROM {child}
+            WHERE item_type = ?
+            GROUP BY {column} ORDER BY count DESC LIMIT ?
+        """, (table_name, limit)).fetchall()
+        return [dict(row) for row in rows]
+    except sqlite3.OperationalError:
+        return []
+
+
 def parse_json_list(value):
     """將資料轉換為列表"""
     if not value:
@@ -441,7 +532,99 @@ DETAIL_CONFIG = {
 }
 
 
-def prepare_field(record: dict, field: dict) -> dict:
+# ============== 商家連結 ==============
+
+# 商家名稱快取 (merchant_id -> 連結)，跨請求共用；超過 TTL 的項目重新查詢
+MERCHANT_CACHE_SIZE = 2048
+MERCHANT_CACHE_TTL = 300
+
+# IN (...) 每批的 merchant_id 數量 (SQLite 變數上限)
+MERCHANT_LOOKUP_CHUNK = 500
+
+
+class MerchantCache:
+    """LRU 快取，查不到的商家也記下 (None)，避免每次渲染重查"""
+
+    def __init__(self, size: int = MERCHANT_CACHE_SIZE, ttl: float = MERCHANT_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._items = OrderedDict()     # merchant_id -> (到期時刻, 連結 or None)
+        self._lock = threading.Lock()
+
+    def get_many(self, merchant_ids) -> tuple:
+        """返回 (命中的 {merchant_id: 連結}, 未命中的 merchant_id 列表)"""
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for merchant_id in merchant_ids:
+                entry = self._items.get(merchant_id)
+                if entry is None or entry[0] < now:
+                    missing.append(merchant_id)
+                    continue
+                self._items.move_to_end(merchant_id)
+                found[merchant_id] = entry[1]
+        return found, missing
+
+    def put_many(self, links: dict):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for merchant_id, link in links.items():
+                self._items[merchant_id] = (expires, link)
+                self._items.move_to_end(merchant_id)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+merchant_cache = MerchantCache()
+
+
+def merchant_keys(table_name: str) -> list:
+    """表中以商家連結顯示的欄位"""
+    return [field['key'] for section in DETAIL_CONFIG.get(table_name, [])
+            for field in section['fields'] if field.get('type') == 'merchant_link']
+
+
+def lookup_merchants(merchant_ids) -> dict:
+    """
+    批量查詢商家詳情頁連結 (先查快取，未命中的一次 IN 查詢)
+    
+    Returns:
+        {merchant_id: {'id', 'url', 'name'} or None}
+    """
+    merchant_ids = list(dict.fromkeys(str(m) for m in merchant_ids if m))
+    if not merchant_ids:
+        return {}
+    links, missing = merchant_cache.get_many(merchant_ids)
+    if missing:
+        fetched = dict.fromkeys(missing)
+        conn = get_db()
+        for i in range(0, len(missing), MERCHANT_LOOKUP_CHUNK):
+            chunk = missing[i:i + MERCHANT_LOOKUP_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            try:
+                rows = conn.execute(
+                    f"SELECT id, merchant_id, name FROM service_merchants WHERE merchant_id IN ({placeholders})",
+                    chunk
+                ).fetchall()
+            except sqlite3.OperationalError:
+                # service_merchants 表尚未建立
+                return links
+            for row in rows:
+                fetched[str(row['merchant_id'])] = {
+                    'id': row['id'],
+                    'url': f"/detail/service_merchants/{row['id']}",
+                    'name': row['name'],
+                }
+        merchant_cache.put_many(fetched)
+        links.update(fetched)
+    return links
+
+
+def prepare_field(record: dict, field: dict, merchants: dict | None = None) -> dict:
     """根據設定準備欄位資料"""
     field_type = field.get('type', 'text')
     key = field.get('key')
@@ -468,16 +651,14 @@ def prepare_field(record: dict, field: dict) -> dict:
         value = {'url': link_url, 'text': field.get('text') or link_url}
     elif field_type == 'merchant_link':
         # 連結到本地商家詳情頁
-        merchant_id = raw_value
+        merchant_id = str(raw_value) if raw_value else None
         if merchant_id:
-            # 從 service_merchants 找到對應的 id
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, name FROM service_merchants WHERE merchant_id = ?", (str(merchant_id),))
-            merchant = cursor.fetchone()
-            conn.close()
+            # 從 service_merchants 找到對應的 id (build_detail_sections 已預先批量查詢)
+            if merchants is None or merchant_id not in merchants:
+                merchants = lookup_merchants([merchant_id])
+            merchant = merchants.get(merchant_id)
             if merchant:
-                value = {'url': f'/detail/service_merchants/{merchant[0]}', 'text': merchant[1] or field.get('text', '查看商家')}
+                value = {'url': merchant['url'], 'text': merchant['name'] or field.get('text', '查看商家')}
             else:
                 value = None
         else:
@@ -505,8 +686,9 @@ def prepare_field(record: dict, field: dict) -> dict:
 def build_detail_sections(table_name: str, record: dict) -> list:
     """組裝詳情頁區塊"""
     sections = []
+    merchants = lookup_merchants(record.get(key) for key in merchant_keys(table_name))
     for section in DETAIL_CONFIG.get(table_name, []):
-        prepared_fields = [prepare_field(record, field) for field in section['fields']]
+        prepared_fields = [prepare_field(record, field, merchants) for field in section['fields']]
         sections.append({
             'title': section['title'],
             'columns': section.get('columns', 2),
@@ -519,16 +701,8 @@ def get_record(table_name: str, record_id: int) -> dict | None:
     """取得單筆資料"""
     if table_name not in TABLES:
         return None
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(f"SELECT * FROM {table_name} WHERE id = ?", (record_id,))
-        row = cursor.fetchone()
-        if not row:
-            return None
-        return dict(row)
-    finally:
-        conn.close()
+    row = get_db().execute(f"SELECT * FROM {table_name} WHERE id = ?", (record_id,)).fetchone()
+    return dict(row) if row else None
 
 
 def build_meta(record: dict) -> list:
@@ -663,6 +837,9 @@ HTML_TEMPLATE = '''
                             <td>
                                 {% if col == 'url' and row[col] %}
                                 <a href="{{ row[col] }}" target="_blank">🔗 查看</a>
+                                {% elif col in table_data.merchant_columns and table_data.merchants.get(row[col]|string) %}
+                                {% set merchant = table_data.merchants[row[col]|string] %}
+                                <a href="{{ merchant.url }}" target="_blank">🏪 {{ merchant.name or row[col] }}</a>
                                 {% elif row[col] is not none %}
                                 {{ row[col]|string|truncate(100, True, '...') }}
                                 {% else %}
@@ -853,6 +1030,165 @@ DETAIL_TEMPLATE = '''
 '''
 
 
+# ============== API: 欄位投影 / ETag / NDJSON / 壓縮 ==============
+
+# NDJSON 每次輸出的行數 (壓縮時每批 flush 一次)
+NDJSON_BATCH = 200
+
+# 小於此大小的響應不壓縮
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_MIMETYPES = ('application/json', 'application/x-ndjson')
+
+
+# brotli / brotlicffi 未安裝時只協商 gzip
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+ENCODINGS = ['br', 'gzip'] if brotli else ['gzip']
+
+
+def parse_fields(table_name):
+    """?fields=title,price → 欄位列表 (未指定時為 None，含未知欄位時 400)"""
+    value = request.args.get('fields')
+    if not value:
+        return None
+    fields = list(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    unknown = set(fields) - set(table_columns(table_name))
+    if not fields or unknown:
+        abort(400, description=f"未知欄位: {', '.join(sorted(unknown))}")
+    return fields
+
+
+def table_versions(tables):
+    """
+    各表的修改計數；不存在的表 (如新資料庫中的舊版 service_merchants) 計為 0，
+    表存在但沒有計數 (未經 init_database 建立觸發器) 或舊資料庫沒有 table_versions 時返回 None
+    """
+    placeholders = ','.join('?' * len(tables))
+    try:
+        rows = get_db().execute(f"""
+            SELECT table_name, SUM(version) FROM table_versions
+            WHERE table_name IN ({placeholders}) GROUP BY table_name
+        """, list(tables)).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    versions = {row[0]: row[1] for row in rows}
+    for table in set(tables) - set(versions):
+        if table_columns(table):
+            return None
+        versions[table] = 0
+    return versions
+
+
+def api_etag(tables):
+    """由表修改計數和請求參數生成 ETag (無法取得計數時返回 None，即不做條件請求)"""
+    versions = table_versions(tables)
+    if versions is None:
+        return None
+    args = sorted(request.args.items(multi=True))
+    key = json.dumps([sorted(versions.items()), request.path, args, request.accept_mimetypes.to_header()])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+
+def not_modified(etag):
+    """客戶端的 If-None-Match 與 ETag 相同時返回 304 響應"""
+    if etag and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+
+def with_etag(response, etag):
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def wants_ndjson():
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+
+def stream_table_ndjson(table_name, search=None, fields=None, limit=None, offset=0):
+    """逐行輸出表資料 (每行一個 JSON 對象)，不在內存中組裝整個結果"""
+    select_sql, _, params = build_table_query(table_name, search, fields)
+    if limit is not None:
+        select_sql += " LIMIT ? OFFSET ?"
+        params = params + [limit, offset]
+    
+    def generate():
+        # 響應在請求結束後才逐塊輸出，使用獨立連接
+        conn = get_connection()
+        try:
+            cursor = conn.execute(select_sql, params)
+            columns = [description[0] for description in cursor.description]
+            while True:
+                rows = cursor.fetchmany(NDJSON_BATCH)
+                if not rows:
+                    break
+                yield ''.join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n'
+                              for row in rows).encode('utf-8')
+        finally:
+            conn.close()
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+def _compressor(encoding):
+    """返回 (壓縮, flush, 結束) 函數"""
+    if encoding == 'br':
+        compressor = brotli.Compressor()
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return (compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+            lambda: compressor.flush(zlib.Z_FINISH))
+
+
+def _compress_stream(chunks, encoding):
+    compress, flush, finish = _compressor(encoding)
+    try:
+        for chunk in chunks:
+            data = compress(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+@app.after_request
+def compress_response(response):
+    """API 響應按 Accept-Encoding 協商 br / gzip (流式響應逐塊壓縮)"""
+    if not request.path.startswith('/api/') or response.mimetype not in COMPRESS_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if not encoding:
+        return response
+    
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_SIZE:
+            return response
+        compress, _, finish = _compressor(encoding)
+        response.set_data(compress(body) + finish())
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
 @app.route('/')
 def index():
     """首頁"""
@@ -907,27 +1243,153 @@ def detail_view(table_name: str, record_id: int):
 
 @app.route('/api/stats')
 def api_stats():
-    """API: 獲取統計"""
-    return jsonify(get_stats())
+    """API: 獲取統計 (支持 If-None-Match)"""
+    etag = api_etag(list(TABLES) + ['url_queue'])
+    return not_modified(etag) or with_etag(jsonify(get_stats()), etag)
 
 
 @app.route('/api/table/<table_name>')
 def api_table(table_name):
-    """API: 獲取表格資料"""
+    """
+    API: 獲取表格資料 (支持 If-None-Match)
+        ?fields=id,title,price     只返回指定欄位
+        ?format=ndjson             逐行輸出 (或 Accept: application/x-ndjson)；
+                                   未指定 page / per_page 時輸出全部符合的行
+    """
+    if table_name not in TABLES:
+        abort(404)
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 20))
     search = request.args.get('search', None)
+    fields = parse_fields(table_name)
+    
+    tables = [table_name] + (['service_merchants'] if merchant_keys(table_name) else [])
+    etag = api_etag(tables)
+    response = not_modified(etag)
+    if response:
+        return response
+    
+    if wants_ndjson():
+        if 'page' in request.args or 'per_page' in request.args:
+            response = stream_table_ndjson(table_name, search, fields, per_page, (page - 1) * per_page)
+        else:
+            response = stream_table_ndjson(table_name, search, fields)
+    else:
+        response = jsonify(get_table_data(table_name, page, per_page, search, fields))
+    return with_etag(response, etag)
+
+
+@app.route('/api/table/<table_name>/by/<kind>')
+def api_table_by_child(table_name, kind):
+    """API: 按設施 / 標籤 / 圖片查詢 (?value=...)"""
+    if table_name not in ITEM_KEYS or kind not in CHILD_FILTERS:
+        abort(404)
+    value = request.args.get('value')
+    if not value:
+        abort(400)
+    page = int(request.args.get('page', 1))
+    per_page = int(request.args.get('per_page', 20))
     
-    return jsonify(get_table_data(table_name, page, per_page, search))
+    return jsonify(get_items_by_child(table_name, kind, value, page, per_page))
 
 
+@app.route('/api/facets/<table_name>/<kind>')
+def api_facets(table_name, kind):
+    """API: 最常見的設施 / 標籤"""
+    if table_name not in ITEM_KEYS or kind not in CHILD_FILTERS:
+        abort(404)
+    limit = int(request.args.get('limit', 50))
+    return jsonify(get_child_facets(table_name, kind, limit))
+
+
+@app.route('/api/geo/house_listings')
+def api_house_geo():
+    """
+    API: 房源地理查詢 (R-tree 索引)
+        ?bbox=min_lat,min_lon,max_lat,max_lon
+        ?lat=..&lon=..&radius=2        (公里)
+        ?lat=..&lon=..&k=10            (最近鄰)
+    可選過濾: listing_type, property_type, min_price, max_price, limit
+    """
+    args = request.args
+    filters = {
+        'listing_type': args.get('listing_type'),
+        'property_type': args.get('property_type'),
+        'min_price': args.get('min_price', type=float),
+        'max_price': args.get('max_price', type=float),
+    }
+    limit = args.get('limit', 500, type=int)
+    
+    conn = get_db()
+    start = time.perf_counter()
+    try:
+        if args.get('bbox'):
+            try:
+                min_lat, min_lon, max_lat, max_lon = [float(v) for v in args['bbox'].split(',')]
+            except ValueError:
+                abort(400)
+            data = geo.search_bbox(min_lat, max_lat, min_lon, max_lon, limit=limit, conn=conn, **filters)
+        else:
+            lat = args.get('lat', type=float)
+            lon = args.get('lon', type=float)
+            if lat is None or lon is None:
+                abort(400)
+            if args.get('k'):
+                data = geo.nearest(lat, lon, k=args.get('k', type=int), conn=conn, **filters)
+            else:
+                radius = args.get('radius', 1.0, type=float)
+                data = geo.search_radius(lat, lon, radius, limit=limit, conn=conn, **filters)
+    except sqlite3.OperationalError as e:
+        # 資料庫尚未建立 house_geo 索引
+        return jsonify({'error': str(e), 'data': []}), 503
+    
+    return jsonify({
+        'data': data,
+        'total': len(data),
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+    })
+
+
+
+@app.route('/api/prices/<table_name>/drops')
+def api_price_drops(table_name):
+    """API: 最近降價的項目 (?days=7&min_drop_pct=5&limit=100)"""
+    if table_name not in price_history.PRICE_TRACKED_TABLES:
+        abort(404)
+    args = request.args
+    try:
+        data = price_history.recent_drops(
+            table_name,
+            days=args.get('days', 7, type=float),
+            min_drop_pct=args.get('min_drop_pct', 0, type=float),
+            limit=args.get('limit', 100, type=int),
+            conn=get_db()
+        )
+    except sqlite3.OperationalError as e:
+        # 資料庫尚未建立 price_history 表
+        return jsonify({'error': str(e), 'data': []}), 503
+    return jsonify({'data': data, 'total': len(data)})
+
+
+@app.route('/api/prices/<table_name>/<item_id>')
+def api_price_series(table_name, item_id):
+    """API: 單個項目的價格歷史"""
+    if table_name not in price_history.PRICE_TRACKED_TABLES:
+        abort(404)
+    try:
+        data = price_history.price_series(table_name, item_id, conn=get_db())
+    except sqlite3.OperationalError as e:
+        return jsonify({'error': str(e), 'data': []}), 503
+    return jsonify({'item_id': item_id, 'data': data})
+
 if __name__ == '__main__':
     print("=" * 60)
     print("📊 51.ca 資料查看器")
     print("=" * 60)
     
     # 顯示統計
-    stats = get_stats()
+    with app.app_context():
+        stats = get_stats()
     total = 0
     for table, info in stats['tables'].items():
         print(f"  {info['icon']} {info['label']}: {info['count']}")